@@ -0,0 +1,128 @@
+import mmap
+import os
+import struct
+import sys
+from name32table_hash import hash_names, read_string_table
+
+# Persistent Name32 reverse lookup (hash -> known names), built once from a string table dump (see format-docs.md).
+# File layout (little endian):
+#  'N32I', uint32 version, uint32 count
+#  count x (uint32 hash, uint32 name offset, uint32 name length), sorted by hash - names with the same hash (collisions) are adjacent
+#  string blob (utf8 names, not terminated)
+# The file is mmap'ed and searched with a binary search, so opening it costs next to nothing.
+
+NAME32_INDEX_MAGIC = b'N32I'
+NAME32_INDEX_VERSION = 1
+_index_header = struct.Struct("<4sII")
+_index_entry = struct.Struct("<III")
+
+def build_name32_index(names, path, workers=1):
+    #names: List of names as bytes. Returns the number of distinct names written.
+    names = list(dict.fromkeys(name for name in names if len(name) > 0))
+    return write_name32_index(zip(hash_names(names, workers), names), path)
+
+def write_name32_index(entries, path):
+    #entries: Iterable of (hash, name as bytes). Returns the number of distinct entries written.
+    entries = sorted(set((namehash, bytes(name)) for namehash, name in entries if len(name) > 0))
+    blob = bytearray()
+    table = bytearray()
+    for namehash, name in entries:
+        table += _index_entry.pack(namehash, len(blob), len(name))
+        blob += name
+    with open(path, 'wb') as fout:
+        fout.write(_index_header.pack(NAME32_INDEX_MAGIC, NAME32_INDEX_VERSION, len(entries)))
+        fout.write(table)
+        fout.write(blob)
+    return len(entries)
+
+class Name32Index:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) #Stays valid after closing the file.
+        if len(self._mm) < _index_header.size:
+            raise ValueError("Name32 index file too short")
+        magic, version, self.count = _index_header.unpack_from(self._mm, 0)
+        if magic != NAME32_INDEX_MAGIC or version != NAME32_INDEX_VERSION:
+            raise ValueError("No valid Name32 index file (magic %s, version %d)" % (str(magic), version))
+        self._blob_offs = _index_header.size + self.count * _index_entry.size
+        if self._blob_offs > len(self._mm):
+            raise ValueError("Name32 index file too short")
+        self._cache = {} #Savegames repeat the same few Name32 values a lot.
+    def close(self):
+        self._mm.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def _hash_at(self, i):
+        return _index_entry.unpack_from(self._mm, _index_header.size + i * _index_entry.size)[0]
+    def items(self):
+        #All (hash, name as bytes) entries, sorted by hash.
+        for i in range(self.count):
+            namehash, name_offs, name_len = _index_entry.unpack_from(self._mm, _index_header.size + i * _index_entry.size)
+            name_offs += self._blob_offs
+            yield namehash, self._mm[name_offs:name_offs+name_len]
+    def lookup(self, namehash):
+        #Returns the list of known names for the hash (more than one on collisions), empty if unknown.
+        ret = self._cache.get(namehash)
+        if ret is not None:
+            return ret
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._hash_at(mid) < namehash:
+                lo = mid + 1
+            else:
+                hi = mid
+        ret = []
+        while lo < self.count:
+            entry_hash, name_offs, name_len = _index_entry.unpack_from(self._mm, _index_header.size + lo * _index_entry.size)
+            if entry_hash != namehash:
+                break
+            name_offs += self._blob_offs
+            ret.append(self._mm[name_offs:name_offs+name_len].decode('utf8', 'replace'))
+            lo += 1
+        self._cache[namehash] = ret
+        return ret
+
+def _annotate_value(name32, index):
+    names = index.lookup(int(name32[0], 0))
+    if len(names) > 0 and len(name32) == 3:
+        name32.append(names)
+
+def annotate_name32(deser, index):
+    #Appends the known names as a 4th element to each Name32 ['0x<hash>', <uint32>, <bool>] in the extract_json representation.
+    # Name32 values are found by the type in their key (fields, Name32 arrays and variants). Compose ignores the extra element.
+    if isinstance(deser, dict):
+        for key, val in deser.items():
+            if key == "Name32" or key.startswith("Name32 "):
+                _annotate_value(val, index)
+            elif key.startswith("Name32[] "):
+                for name32 in val:
+                    _annotate_value(name32, index)
+            else:
+                annotate_name32(val, index)
+    elif isinstance(deser, list):
+        for val in deser:
+            annotate_name32(val, index)
+    return deser
+
+def print_usage():
+    print("Usage: ")
+    print("name32_index build <string table dump> <index out>")
+    print(" -> Hashes all strings of a raw string table dump (e.g. 'name32 table.bin') into a Name32 index file.")
+    print("    For several dumps or to extend an index, use name32table_hash with --out=<index out>.idx.")
+    print("")
+    print("name32_index lookup <index> <hash> {<hash>}")
+    print(" -> Prints the known names for Name32 hashes (e.g. 0x4f4f451e).")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        count = build_name32_index(read_string_table(sys.argv[2]), sys.argv[3], os.cpu_count() or 1)
+        print("Wrote %d names." % count)
+    elif len(sys.argv) >= 4 and sys.argv[1] == "lookup":
+        with Name32Index(sys.argv[2]) as index:
+            for arg in sys.argv[3:]:
+                print("0x%08x: %s" % (int(arg, 0), ", ".join(index.lookup(int(arg, 0)))))
+    else:
+        print_usage()
@@ -1,33 +1,165 @@
-all_strings=[]
+import array
+import concurrent.futures
+import json
+import os
+import re
+import sys
+import time
+from sdbm_hash import sdbm, sdbm_many
+
+# Converts raw string table dumps from game memory (strings separated by '\0', see format-docs.md) to a list of names and their Name32 hashes.
+# Every distinct name is hashed once, in chunks spread over worker processes. Results are written as tab separated
+#  '0x<hash>\t<name>' lines or as a Name32 index (see name32_index.py), and can be extended with further dumps without rehashing.
+
+NAME32_HASH_CHUNK = 0x4000 #Names per worker job
+_tsv_unescape_map = {b'\\': b'\\', b't': b'\t', b'n': b'\n', b'r': b'\r'}
 
 def name32hash(name):
+    #'0x<hex>' names stand for the hash itself, masked to 32 bits. Names that are not valid hex are hashed as usual.
     if name.startswith(b'0x'):
-        return int(name[2:].decode("utf8"),16)
-    sum = 0
-    for i in range(len(name)):
-        sum = ((sum*0x1003F)&0xFFFFFFFF) + name[i]
-        sum = sum&0xFFFFFFFF
-    return sum
-
-# Expects a raw string table dump from game memory - strings separated by '\0' character (i.e. hex 00)
-with open('name32 table.bin', 'rb') as f:
-    data = f.read()
-cur_stroffs=0
-for i in range(0,len(data)):
-    if data[i] == 0:
-        all_strings.append(data[cur_stroffs:i])
-        cur_stroffs = i+1
-name_by_hash={}
-for name in all_strings:
-    namehash = name32hash(name)
-    if namehash in name_by_hash:
-        namelist = name_by_hash[namehash]
+        try:
+            return int(name[2:].decode("utf8"),16) & 0xFFFFFFFF
+        except ValueError:
+            pass
+    return sdbm(name)
+
+def name32hash_many(names):
+    hashes = sdbm_many(names)
+    for i in range(len(names)):
+        if names[i].startswith(b'0x'):
+            hashes[i] = name32hash(names[i])
+    return hashes
+
+def _hash_chunk(names_joined):
+    #Runs in a worker process. Takes the names joined with '\0' (cheaper to pass than a list), returns the packed uint32 hashes.
+    return array.array('I', name32hash_many(names_joined.split(b'\0'))).tobytes()
+
+def hash_names(names, workers=1):
+    #Returns the Name32 hashes of a list of names (bytes), in the same order.
+    if workers <= 1 or len(names) < 2 * NAME32_HASH_CHUNK:
+        return name32hash_many(names)
+    chunks = [b'\0'.join(names[i:i+NAME32_HASH_CHUNK]) for i in range(0, len(names), NAME32_HASH_CHUNK)]
+    hashes = array.array('I')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_hashes in executor.map(_hash_chunk, chunks):
+            hashes.frombytes(chunk_hashes)
+    return hashes.tolist()
+
+def read_string_table(path):
+    # Expects a raw string table dump from game memory - strings separated by '\0' character (i.e. hex 00)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data.split(b'\0')[:-1] #Anything after the last '\0' is not a complete string.
+
+def _tsv_escape(name):
+    return name.replace(b'\\', b'\\\\').replace(b'\t', b'\\t').replace(b'\n', b'\\n').replace(b'\r', b'\\r')
+def _tsv_unescape(name):
+    return re.sub(rb'\\(.)', lambda m: _tsv_unescape_map.get(m.group(1), m.group(0)), name) if (b'\\' in name) else name
+
+def read_results(path):
+    #Reads a previous output file (tab separated or Name32 index). Returns {name: hash}.
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    import name32_index
+    if magic == name32_index.NAME32_INDEX_MAGIC:
+        with name32_index.Name32Index(path) as index:
+            return {name: namehash for namehash, name in index.items()}
+    hash_by_name = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.rstrip(b'\r\n')
+            if len(line) == 0:
+                continue
+            namehash, sep, name = line.partition(b'\t')
+            if sep == b'':
+                raise ValueError("Unexpected line in %s: %s" % (path, str(line)))
+            hash_by_name[_tsv_unescape(name)] = int(namehash, 16)
+    return hash_by_name
+
+def add_names(hash_by_name, names, workers=1):
+    #Hashes the names not in hash_by_name yet and adds them. Returns the number of new names.
+    new_names = list(dict.fromkeys(name for name in names if name not in hash_by_name))
+    for name, namehash in zip(new_names, hash_names(new_names, workers)):
+        hash_by_name[name] = namehash
+    return len(new_names)
+
+def write_results(hash_by_name, path):
+    #Written to a temporary file first, so that path can also be the merge input.
+    path_tmp = path + ".tmp"
+    if path.lower().endswith(".idx"):
+        import name32_index
+        name32_index.write_name32_index(((namehash, name) for name, namehash in hash_by_name.items()), path_tmp)
     else:
-        namelist = set()
-        name_by_hash[namehash] = namelist
-    namelist.add(name)
-for namehash in name_by_hash:
-    names = name_by_hash[namehash]
-    if len(names) > 1:
-        print("#Collision with 0x%08x: %s" % (namehash, str(names)))
-print(', '.join(["%s: 0x%08x"%(name,name32hash(name)) for name in all_strings]))
\ No newline at end of file
+        with open(path_tmp, 'wb') as fout:
+            lines = []
+            for name, namehash in hash_by_name.items():
+                lines.append(b"0x%08x\t%s\n" % (namehash, _tsv_escape(name)))
+                if len(lines) >= 0x10000:
+                    fout.write(b''.join(lines))
+                    lines.clear()
+            fout.write(b''.join(lines))
+    os.replace(path_tmp, path)
+
+def find_collisions(hash_by_name):
+    #Returns {hash: [names]} for the hashes with more than one name.
+    names_by_hash = {}
+    for name, namehash in hash_by_name.items():
+        names_by_hash.setdefault(namehash, []).append(name)
+    return {namehash: names for namehash, names in names_by_hash.items() if len(names) > 1}
+
+def write_collision_report(collisions, hash_by_name, path):
+    report = {
+        "names": len(hash_by_name),
+        "collisions": len(collisions),
+        "hashes": [{"hash": "0x%08x" % namehash, "names": [name.decode('utf8', 'backslashreplace') for name in names]}
+            for namehash, names in sorted(collisions.items())],
+    }
+    with open(path, 'w', encoding='utf8') as fout:
+        json.dump(report, fout, indent=4)
+
+def print_usage():
+    print("Usage: ")
+    print("name32table_hash {<string table dump>} {options}")
+    print(" -> Hashes the strings of raw string table dumps (default: 'name32 table.bin') and writes each distinct name with its Name32 value.")
+    print(" Options:")
+    print(" --out=<file>: Output file. Default: 'name32 table.tsv'. Tab separated '0x<hash>\\t<name>' lines, or a Name32 index (see name32_index.py) if the name ends with '.idx'.")
+    print(" --merge=<file>: Previous output file (either format) to extend. Its names are not hashed again. Can be the same as --out.")
+    print(" --collisions=<file>: Writes the hashes with more than one name as json. Otherwise, they are printed.")
+    print(" --workers=<n>: Number of worker processes for hashing. Default: Number of CPUs.")
+
+def main(argv):
+    dumps = []
+    options = {}
+    for arg in argv[1:]:
+        if arg.startswith("--"):
+            arg_name, arg_sep, arg_value = arg.partition("=")
+            if arg_name.lower() not in ("--out", "--merge", "--collisions", "--workers") or arg_sep == "":
+                print("Unknown option argument '%s'" % arg)
+                print_usage()
+                return
+            options[arg_name.lower()] = arg_value
+        else:
+            dumps.append(arg)
+    if len(dumps) == 0 and "--merge" not in options:
+        dumps.append('name32 table.bin')
+    workers = int(options.get("--workers", os.cpu_count() or 1))
+
+    time_start = time.perf_counter()
+    hash_by_name = {} if ("--merge" not in options) else read_results(options["--merge"])
+    if len(hash_by_name) > 0:
+        print("%s: %d names" % (options["--merge"], len(hash_by_name)))
+    for path in dumps:
+        names = read_string_table(path)
+        print("%s: %d strings, %d new names" % (path, len(names), add_names(hash_by_name, names, workers)))
+    write_results(hash_by_name, options.get("--out", 'name32 table.tsv'))
+
+    collisions = find_collisions(hash_by_name)
+    if "--collisions" in options:
+        write_collision_report(collisions, hash_by_name, options["--collisions"])
+    else:
+        for namehash, names in sorted(collisions.items()):
+            print("#Collision with 0x%08x: %s" % (namehash, str(names)))
+    print("%d names, %d collisions, %.2f s" % (len(hash_by_name), len(collisions), time.perf_counter() - time_start))
+
+if __name__ == "__main__":
+    main(sys.argv)
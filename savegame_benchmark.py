@@ -0,0 +1,287 @@
+import sys
+import os
+import io
+import contextlib
+import time
+import json
+import zlib
+import random
+import struct
+import tracemalloc
+import savegame_schema
+import savegame_body
+
+# Benchmark for savegame_body.py on synthetic saves (real saves cannot be shipped).
+# The generator builds the json representation of a body from the field layout in savegame_schema.py with random values
+#  and composes it through EraSerdes, so every era_format / body_format branch produces a valid body.
+# Each step is timed separately (best of several runs), and the results can be saved as a baseline to flag slowdowns later.
+
+BENCHMARK_OPS = ("checksum", "decompress", "extract_json", "compose_json", "compress", "compress_parallel")
+ERA_FORMATS = tuple(range(0x18, 0x2A))
+BODY_FORMATS = (0, 1, 2)
+SAVEGAME_HEADER_SIZE = 0xD0
+
+class BodyGenerator:
+    #images: Number of fieldEra20 map images, depth: Variant nesting depth, array_len: Length of the other arrays,
+    # map_entries: Length of fieldEra310_mapdata_2 (3 Variants each).
+    def __init__(self, seed=1, images=2, depth=3, array_len=50, map_entries=100):
+        self.rand = random.Random(seed)
+        self.depth = depth
+        self.array_lens = {"fieldEra20": images, "fieldEra310": map_entries}
+        self.array_len = array_len
+        self.variant_types = [typeinfo[0] for typeinfo in savegame_body._variant_typeinfo_lookup if typeinfo[0] is not None]
+
+    def _float(self):
+        return struct.unpack(">f", struct.pack(">f", self.rand.uniform(-1000, 1000)))[0]
+    def _scalar(self, typename):
+        r = self.rand
+        codes = savegame_schema.SCALAR_TYPES[typename].codes
+        if typename == "bool":
+            return r.random() < 0.5
+        if typename == "Name32":
+            return ['0x%08x' % r.getrandbits(32), 0, r.random() < 0.5]
+        if typename == "UVector2":
+            return [[self._float(), self._float()], [self._float(), self._float()]]
+        if codes[0] in "fd":
+            return self._float() if (len(codes) == 1) else [self._float() for c in codes]
+        size = struct.calcsize(codes)
+        if codes in "bhiq":
+            val = r.randint(-(1 << (8*size-1)), (1 << (8*size-1)) - 1)
+        else:
+            val = r.getrandbits(8*size)
+        return str(val) if (size == 8) else val
+    def _image(self, size):
+        #Runs of equal pixels, to compress roughly like the actual map images (random bytes would not compress at all).
+        r = self.rand
+        data = bytearray()
+        while len(data) < size:
+            data += r.randbytes(4) * r.randint(1, 32)
+        return bytes(data[:size])
+    def _string(self, max_len=24):
+        return ''.join(self.rand.choice("abcdefghijklmnopqrstuvwxyz_0123456789") for i in range(self.rand.randint(0, max_len)))
+    def _variant(self, depth):
+        types = self.variant_types
+        if depth <= 0:
+            types = [typename for typename in types if typename not in ("VariantArray", "VariantDictionary")]
+        typename = self.rand.choice(types)
+        if typename in savegame_schema.SCALAR_TYPES:
+            val = self._scalar(typename)
+        elif typename == "Rect":
+            val = {"uint16 a": self._scalar("uint16"), "uint16 b": self._scalar("uint16")}
+        elif typename == "Ref":
+            val = [self._scalar("uint32"), self._scalar("uint64"), self._scalar("bool")]
+        elif typename == "VariantArray":
+            val = [self._variant(depth-1) for i in range(self.rand.randint(0, 3))]
+        elif typename == "VariantDictionary":
+            val = [{"string key": self._string(), "Variant value": self._variant(depth-1)} for i in range(self.rand.randint(0, 3))]
+        elif typename == "Curve":
+            val = [self.value(savegame_schema.CURVE_ELEMENT) for i in range(self.rand.randint(0, 5))]
+        else:
+            val = None #void_or_null
+        return {typename: val}
+
+    def value(self, fldtype, array_len=None):
+        #Random json representation of a value of the given field type.
+        if isinstance(fldtype, str) and fldtype in savegame_schema.SCALAR_TYPES:
+            return self._scalar(fldtype)
+        if isinstance(fldtype, savegame_schema.BinaryType):
+            return self._image(fldtype.size) if (fldtype.size >= 0x1000) else self.rand.randbytes(fldtype.size)
+        if isinstance(fldtype, savegame_schema.ArrayType):
+            return [self.value(fldtype.element) for i in range(self.array_len if (array_len is None) else array_len)]
+        if isinstance(fldtype, savegame_schema.RecordType):
+            return {fld.name: self.value(fld.type) for fld in fldtype.fields}
+        if fldtype == "string":
+            return self._string()
+        if fldtype == "json":
+            return {"name": self._string(), "values": [self.rand.randint(0, 100) for i in range(8)]}
+        if fldtype == "binaryarray":
+            return self.rand.randbytes(self.rand.randint(0, 64))
+        if fldtype == "Variant":
+            return self._variant(self.depth)
+        raise ValueError("Unknown field type %s" % str(fldtype))
+
+    def body_obj(self, era_format, body_format):
+        fields = list(savegame_schema.CORE_HEADER_FIELDS)
+        fields += [fld for fld in savegame_schema.CORE_FIELDS if savegame_schema.field_enabled(fld, body_format)]
+        fields += [fld for fld in savegame_schema.ERA_FIELDS if savegame_schema.field_enabled(fld, era_format)]
+        body_obj = {}
+        for fld in fields:
+            fieldname_short = savegame_body.FledgeSerdes._fieldname_short(fld.name).split(' ')[-1]
+            body_obj[fld.name] = self.value(fld.type, self.array_lens.get(fieldname_short))
+        body_obj["uint32 fieldCore30_format"] = body_format
+        return body_obj
+
+def generate_save(era_format, body_format, compress=True, **kwargs):
+    #Returns (header, body, .sav file contents) of a synthetic save. kwargs: See BodyGenerator.
+    header = struct.pack("<I", era_format) + bytes(SAVEGAME_HEADER_SIZE - 4)
+    body_obj = BodyGenerator(**kwargs).body_obj(era_format, body_format)
+    body = savegame_body.compose_body(header, body_obj)
+    return header, body, savegame_body.compose(header, body, compress)
+
+
+def _time_op(fn, repeat):
+    best = None
+    for i in range(repeat):
+        time_start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - time_start
+        best = elapsed if (best is None) else min(best, elapsed)
+    return best
+
+def _peak_alloc(fn):
+    #Peak of the Python allocations during one run (measured separately, tracemalloc slows down the run).
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def peak_rss():
+    #Peak resident set size of this process in bytes, None if not available (e.g. on Windows).
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if (sys.platform == "darwin") else rss * 1024
+
+def benchmark_save(header, body, repeat=3, measure_memory=True, compress_threads=4):
+    #Returns {op: (seconds, peak allocation in bytes or None)} for one save.
+    #compress_parallel: As compress, with savegame_body.compress_body on compress_threads threads.
+    compressor_out = [None]
+    body_json = [None]
+    def op_checksum():
+        savegame_body.compute_checksum(body)
+    def op_compress():
+        compressor_out[0] = savegame_body.compress_body(body)
+    def op_compress_parallel():
+        savegame_body.compress_body(body, threads=compress_threads)
+    def op_decompress():
+        decompressor = zlib.decompressobj(wbits=15)
+        decompressor.decompress(compressor_out[0])
+        decompressor.flush()
+    def op_extract_json():
+        body_json[0] = json.dumps(savegame_body.extract(header, body), indent=4)
+    def op_compose_json():
+        savegame_body.compose_body(header, json.loads(body_json[0]))
+    op_fns = {"checksum": op_checksum, "compress": op_compress, "decompress": op_decompress, "extract_json": op_extract_json, "compose_json": op_compose_json,
+        "compress_parallel": op_compress_parallel}
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()): #Warnings printed by savegame_body (e.g. for the rest fields)
+        for op in ("checksum", "compress", "decompress", "extract_json", "compose_json", "compress_parallel"): #Order: Later steps need the earlier results.
+            seconds = _time_op(op_fns[op], repeat)
+            results[op] = (seconds, _peak_alloc(op_fns[op]) if measure_memory else None)
+    return results
+
+def run_benchmark(era_formats=ERA_FORMATS, body_formats=BODY_FORMATS, repeat=3, measure_memory=True, verbose=False, compress_threads=4, **kwargs):
+    #Benchmarks every combination of era_format and body_format. Returns {op: {"seconds", "mb", "mb_per_s", "peak_alloc_mib"}}.
+    totals = {op: [0.0, 0, 0] for op in BENCHMARK_OPS}
+    for era_format in era_formats:
+        for body_format in body_formats:
+            header, body, sav_data = generate_save(era_format, body_format, **kwargs)
+            results = benchmark_save(header, body, repeat, measure_memory, compress_threads)
+            for op, (seconds, peak_alloc) in results.items():
+                totals[op][0] += seconds
+                totals[op][1] += len(body)
+                totals[op][2] = max(totals[op][2], peak_alloc or 0)
+            if verbose:
+                print("era_format 0x%02x, body_format %d: %d bytes  %s" % (era_format, body_format, len(body),
+                    "  ".join("%s %.1f ms" % (op, results[op][0] * 1000) for op in BENCHMARK_OPS)))
+    return {op: {"seconds": seconds, "mb": body_bytes / 1e6, "mb_per_s": body_bytes / 1e6 / max(seconds, 1e-9),
+        "peak_alloc_mib": (peak_alloc / 0x100000) if measure_memory else None} for op, (seconds, body_bytes, peak_alloc) in totals.items()}
+
+def compare_baseline(results, baseline, tolerance):
+    #Returns the ops that are slower than in the baseline by more than tolerance (fraction).
+    slower = []
+    for op, result in results.items():
+        if op in baseline["results"] and result["mb_per_s"] < baseline["results"][op]["mb_per_s"] * (1 - tolerance):
+            slower.append(op)
+    return slower
+
+def print_usage():
+    print("Usage: ")
+    print("savegame_benchmark {options}")
+    print(" -> Generates synthetic saves for each era_format / body_format and times checksum, decompress, extract_json, compose_json, compress")
+    print("    and compress_parallel (compress with blocks on a thread pool).")
+    print(" Options:")
+    print(" --era-formats=<list>: Comma separated era formats (hex or decimal). Default: 0x18 to 0x29.")
+    print(" --body-formats=<list>: Comma separated Core body formats. Default: 0,1,2.")
+    print(" --images=<n>: Number of map images (256 KiB each). Default: 2.")
+    print(" --depth=<n>: Variant nesting depth. Default: 3.")
+    print(" --array-len=<n>: Length of the other arrays. Default: 50.")
+    print(" --map-entries=<n>: Length of fieldEra310_mapdata_2. Default: 100.")
+    print(" --seed=<n>: Random seed. Default: 1.")
+    print(" --compress-threads=<n>: Threads for compress_parallel. Default: 4.")
+    print(" --repeat=<n>: Runs per step, the best time counts. Default: 3.")
+    print(" --no-memory: Skips the per step allocation measurement.")
+    print(" --verbose: Prints the times per save.")
+    print(" --save-baseline=<file>: Writes the results as a baseline.")
+    print(" --baseline=<file>: Compares against a baseline, the exit code is 1 if a step got slower.")
+    print(" --tolerance=<percent>: Allowed slowdown against the baseline. Default: 10.")
+    print(" --write-saves=<dir>: Only writes the generated saves as <dir>/e<era_format>_b<body_format>.sav.")
+
+def main(argv):
+    options = {}
+    value_options = ("--era-formats", "--body-formats", "--images", "--depth", "--array-len", "--map-entries", "--seed", "--repeat",
+        "--save-baseline", "--baseline", "--tolerance", "--write-saves", "--compress-threads")
+    for arg in argv[1:]:
+        arg_name, arg_sep, arg_value = arg.partition("=")
+        arg_name = arg_name.lower()
+        if (arg_sep != "" and arg_name in value_options) or (arg_sep == "" and arg_name in ("--no-memory", "--verbose")):
+            options[arg_name] = arg_value
+        else:
+            print("Unknown option argument '%s'" % arg)
+            print_usage()
+            return 2
+    era_formats = [int(val, 0) for val in options["--era-formats"].split(",")] if ("--era-formats" in options) else ERA_FORMATS
+    body_formats = [int(val, 0) for val in options["--body-formats"].split(",")] if ("--body-formats" in options) else BODY_FORMATS
+    params = {
+        "seed": int(options.get("--seed", 1)),
+        "images": int(options.get("--images", 2)),
+        "depth": int(options.get("--depth", 3)),
+        "array_len": int(options.get("--array-len", 50)),
+        "map_entries": int(options.get("--map-entries", 100)),
+    }
+    if "--write-saves" in options:
+        os.makedirs(options["--write-saves"], exist_ok=True)
+        for era_format in era_formats:
+            for body_format in body_formats:
+                header, body, sav_data = generate_save(era_format, body_format, **params)
+                with open(os.path.join(options["--write-saves"], "e%02x_b%d.sav" % (era_format, body_format)), 'wb') as fout:
+                    fout.write(sav_data)
+        return 0
+
+    repeat = int(options.get("--repeat", 3))
+    measure_memory = "--no-memory" not in options
+    print("%d era format(s) x %d body format(s), %s, repeat %d" % (len(era_formats), len(body_formats),
+        ", ".join("%s %d" % (key, val) for key, val in params.items()), repeat))
+    compress_threads = int(options.get("--compress-threads", 4))
+    results = run_benchmark(era_formats, body_formats, repeat, measure_memory, "--verbose" in options, compress_threads, **params)
+    print("%-18s %10s %10s %10s %16s" % ("step", "MB", "seconds", "MB/s", "peak alloc MiB"))
+    for op in BENCHMARK_OPS:
+        result = results[op]
+        print("%-18s %10.2f %10.4f %10.1f %16s" % (op, result["mb"], result["seconds"], result["mb_per_s"],
+            "-" if (result["peak_alloc_mib"] is None) else "%.1f" % result["peak_alloc_mib"]))
+    rss = peak_rss()
+    print("Peak RSS: %s" % ("n/a" if (rss is None) else "%.1f MiB" % (rss / 0x100000)))
+
+    run_info = {"params": params, "era_formats": list(era_formats), "body_formats": list(body_formats), "python": sys.version.split()[0], "results": results}
+    if "--save-baseline" in options:
+        with open(options["--save-baseline"], 'w') as fout:
+            json.dump(run_info, fout, indent=4)
+    if "--baseline" in options:
+        with open(options["--baseline"], 'r') as fin:
+            baseline = json.load(fin)
+        if baseline["params"] != params or baseline["era_formats"] != run_info["era_formats"] or baseline["body_formats"] != run_info["body_formats"]:
+            print("Warning: The baseline was made with different parameters.")
+        slower = compare_baseline(results, baseline, float(options.get("--tolerance", 10)) / 100)
+        for op in BENCHMARK_OPS:
+            if op in baseline["results"]:
+                print("%-18s %10.1f MB/s -> %10.1f MB/s  %s" % (op, baseline["results"][op]["mb_per_s"], results[op]["mb_per_s"], "SLOWER" if (op in slower) else "ok"))
+        if len(slower) > 0:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,12 +1,20 @@
-import zlib
 import sys
+import os
+import time
 import struct
 import math
-import base64
-import json
+import mmap
+import collections
+import array
+import io
+from sdbm_hash import sdbm, sdbm_update, sdbm_replace
+import savegame_schema
 
 savegame_has_checksum=True
 ATLASFALLEN_MAGIC=0x7A145F28
+MAX_BODY_SIZE=0x10000000 #Larger (advertised or decompressed) bodies are rejected, to not run out of memory on corrupt files.
+SAVEGAME_READ_CHUNK=0x100000
+SAVEGAME_COMPRESS_BLOCK=0x100000 #Block size for compress_body with threads
 
 
 def print_usage():
@@ -19,119 +27,184 @@ def print_usage():
     print(" Options:")
     print(" --skip-era: Skips processing the game-specific portion of the save game body. May help with bugs or new game versions.")
     print(" --keep-inner-json-as-string: Will export the inner json as a raw string, to produce a 1:1 representation down to the characters.")
+    print(" --name32-index=<index file>: Appends the known names to each Name32 value, from an index built with name32_index.py. Ignored by compose_json.")
+    print(" --sidecar: Writes binary fields (e.g. the map images) to <json body out without extension>.bin instead of as base64,")
+    print("            referenced from the json by offset, size and hash. compose_json reads them from there.")
+    print(" --stream: Writes each top level field as soon as it is parsed, instead of building the whole json first. Uses less memory.")
+    print(" --cache=<dir>: Keeps the parsed bodies in a cache directory, keyed by the header and stored checksum. Saves that were")
+    print("                extracted before are not decompressed and parsed again. Not used with --sidecar, --stream or profiling.")
+    print(" --cache-size=<MiB>: Size limit of the cache directory, least recently used entries are removed first. Default: 512.")
     print("")
     print("savegame_body compose_raw <sav file in> <raw body in> <sav file out> {options}")
     print(" -> Replaces the body in a save file from raw data.")
     print(" Options:")
     print(" --compress: Compresses the contents.")
+    print(" --compress-level=<0-9>: zlib compression level. Default: zlib default (6), which can reproduce the game's files.")
+    print(" --compress-threads=<n>: Compresses 1 MiB blocks on n threads. Faster for large bodies, but not identical to the game's files. Default: 1.")
     print("")
     print("savegame_body compose_json <sav file in> <json body in> <sav file out> {options}")
     print(" -> Replaces the body in a save file from a json representation.")
+    print(" Options: As for compose_raw, and")
+    print(" --stream: Reads the json one top level field at a time, in the order written by extract_json. Uses less memory.")
+    print("           Without --stream, top level fields that did not change are copied from the body of <sav file in> instead of encoded.")
+    print(" --cache=<dir>: Takes the original values to compare with from the cache of extract_json, instead of parsing <sav file in>.")
+    print(" --skip-era, --keep-inner-json-as-string: With --cache, the options extract_json was run with, to find its cache entry.")
+    print("")
+    print("savegame_body extract_json_batch <sav dir or glob> <json out dir> {options}")
+    print(" -> Runs extract_json for each save file, writing <json out dir>/<name>.json.")
+    print(" Options: As for extract_json, and")
+    print(" --workers=<n>: Number of worker processes. Default: Number of CPUs.")
+    print("")
+    print("savegame_body compose_json_batch <sav dir or glob> <json dir> <sav out dir> {options}")
+    print(" -> Runs compose_json for each save file, reading <json dir>/<name>.json and writing <sav out dir>/<name>.sav.")
+    print(" Options: As for compose_json, and")
+    print(" --workers=<n>: Number of worker processes. Default: Number of CPUs.")
+    print("")
+    print("savegame_body query <sav file in> {<field path>} {options}")
+    print(" -> Prints the values of the given fields as json, decoding only those fields. Without field paths, lists the top level fields with offset and size.")
+    print(" Field paths follow the json structure, separated by '/'. Names can be given without the type and the '_<description>' suffix, e.g. fieldEra40 or fieldEra20/0/field00.")
     print(" Options:")
-    print(" --compress: Compresses the contents.")
-if len(sys.argv) < 2:
-    print("Missing option.")
-    print_usage()
-    exit()
-mode = sys.argv[1]
-flags = set()
-if mode == "extract_raw" or mode == "extract_json":
-    if len(sys.argv) != 4:
-        if len(sys.argv) < 4:
-            print("Missing arguments.")
-        else:
-            ALLOWED_FLAGS = set(["--skip-era","--keep-inner-json-as-string"])
-            for i in range(4, len(sys.argv)):
-                arg = sys.argv[i].lower()
-                if arg in ALLOWED_FLAGS:
-                    flags.add(arg)
-                else:
-                    print("Unknown option argument '%s'" % arg)
-                    print_usage()
-                    exit()
-elif mode == "compose_raw" or mode == "compose_json":
-    if len(sys.argv) != 5:
-        if len(sys.argv) < 5:
-            print("Missing arguments.")
-        else:
-            ALLOWED_FLAGS = set(["--compress"])
-            for i in range(5, len(sys.argv)):
-                arg = sys.argv[i].lower()
-                if arg in ALLOWED_FLAGS:
-                    flags.add(arg)
-                else:
-                    print("Unknown option argument '%s'" % arg)
-                    print_usage()
-                    exit()
-else:
-    print_usage()
-    exit()
+    print(" --keep-inner-json-as-string: As for extract_json.")
+    print("")
+    print("savegame_body patch <sav file in> <sav file out> {<field path>=<json value>} {options}")
+    print(" -> Replaces single fields without a json round trip. Field paths as for query, values as in the extract_json output.")
+    print("    Values that are not valid json are taken as strings. The compression of the input file is kept.")
+    print(" Options:")
+    print(" --in-place: Patches <sav file in> itself (leave out <sav file out>). For uncompressed files, only the changed bytes and the checksum are written,")
+    print("             assuming the stored checksum is correct.")
+    print("")
+    print("savegame_body diff <sav file a> <sav file b> {options}")
+    print(" -> Prints the differences from a to b by field path, with old and new values. Binary fields (e.g. the map images) are summarized")
+    print("    as ranges of changed 32-bit words. The exit code is 1 if the saves differ.")
+    print(" Options:")
+    print(" --keep-inner-json-as-string: As for extract_json.")
+    print(" --json: Prints the differences as json.")
+    print("")
+    print("savegame_body watch <sav dir> <json out dir> {options}")
+    print(" -> Keeps <json out dir>/<name>.json up to date with the save files in <sav dir>, re-extracting only saves whose content changed.")
+    print(" Options: As for extract_json, and")
+    print(" --workers=<n>: Number of worker processes. Default: Number of CPUs.")
+    print(" --interval=<seconds>: Time between polls of the directory. Default: 1.")
+    print(" --debounce=<seconds>: Time a changed file has to stay unchanged before it is read. Default: 1.")
+    print(" --once: Extracts the saves that are new or changed since the last run and exits.")
+    print("")
+    print("savegame_body scan <sav dir or glob> {options}")
+    print(" -> Lists magic, stored checksum, era_format and body sizes of each save file as a table, reading only the first few hundred bytes.")
+    print("    Sizes that do not match the file are listed below the file, without decompressing. The exit code is 1 if any file has problems.")
+    print(" Options:")
+    print(" --json: Prints one json object per file and line instead (NDJSON).")
+    print(" --workers=<n>: Number of threads reading the files concurrently, e.g. for network drives. Default: 1.")
+    print("")
+    print("savegame_body info <sav file> {<sav file>} {options}")
+    print(" -> As scan, printing each value on its own line.")
+    print(" Options:")
+    print(" --json: As for scan.")
+    print("")
+    print("savegame_body index <sav dir or glob> <database file> {options}")
+    print(" -> Stores the scalar fields of each save file in an SQLite database (tables saves and fields), for queries across many saves.")
+    print("    Saves whose stored checksum did not change since the last run are skipped, saves that no longer exist are removed.")
+    print(" Options:")
+    print(" --skip-era, --keep-inner-json-as-string: As for extract_json.")
+    print(" --workers=<n>: Number of worker processes. Default: Number of CPUs.")
+    print("")
+    print(" Profiling options for extract_json and compose_json:")
+    print(" --profile: Prints the time, bytes consumed (input body) and bytes emitted (output body) per field path and per Variant type.")
+    print(" --profile-out=<file>: Writes the profile as json (.json) or as folded stacks for flamegraph.pl (other extensions).")
 
 def compute_checksum(data):
-    # Matches 'sdbm' (http://www.cse.yorku.ca/~oz/hash.html#sdbm)
-    sum = 0
-    for i in range(len(data)):
-        sum = ((sum*0x1003F)&0xFFFFFFFF) + data[i]
-        sum = sum&0xFFFFFFFF
-    return sum
+    # Matches 'sdbm' (http://www.cse.yorku.ca/~oz/hash.html#sdbm), see sdbm_hash.py
+    return sdbm(data)
+
+def _unpack_array(typecode, data):
+    #Big endian values as an array.array, byteswapped once.
+    values = array.array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'little' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+def _marshal_dump(value):
+    #Serialized value for comparisons, stricter than == (e.g. 1 != 1.0 != True, 0.0 != -0.0). None if it cannot be serialized.
+    # Version 2: Does not depend on object identity (no back references), unlike the default version.
+    import marshal
+    try:
+        return marshal.dumps(value, 2)
+    except ValueError:
+        return None
+
+_JSON_FIELD_NAMES = {fld.name for fld in savegame_schema.CORE_HEADER_FIELDS + savegame_schema.CORE_FIELDS + savegame_schema.ERA_FIELDS if fld.type == "json"}
+
+def _passthrough_value(fieldname, value):
+    #Value of a top level field as compared for compose_body with body_orig. Inner json as the string that is written
+    # (see _serdes_json_asstring), since different strings (e.g. with spaces) parse to the same value.
+    if fieldname in _JSON_FIELD_NAMES and value is not None and not isinstance(value, str):
+        import json
+        return json.dumps(value, separators=(',', ':'))
+    return value
+
+def _json_field_string(data):
+    #Inner json string of an encoded json field (uint32 length with string flag, utf8, padding).
+    str_len = _codec_uint32.struct.unpack_from(data, 0)[0] & ~0x80000000
+    return str(data[4:4+str_len], 'utf8')
 
 class FledgeSerdes:
-    def __init__(self, body_in=b'', keep_inner_json_as_string=False):
+    _skip_record = None #Skip table under construction (see _build_skip_table)
+    _skip_table = None
+    sidecar = None #Container for binary fields (SidecarWriter when extracting, SidecarReader when composing). None: Inline base64.
+    top_level_out = None #Receives the top level fields instead of a new dict (e.g. JsonObjectWriter)
+    typed_arrays = False #Arrays of single numeric scalars as array.array instead of lists (see json_default)
+    orig_fields = None #Composing: {top level field name: (marshal dump of the value, encoded bytes)}, copied if the value is unchanged (see compose_body)
+    _orig_record = None #orig_fields under construction (see _original_fields)
+    def __init__(self, body_in=b'', keep_inner_json_as_string=False, extract_only=False):
+        #extract_only: Parse body_in in place through a memoryview, without building body_out (which stays None).
         self.offs=0
-        self.body_in = body_in
-        self.body_out=bytearray()
+        self.body_in = memoryview(body_in) if (extract_only and body_in is not None) else body_in
+        self.body_out = None if extract_only else bytearray()
         self.keep_inner_json_as_string = keep_inner_json_as_string;
+    def _out_pos(self):
+        #Length of body_out, or the length it would have in extract_only mode (extraction copies the input sequentially).
+        return len(self.body_out) if (self.body_out is not None) else min(self.offs, len(self.body_in))
+    def _serdes_scalar(self, codec, deser_in=None): #Helper for fixed size types, codec from savegame_schema.SCALAR_CODECS
+        st = codec.struct
+        offs = self.offs
+        if deser_in is None:
+            if self.body_out is not None:
+                self.body_out += self.body_in[offs:offs+st.size]
+            vals = st.unpack_from(self.body_in, offs)
+        else:
+            flat = []
+            codec.encode(flat, deser_in)
+            data = st.pack(*flat)
+            self.body_out += data
+            vals = st.unpack(data)
+        self.offs = offs + st.size
+        return codec.decode(vals, 0)
     def _serdes_int8(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+1] if (deser_in is None) else struct.pack(">b",deser_in)
-        self.offs+=1
-        return struct.unpack(">b", self.body_out[-1:])[0]
+        return self._serdes_scalar(_codec_int8, deser_in)
     def _serdes_uint8(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+1] if (deser_in is None) else struct.pack(">B",deser_in)
-        self.offs+=1
-        return struct.unpack(">B", self.body_out[-1:])[0]
+        return self._serdes_scalar(_codec_uint8, deser_in)
     def _serdes_int16(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+2] if (deser_in is None) else struct.pack(">h",deser_in)
-        self.offs+=2
-        return struct.unpack(">h", self.body_out[-2:])[0]
+        return self._serdes_scalar(_codec_int16, deser_in)
     def _serdes_uint16(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+2] if (deser_in is None) else struct.pack(">H",deser_in)
-        self.offs+=2
-        return struct.unpack(">H", self.body_out[-2:])[0]
+        return self._serdes_scalar(_codec_uint16, deser_in)
     def _serdes_int32(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+4] if (deser_in is None) else struct.pack(">i",deser_in)
-        self.offs+=4
-        return struct.unpack(">i", self.body_out[-4:])[0]
+        return self._serdes_scalar(_codec_int32, deser_in)
     def _serdes_uint32(self, deser_in=None, ref_orig=None):
         if ref_orig is not None:
-            ref_orig[0] = 0 if (self.body_in is None) else struct.unpack(">I", self.body_in[self.offs:self.offs+4])[0]
-        self.body_out += self.body_in[self.offs:self.offs+4] if (deser_in is None) else struct.pack(">I",deser_in)
-        self.offs+=4
-        return struct.unpack(">I", self.body_out[-4:])[0]
+            ref_orig[0] = 0 if (self.body_in is None) else _codec_uint32.struct.unpack_from(self.body_in, self.offs)[0]
+        return self._serdes_scalar(_codec_uint32, deser_in)
     def _serdes_int64(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+8] if (deser_in is None) else struct.pack(">q",int(deser_in))
-        self.offs+=8
-        return str(struct.unpack(">q", self.body_out[-8:])[0]) #JSON numbers only fit 53 int bits.
+        return self._serdes_scalar(_codec_int64, deser_in)
     def _serdes_uint64(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+8] if (deser_in is None) else struct.pack(">Q",int(deser_in))
-        self.offs+=8
-        return str(struct.unpack(">Q", self.body_out[-8:])[0]) #JSON numbers only fit 53 int bits.
+        return self._serdes_scalar(_codec_uint64, deser_in)
     def _serdes_bool(self, deser_in=None):
-        ret = self._serdes_uint32(None if (deser_in is None) else (1 if (deser_in == True) else 0))
-        if ret > 1:
-            raise ValueError("bool representation is not in [0,1]")
-        return ret != 0
+        return self._serdes_scalar(_codec_bool, deser_in)
     def _check_nan(val):
-        if math.isnan(val):
-            raise ValueError("float/double is NaN") #There are lots of possible NaN encodings, the json representation wouldn't be precise anymore.
-        return val
+        return savegame_schema.check_nan(val)
     def _serdes_float(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+4] if (deser_in is None) else struct.pack(">f",deser_in)
-        self.offs+=4
-        return FledgeSerdes._check_nan(struct.unpack(">f", self.body_out[-4:])[0])
+        return self._serdes_scalar(_codec_float, deser_in)
     def _serdes_double(self, deser_in=None):
-        self.body_out += self.body_in[self.offs:self.offs+8] if (deser_in is None) else struct.pack(">d",deser_in)
-        self.offs+=8
-        return FledgeSerdes._check_nan(struct.unpack(">d", self.body_out[-8:])[0])
+        return self._serdes_scalar(_codec_double, deser_in)
     def _serdes_string(self, deser_in=None, set_stringflag=True):
         if deser_in is not None:
             deser_in = deser_in.encode('utf8') #Assuming utf8 is correct
@@ -143,29 +216,54 @@ class FledgeSerdes:
         str_len = str_len & ~0x80000000
         str_len_padded = ((str_len) + 3) & ~3
         if deser_in is None:
-            self.body_out += self.body_in[self.offs:self.offs+str_len_padded]
+            buf, buf_offs = self.body_in, self.offs
+            if self.body_out is not None:
+                self.body_out += buf[buf_offs:buf_offs+str_len_padded]
         else:
             self.body_out += deser_in
             self.body_out += b'\x00' * (str_len_padded - str_len)
+            buf, buf_offs = self.body_out, len(self.body_out)-str_len_padded
         self.offs+=((~0x80000000 & str_len_orig) + 3) & ~3
         for i in range(str_len, str_len_padded):
-            if self.body_out[len(self.body_out)-str_len_padded+i] != 0:
+            if buf[buf_offs+i] != 0:
                 raise ValueError("string is not zero-padded correctly")
-        return self.body_out[len(self.body_out)-str_len_padded:len(self.body_out)-str_len_padded+str_len].decode('utf8') #Assuming utf8 is correct
-        
+        return str(buf[buf_offs:buf_offs+str_len], 'utf8') #Assuming utf8 is correct
+
+    def _binary_in(self, deser_in):
+        #Binary data from its json representation: base64 string or sidecar reference.
+        import base64
+        if isinstance(deser_in, str):
+            return base64.b64decode(deser_in)
+        if isinstance(deser_in, dict):
+            if self.sidecar is None:
+                raise ValueError("Binary field references a sidecar file, but none is available")
+            return self.sidecar.read(deser_in)
+        return deser_in
+    def _binary_out(self, data, deser_in=None):
+        import base64
+        if isinstance(deser_in, (str, dict)):
+            return deser_in #Composing: Keep the input representation instead of encoding the data again.
+        if self.sidecar is not None and deser_in is None:
+            return self.sidecar.add(data)
+        return base64.b64encode(data).decode('utf8')
     def _serdes_binary_unaligned(self, bin_len_in, deser_in=None): #Helper for rest
+        deser_in_json = deser_in
         if deser_in is not None:
-            deser_in = base64.b64decode(deser_in) if isinstance(deser_in,str) else deser_in
+            deser_in = self._binary_in(deser_in)
             bin_len_written = len(deser_in)
             self.body_out += deser_in
+            bin_out = self.body_out[len(self.body_out)-bin_len_written:]
         else:
             bin_len_written=bin_len_in
-            self.body_out += self.body_in[self.offs:self.offs+bin_len_written]
+            bin_out = self.body_in[self.offs:self.offs+bin_len_written]
+            if self.body_out is not None:
+                self.body_out += bin_out
         self.offs += bin_len_in
-        return base64.b64encode(self.body_out[len(self.body_out)-bin_len_written:]).decode('utf8')
+        return self._binary_out(bin_out, deser_in_json)
     def _serdes_binary_aligned(self, bin_len_in, deser_in=None):
+        deser_in_json = deser_in
         if deser_in is not None:
-            deser_in = base64.b64decode(deser_in) if isinstance(deser_in,str) else deser_in
+            deser_in = self._binary_in(deser_in)
             bin_len_actual = len(deser_in)
             if (len(deser_in) & 3) != 0:
                 deser_in += b'\x00' * (3 - ((len(deser_in) + 3) & 3))
@@ -173,27 +271,125 @@ class FledgeSerdes:
             if len(deser_in) != ((bin_len_actual+3)&~3):
                 raise ValueError("padded binary length does not match up")
             self.body_out += deser_in
+            buf, buf_offs = self.body_out, len(self.body_out)-bin_len_written
         else:
             bin_len_actual=bin_len_in
             bin_len_written=((bin_len_in+3) & ~3)
-            self.body_out += self.body_in[self.offs:self.offs+bin_len_written]
+            buf, buf_offs = self.body_in, self.offs
+            if self.body_out is not None:
+                self.body_out += buf[buf_offs:buf_offs+bin_len_written]
+            else:
+                bin_len_written = max(0, min(bin_len_written, len(buf)-buf_offs)) #Only check the padding that is actually there.
         self.offs += ((bin_len_in+3) & ~3)
         for i in range(bin_len_actual, bin_len_written):
-            if self.body_out[len(self.body_out)-bin_len_written+i] != 0:
+            if buf[buf_offs+i] != 0:
                 raise ValueError("binary is not zero-padded correctly")
-        return base64.b64encode(self.body_out[len(self.body_out)-bin_len_written:len(self.body_out)-bin_len_written+bin_len_actual]).decode('utf8')
+        return self._binary_out(buf[buf_offs:buf_offs+bin_len_actual], deser_in_json)
     def _serdes_genericarray(self, deser_in, fn): #Helper to generically support 'uint32 len, datatype[len] data' arrays without alignment.
         deser_out = []
         offs_bak = self.offs
+        if deser_in is not None and self.body_in is not None:
+            orig_len = [0]
+            out_len = self._serdes_uint32(len(deser_in), orig_len)
+            body_in_bak = self.body_in
+            for i in range(out_len):
+                if i == orig_len[0]:
+                    self.body_in = None #No original elements left to follow.
+                deser_out.append(fn(deser_in[i]))
+            self.body_in = body_in_bak
+            self._skip_original(FledgeSerdes._serdes_genericarray, offs_bak, lambda: self._serdes_genericarray(None, fn))
+            return deser_out
         out_len = self._serdes_uint32(None if (deser_in is None) else len(deser_in))
         for i in range(out_len):
             deser_out.append(fn(None if (deser_in is None) else deser_in[i]))
-        if deser_in is not None and self.body_in is not None:
-            self.offs = offs_bak
-            body_out_bak=self.body_out
-            self.body_out=bytearray()
-            self._serdes_genericarray(None) #Make sure self.offs goes forward by the original array size.
-            self.body_out=body_out_bak
+        if self._skip_record is not None:
+            self._skip_record[(FledgeSerdes._serdes_genericarray, offs_bak)] = self.offs
+        return deser_out
+    def _serdes_fixedarray(self, element, deser_in=None): #Helper for arrays with fixed size elements, (un)packed with the precompiled element struct.
+        st = element.fixed.struct
+        offs_bak = self.offs
+        out_len = self._serdes_uint32(None if (deser_in is None) else len(deser_in))
+        if deser_in is None:
+            data = self.body_in[self.offs:self.offs+out_len*st.size]
+        elif element.typecode is not None: #The json values are the struct values: One pack for the whole array.
+            data = struct.pack('>%d%s' % (out_len, element.typecode), *deser_in)
+        else:
+            data = bytearray()
+            fields = element.fixed.fields
+            order_keys, order = None, None
+            for val in deser_in:
+                flat = []
+                if element.record:
+                    keys = tuple(val.keys())
+                    if keys != order_keys: #Position of each field in the values, resolved once for all elements with the same keys.
+                        positions = {shortname: i for i, shortname in reversed(tuple(enumerate(FledgeSerdes._fieldnames_short(keys))))} #First match wins, as in _serdes_record.
+                        order_keys, order = keys, [positions[fld.short] for fld in fields]
+                    vals = tuple(val.values())
+                    for fld, i in zip(fields, order):
+                        fld.encode(flat, vals[i])
+                else:
+                    element.fixed.fields[0].encode(flat, val)
+                data += st.pack(*flat)
+        if self.body_out is not None:
+            self.body_out += data
+        if (deser_in is not None) and (self.body_in is not None):
+            self.offs = offs_bak + 4 + _codec_uint32.struct.unpack_from(self.body_in, offs_bak)[0] * st.size #Go forward by the original array size.
+        else:
+            self.offs += out_len*st.size
+        if element.typecode is not None: #Single numbers: Unpack the whole array at once.
+            values = _unpack_array(element.typecode, data)
+            if element.typecode in 'fd' and any(map(math.isnan, values)):
+                raise ValueError("float/double is NaN")
+            return values if self.typed_arrays else values.tolist()
+        if element.record:
+            return [{fld.name: fld.decode(vals, fld.index) for fld in element.fixed.fields} for vals in st.iter_unpack(data)]
+        decode = element.fixed.fields[0].decode
+        return [decode(vals, 0) for vals in st.iter_unpack(data)]
+    def _skip_original(self, kind, offs_start, walk_fn):
+        #Composing with the original body: Make sure self.offs goes forward by the original size of the variable size
+        # value of the given kind (serdes method) at offs_start. Uses the skip table, built with one pass over body_in.
+        if self._skip_table is None:
+            self._skip_table = self._build_skip_table()
+        offs_end = self._skip_table.get((kind, offs_start))
+        if offs_end is not None:
+            self.offs = offs_end
+            return
+        #Not found in the original (e.g. its structure could not be parsed): Walk the original value.
+        self.offs = offs_start
+        body_out_bak=self.body_out
+        self.body_out=bytearray()
+        walk_fn()
+        self.body_out=body_out_bak
+    def _build_skip_table(self):
+        #Maps (serdes method, start offset) of every variant and variable size array in body_in to its end offset.
+        import copy
+        import contextlib
+        walker = copy.copy(self)
+        walker.offs = 0
+        walker.body_in = memoryview(self.body_in)
+        walker.body_out = None
+        walker.keep_inner_json_as_string = True
+        walker.sidecar = None #Only the composing pass uses the sidecar, output and original fields.
+        walker.top_level_out = None
+        walker.orig_fields = None
+        walker._orig_record = None
+        walker._skip_record = {}
+        try:
+            with contextlib.redirect_stdout(io.StringIO()): #Warnings were/will be printed by the actual pass.
+                walker.serdes_body(None)
+        except (ValueError, IndexError, struct.error):
+            pass #Keep what was found up to the error.
+        return walker._skip_record
+    def _serdes_array(self, element, deser_in=None): #'uint32 len, element[len] data', element compiled by savegame_schema.compile_element
+        if element.fixed is not None:
+            return self._serdes_fixedarray(element, deser_in)
+        if element.record:
+            return self._serdes_genericarray(deser_in, lambda val: self._serdes_record(element.steps, val))
+        step = element.steps[0]
+        return self._serdes_genericarray(deser_in, lambda val: step.fn(self, *step.args, val))
+    def _serdes_record(self, steps, deser_in=None):
+        deser_out = {}
+        self._serdes_plan(steps, deser_out, type(self)._opt_map_with_short_fieldnames_first(deser_in), False)
         return deser_out
     def _serdes_ref(self, deser_in=None, enable_ref_string=False):
         if deser_in is None:
@@ -206,41 +402,17 @@ class FledgeSerdes:
             deser_out.append(self._serdes_string(deser_in[3]))
         return deser_out
     def _serdes_name32(self, deser_in=None):
-        if deser_in is None:
-            deser_in = [None,None,None]
-        deser_out = [0,0,0]
-        deser_out[0] = '0x%08x'%self._serdes_uint32(None if (deser_in[0] is None) else int(deser_in[0],0))
-        deser_out[1] = self._serdes_uint32(deser_in[1])
-        deser_out[2] = self._serdes_bool(deser_in[2])
-        return deser_out
+        return self._serdes_scalar(_codec_name32, deser_in)
     def _serdes_degree(self, deser_in=None):
         return self._serdes_float(deser_in)
     def _serdes_radian(self, deser_in=None):
         return self._serdes_float(deser_in)
     def _serdes_vec2(self, deser_in=None):
-        if deser_in is None:
-            deser_in = [None,None]
-        deser_out = [0,0]
-        deser_out[0] = self._serdes_float(deser_in[0])
-        deser_out[1] = self._serdes_float(deser_in[1])
-        return deser_out
+        return self._serdes_scalar(_codec_vec2, deser_in)
     def _serdes_vec3(self, deser_in=None):
-        if deser_in is None:
-            deser_in = [None,None,None]
-        deser_out = [0,0,0]
-        deser_out[0] = self._serdes_float(deser_in[0])
-        deser_out[1] = self._serdes_float(deser_in[1])
-        deser_out[2] = self._serdes_float(deser_in[2])
-        return deser_out
+        return self._serdes_scalar(_codec_vec3, deser_in)
     def _serdes_vec4(self, deser_in=None):
-        if deser_in is None:
-            deser_in = [None,None,None,None]
-        deser_out = [0,0,0,0]
-        deser_out[0] = self._serdes_float(deser_in[0])
-        deser_out[1] = self._serdes_float(deser_in[1])
-        deser_out[2] = self._serdes_float(deser_in[2])
-        deser_out[3] = self._serdes_float(deser_in[3])
-        return deser_out
+        return self._serdes_scalar(_codec_vec4, deser_in)
     def _serdes_rotate(self, deser_in=None):
         return self._serdes_vec3(deser_in)
     def _serdes_quat(self, deser_in=None):
@@ -250,38 +422,26 @@ class FledgeSerdes:
     def _serdes_udim(self, deser_in=None):
         return self._serdes_vec2(deser_in)
     def _serdes_uvector2(self, deser_in=None):
-        if deser_in is None:
-            deser_in = [None,None]
-        deser_out = [0,0]
-        deser_out[0] = self._serdes_udim(deser_in[0])
-        deser_out[1] = self._serdes_udim(deser_in[1])
-        return deser_out
+        return self._serdes_scalar(_codec_uvector2, deser_in)
     def _serdes_rect(self, deser_in=None):
         deser_out = {}
-        deser_out["uint16 a"] = self._serdes_uint16(None if (deser_in is None) else deser_in[i]["uint16 a"])
-        deser_out["uint16 b"] = self._serdes_uint16(None if (deser_in is None) else deser_in[i]["uint16 b"])
+        deser_out["uint16 a"] = self._serdes_uint16(None if (deser_in is None) else deser_in["uint16 a"])
+        deser_out["uint16 b"] = self._serdes_uint16(None if (deser_in is None) else deser_in["uint16 b"])
         return deser_out
     def _serdes_curve(self, deser_in=None):
-        #Curve array element size: 28 bytes
-        return self._serdes_genericarray(deser_in, lambda val: {
-            "float a": self._serdes_float(None if (val is None) else val["float a"]),
-            "vec2 b": self._serdes_vec2(None if (val is None) else val["vec2 b"]),
-            "vec2 c": self._serdes_vec2(None if (val is None) else val["vec2 c"]),
-            "vec2 d": self._serdes_vec2(None if (val is None) else val["vec2 d"])
-        })
+        return self._serdes_array(_variant_curve_element, deser_in)
     def _serdes_void_or_null(self, deser_in=None):
         return None
     def _serdes_variantarray(self, deser_in=None):
         return self._serdes_genericarray(deser_in, lambda val:self._serdes_variant(val))
     def _serdes_variantdictionary(self, deser_in=None):
-        return self._serdes_genericarray(deser_in, lambda val: {
-            'string key': self._serdes_string(None if (val is None) else val['string key']),
-            'Variant value': self._serdes_variant(None if (val is None) else val['Variant value'])
-        })
-    
+        return self._serdes_array(self._variant_dictionary_element, deser_in)
+
     def __init_const__():
         global _variant_typeinfo_lookup
         global _variant_typename_reverse_lookup
+        global _variant_scalar_codecs
+        global _variant_curve_element
         _variant_typeinfo_lookup=[(None,None),
             ("bool", FledgeSerdes._serdes_bool), #1
             ("int32", FledgeSerdes._serdes_int32), #2
@@ -310,7 +470,11 @@ class FledgeSerdes:
             ("Curve", FledgeSerdes._serdes_curve) #25
         ]
         _variant_typename_reverse_lookup={_variant_typeinfo_lookup[typeid][0]:typeid for typeid in range(1,len(_variant_typeinfo_lookup))}
-    
+        #Fixed size variant types, (un)packed directly with the precompiled struct.
+        _variant_scalar_codecs=[savegame_schema.SCALAR_CODECS.get(typeinfo[0]) for typeinfo in _variant_typeinfo_lookup]
+        _variant_curve_element = savegame_schema.compile_element(FledgeSerdes, savegame_schema.CURVE_ELEMENT)
+        FledgeSerdes._variant_dictionary_element = savegame_schema.compile_element(FledgeSerdes, savegame_schema.VARIANT_DICTIONARY_ELEMENT) #Per class, see profiled_serdes
+
     def _typename_to_id(typename):
         if typename in _variant_typename_reverse_lookup:
             return _variant_typename_reverse_lookup[typename]
@@ -322,38 +486,92 @@ class FledgeSerdes:
         return _variant_typeinfo_lookup[typeid]
     def _serdes_variant(self, deser_in=None):
         offs_bak = self.offs
-        
-        deser_in_typeid = None if (deser_in is None) else FledgeSerdes._typename_to_id(next(iter(deser_in.keys())))        
-        out_typeinfo = FledgeSerdes._typeid_to_typeinfo( self._serdes_uint32(deser_in_typeid) )
-        
-        deser_out={out_typeinfo[0] : out_typeinfo[1](self,None if (deser_in is None) else deser_in[out_typeinfo[0]])}
-        
+
+        deser_in_typeid = None if (deser_in is None) else FledgeSerdes._typename_to_id(next(iter(deser_in.keys())))
+        out_typeid = self._serdes_uint32(deser_in_typeid)
+        out_typeinfo = FledgeSerdes._typeid_to_typeinfo(out_typeid)
+        out_codec = _variant_scalar_codecs[out_typeid]
+
+        value_in = None if (deser_in is None) else deser_in[out_typeinfo[0]]
+        body_in_bak = self.body_in
+        if deser_in is not None and self.body_in is not None and _codec_uint32.struct.unpack_from(self.body_in, offs_bak)[0] != out_typeid:
+            self.body_in = None #Different type than the original, nothing to follow.
+        deser_out={out_typeinfo[0] : out_typeinfo[1](self,value_in) if (out_codec is None) else self._serdes_scalar(out_codec,value_in)}
+        self.body_in = body_in_bak
+
         if deser_in is not None and self.body_in is not None:
-            self.offs = offs_bak
-            body_out_bak=self.body_out
-            self.body_out=bytearray()
-            self._serdes_variant(None) #Make sure self.offs goes forward by the original variant size.
-            self.body_out=body_out_bak
-        
+            self._skip_original(FledgeSerdes._serdes_variant, offs_bak, lambda: self._serdes_variant(None))
+        elif self._skip_record is not None:
+            self._skip_record[(FledgeSerdes._serdes_variant, offs_bak)] = self.offs
+
         return deser_out
-    
-    
+
+
     def _fieldname_short(fieldname):
         return fieldname.split('_')[0] #Name format: "<type> field<number>_"
+    def _fieldnames_short(keys):
+        #Short names of a key tuple, resolved once per key set (e.g. once for all elements of an array of records).
+        shortnames = _shortname_cache.get(keys)
+        if shortnames is None:
+            if len(_shortname_cache) >= 0x1000:
+                _shortname_cache.clear()
+            shortnames = _shortname_cache[keys] = tuple(FledgeSerdes._fieldname_short(key) for key in keys)
+        return shortnames
     def _opt_map_with_short_fieldnames(map_in):
-        return None if (map_in is None) else {FledgeSerdes._fieldname_short(key):map_in[key] for key in map_in.keys()}
+        return None if (map_in is None) else dict(zip(FledgeSerdes._fieldnames_short(tuple(map_in.keys())), map_in.values()))
+    def _opt_map_with_short_fieldnames_first(map_in):
+        #For records: If several fields have the same short name, the first one wins (the last one on the top level).
+        return None if (map_in is None) else dict(zip(reversed(FledgeSerdes._fieldnames_short(tuple(map_in.keys()))), reversed(map_in.values())))
+    def _top_level_shortnames(deser_in):
+        #Replace all field names by short names. A JsonObjectReader is looked up by short names already.
+        return deser_in if isinstance(deser_in, JsonObjectReader) else FledgeSerdes._opt_map_with_short_fieldnames(deser_in)
     def _opt_map_select_with_shortname(map_in, shortname):
-        return None if (map_in is None) else map_in[[fullname for fullname in map_in.keys() if shortname==FledgeSerdes._fieldname_short(fullname)][0]]
+        if map_in is None:
+            return None
+        keys = tuple(map_in.keys())
+        return map_in[[key for key, key_short in zip(keys, FledgeSerdes._fieldnames_short(keys)) if key_short == shortname][0]]
     def _serdes_field(self, deser_out, deser_in_shortnames, fieldname, fieldfn):
-        #offs_pre = self.offs
+        offs_pre = self.offs
         fieldname_short=type(self)._fieldname_short(fieldname)
-        ret = fieldfn(None if (deser_in_shortnames is None) else deser_in_shortnames[fieldname_short])
+        deser_in = None if (deser_in_shortnames is None) else deser_in_shortnames[fieldname_short]
+        if self.orig_fields is not None and fieldname in self.orig_fields:
+            orig_dump, orig_data = self.orig_fields[fieldname]
+            if orig_dump is not None and _marshal_dump(_passthrough_value(fieldname, deser_in)) == orig_dump: #Unchanged: Copy the original bytes instead of encoding the value.
+                self.body_out += orig_data
+                self.offs += len(orig_data)
+                deser_out[fieldname] = deser_in
+                return deser_in
+        ret = fieldfn(deser_in)
         #print("_serdes_field: @0x%x - '%s' = %s" % (offs_pre, fieldname, str(ret)))
+        if self._orig_record is not None:
+            self._orig_record[fieldname] = (_marshal_dump(_passthrough_value(fieldname, ret)), self.body_in[offs_pre:self.offs])
         deser_out[fieldname] = ret
         return ret
-    def _serdes_arrayfield(self, deser_out, deser_in_shortnames, fieldname, elemfn):
-        return self._serdes_field(deser_out, deser_in_shortnames, fieldname,
-            lambda deser_in: self._serdes_genericarray(deser_in, elemfn))
+    def _serdes_run(self, run, deser_out, deser_in_shortnames): #Consecutive fixed size fields with a single (un)pack
+        st = run.struct
+        offs = self.offs
+        if deser_in_shortnames is None:
+            if self.body_out is not None:
+                self.body_out += self.body_in[offs:offs+st.size]
+            vals = st.unpack_from(self.body_in, offs)
+        else:
+            flat = []
+            for fld in run.fields:
+                fld.encode(flat, deser_in_shortnames[fld.short])
+            data = st.pack(*flat)
+            self.body_out += data
+            vals = st.unpack(data)
+        self.offs = offs + st.size
+        for fld in run.fields:
+            deser_out[fld.name] = fld.decode(vals, fld.index)
+    def _serdes_plan(self, plan, deser_out, deser_in_shortnames, top_level=True): #Plan from savegame_schema.compile_fields
+        for step in plan:
+            if type(step) is savegame_schema.Run:
+                self._serdes_run(step, deser_out, deser_in_shortnames)
+            elif top_level:
+                self._serdes_field(deser_out, deser_in_shortnames, step.name, lambda val: step.fn(self, *step.args, val))
+            else:
+                deser_out[step.name] = step.fn(self, *step.args, None if (deser_in_shortnames is None) else deser_in_shortnames[step.short])
     def _serdes_rest(self, deser_out, deser_in_shortnames, fieldname):
         fieldname_short=type(self)._fieldname_short(fieldname)
         if (self.body_in is not None) and self.offs > len(self.body_in):
@@ -363,139 +581,88 @@ class FledgeSerdes:
             None if (deser_in_shortnames is None) else deser_in_shortnames[fieldname_short])
         deser_out[fieldname] = ret
         return ret
-    
+
     def _serdes_json_asstring(self, keep_as_string, deser_in=None): #Helper for the JSON data in FledgeCore::SaveGameDesc
+        import json
         json_str = self._serdes_string(None if (deser_in is None) else (deser_in if isinstance(deser_in,str) else json.dumps(deser_in, separators=(',', ':'))), False)
         return json_str if keep_as_string else json.loads(json_str)
-    
+    def _serdes_json(self, deser_in=None):
+        return self._serdes_json_asstring(self.keep_inner_json_as_string, deser_in)
+
     def serdes_body(self, deser_in=None):
-        deser_in_shortnames = type(self)._opt_map_with_short_fieldnames(deser_in) #Replace all field names by short names.
-        deser_out={}
+        deser_in_shortnames = type(self)._top_level_shortnames(deser_in)
+        deser_out = {} if (self.top_level_out is None) else self.top_level_out
         #Leave 9 free numbers in between each field name to enable some naming consistency with future file formats.
-        self._serdes_field(deser_out, deser_in_shortnames, "Name32 fieldCore00", self._serdes_name32)
-        self._serdes_field(deser_out, deser_in_shortnames, "Name32 fieldCore10", self._serdes_name32)
-        self._serdes_field(deser_out, deser_in_shortnames, "string fieldCore20", self._serdes_string)
-        body_format = self._serdes_field(deser_out, deser_in_shortnames, "uint32 fieldCore30_format", self._serdes_uint32)
+        #Field layout: see savegame_schema.py
+        self._serdes_plan(savegame_schema.compile_fields(type(self), savegame_schema.CORE_HEADER_FIELDS), deser_out, deser_in_shortnames)
+        body_format = deser_out["uint32 fieldCore30_format"]
         if body_format > 2:
             print("Warning: Unknown Fledge::Core::SaveGameDesc binary format %d. Using raw data instead." % body_format)
         if body_format > 2 or ((deser_in is not None) and "binary-as-base64 rest after fieldCore30" in deser_in_shortnames):
             self._serdes_rest(deser_out, deser_in_shortnames, "binary-as-base64 rest after fieldCore30")
             return deser_out
-        self._serdes_field(deser_out, deser_in_shortnames, "uint8 fieldCore40", self._serdes_uint8)
-        self._serdes_field(deser_out, deser_in_shortnames, "uint64 fieldCore50", self._serdes_uint64)
-        if body_format < 1:
-            self._serdes_field(deser_out, deser_in_shortnames, "uint16 fieldCore60", self._serdes_uint16)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldCore70", self._serdes_bool)
-        if body_format >= 2:
-            self._serdes_field(deser_out, deser_in_shortnames, "uint32 fieldCore80", self._serdes_uint32)
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldCore90", lambda val: {
-            "uint64 field00": self._serdes_uint64(type(self)._opt_map_select_with_shortname(val, "uint64 field00")),
-            "bool field10": self._serdes_bool(type(self)._opt_map_select_with_shortname(val, "bool field10"))
-        })
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldCore100", lambda val: {
-            "Name32 field00": self._serdes_name32(type(self)._opt_map_select_with_shortname(val, "Name32 field00")),
-            "int32 field10": self._serdes_int32(type(self)._opt_map_select_with_shortname(val, "int32 field10"))
-        })
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldCore110", lambda val: {
-            "Name32 field00": self._serdes_name32(type(self)._opt_map_select_with_shortname(val, "Name32 field00")),
-            "bool field10": self._serdes_bool(type(self)._opt_map_select_with_shortname(val, "bool field10"))
-        })
-        self._serdes_field(deser_out, deser_in_shortnames, "string fieldCore120_json", lambda val: self._serdes_json_asstring(self.keep_inner_json_as_string,val))
-        
+        self._serdes_plan(savegame_schema.compile_fields(type(self), savegame_schema.CORE_FIELDS, body_format), deser_out, deser_in_shortnames)
+
         return deser_out
+_shortname_cache = {} #Key tuple of a json object: Short names of its keys, see _fieldnames_short
+_codec_int8 = savegame_schema.SCALAR_CODECS["int8"]
+_codec_uint8 = savegame_schema.SCALAR_CODECS["uint8"]
+_codec_int16 = savegame_schema.SCALAR_CODECS["int16"]
+_codec_uint16 = savegame_schema.SCALAR_CODECS["uint16"]
+_codec_int32 = savegame_schema.SCALAR_CODECS["int32"]
+_codec_uint32 = savegame_schema.SCALAR_CODECS["uint32"]
+_codec_int64 = savegame_schema.SCALAR_CODECS["int64"]
+_codec_uint64 = savegame_schema.SCALAR_CODECS["uint64"]
+_codec_bool = savegame_schema.SCALAR_CODECS["bool"]
+_codec_float = savegame_schema.SCALAR_CODECS["float"]
+_codec_double = savegame_schema.SCALAR_CODECS["double"]
+_codec_name32 = savegame_schema.SCALAR_CODECS["Name32"]
+_codec_vec2 = savegame_schema.SCALAR_CODECS["vec2"]
+_codec_vec3 = savegame_schema.SCALAR_CODECS["vec3"]
+_codec_vec4 = savegame_schema.SCALAR_CODECS["vec4"]
+_codec_uvector2 = savegame_schema.SCALAR_CODECS["UVector2"]
 FledgeSerdes.__init_const__()
 class EraSerdes(FledgeSerdes): #Atlas Fallen
-    def __init__(self, header, body_in=None, skip_era=False, keep_inner_json_as_string=False):
-        FledgeSerdes.__init__(self, body_in, keep_inner_json_as_string)
+    def __init__(self, header, body_in=None, skip_era=False, keep_inner_json_as_string=False, extract_only=False):
+        FledgeSerdes.__init__(self, body_in, keep_inner_json_as_string, extract_only)
         self.era_format = struct.unpack("I", header[0:4])[0]
         self.skip_era = skip_era
-    
+
     def _serdes_constantsize_binary(self, size, deser_in=None):
-        out_offs_pre = len(self.body_out)
+        out_offs_pre = self._out_pos()
         ret = self._serdes_binary_aligned(size, deser_in)
-        written_len = len(self.body_out) - out_offs_pre
+        written_len = self._out_pos() - out_offs_pre
         if written_len != size:
             raise ValueError("Unexpected size of constant size field: Got %d bytes, expected %d" % (written_len, size))
         return ret
     def _serdes_binaryarray_aligned(self, deser_in=None):
+        deser_in_json = deser_in
         if deser_in is not None:
-            deser_in = base64.b64decode(deser_in) if isinstance(deser_in,str) else deser_in
+            deser_in = self._binary_in(deser_in)
         bin_len_orig = [0]
         bin_len_actual = self._serdes_uint32(None if (deser_in is None) else len(deser_in), bin_len_orig)
         bin_len_orig = bin_len_orig[0]
-        out_offs_pre = len(self.body_out)
+        out_offs_pre = self._out_pos()
         ret = self._serdes_binary_aligned(bin_len_orig, deser_in)
-        written_len = len(self.body_out) - out_offs_pre
+        written_len = self._out_pos() - out_offs_pre
         if written_len != ((bin_len_actual+3)&~3):
             raise ValueError("Unexpected size of aligned binary array: Got %d bytes, expected %d" % (written_len, ((bin_len_actual+3)&~3)))
-        return ret
+        return self._binary_out(None, deser_in_json) if isinstance(deser_in_json, (str, dict)) else ret
     def _serdes_constantlen_array(self, const_len, deser_in, fieldfn):
         deser_out = [None] * const_len
         for i in range(const_len):
             deser_out[i] = fieldfn(None if (deser_in is None) else deser_in[i])
         return deser_out
-    
+
     def serdes_body(self, deser_in=None):
-        deser_in_shortnames = type(self)._opt_map_with_short_fieldnames(deser_in) #Replace all field names by short names.
+        deser_in_shortnames = type(self)._top_level_shortnames(deser_in)
         deser_out=FledgeSerdes.serdes_body(self, deser_in)
         if self.skip_era or self.era_format > 0x29:
             print("Warning: Unsupported Era::SaveGameDesc binary format 0x%02x. Using raw data instead." % self.era_format)
         if self.skip_era or self.era_format > 0x29 or ((deser_in is not None) and "binary-as-base64 rest after Core" in deser_in_shortnames):
             self._serdes_rest(deser_out, deser_in_shortnames, "binary-as-base64 rest after Core")
             return deser_out
-        self._serdes_field(deser_out, deser_in_shortnames, "binary[96]-as-base64 fieldEra00", lambda val: self._serdes_constantsize_binary(96, val))
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldEra10", lambda val: {
-            "uint64 field00": self._serdes_uint64(type(self)._opt_map_select_with_shortname(val, "uint64 field00")),
-            "uint8 field10": self._serdes_uint8(type(self)._opt_map_select_with_shortname(val, "uint8 field10"))
-        })
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldEra20", lambda val: {
-            "Name32 field00_ui_map_type": self._serdes_name32(type(self)._opt_map_select_with_shortname(val, "Name32 field00")),
-            #"uint32[0x10000] field10_image": self._serdes_constantlen_array(0x10000, type(self)._opt_map_select_with_shortname(val, "uint32[0x10000] field10"), self._serdes_uint32)
-            "uint32[0x10000]-as-base64 field10_image": self._serdes_constantsize_binary(4*0x10000, type(self)._opt_map_select_with_shortname(val, "uint32[0x10000]-as-base64 field10"))
-        })
-        self._serdes_field(deser_out, deser_in_shortnames, "Name32 fieldEra30_ui_map_type", self._serdes_name32)
-        self._serdes_field(deser_out, deser_in_shortnames, "vec3 fieldEra40_pos", self._serdes_vec3)
-        self._serdes_field(deser_out, deser_in_shortnames, "float fieldEra50", self._serdes_float)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra60", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra70", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra80", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra90", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra100", self._serdes_bool)
-        if self.era_format >= 0x27:
-            self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra110", self._serdes_bool)
-        if self.era_format >= 0x28:
-            self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra120", self._serdes_bool)
-            self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra130", self._serdes_bool)
-            self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra140", self._serdes_bool)
-            self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra150", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra160", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra170", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "uint8 fieldEra180", self._serdes_uint8)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra190", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "uint8 fieldEra200", self._serdes_uint8)
-        self._serdes_field(deser_out, deser_in_shortnames, "bool fieldEra210", self._serdes_bool)
-        self._serdes_field(deser_out, deser_in_shortnames, "uint8 fieldEra220", self._serdes_uint8)
-        if self.era_format >= 0x26:
-            self._serdes_field(deser_out, deser_in_shortnames, "int32 fieldEra230", self._serdes_int32)
-        if self.era_format < 0x29:
-            self._serdes_field(deser_out, deser_in_shortnames, "uint32 fieldEra240", self._serdes_int32)
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "uint32[] fieldEra250", self._serdes_uint32)
-        self._serdes_arrayfield(deser_out, deser_in_shortnames, "uint32[] fieldEra260", self._serdes_uint32)
-        if self.era_format >= 0x18:
-            self._serdes_arrayfield(deser_out, deser_in_shortnames, "Name32[] fieldEra270_buffs", self._serdes_name32)
-        self._serdes_field(deser_out, deser_in_shortnames, "binary-as-base64 fieldEra280", self._serdes_binaryarray_aligned)
-        if self.era_format >= 0x1B:
-            self._serdes_arrayfield(deser_out, deser_in_shortnames, "Name32[] fieldEra290_npc_voices", self._serdes_name32)
-        if self.era_format >= 0x25:
-            self._serdes_field(deser_out, deser_in_shortnames, "uint32 fieldEra300_mapdata_1", self._serdes_uint32)
-            self._serdes_arrayfield(deser_out, deser_in_shortnames, "array fieldEra310_mapdata_2", lambda val: {
-                "uint8 field00": self._serdes_uint8(type(self)._opt_map_select_with_shortname(val, "uint8 field00")),
-                "uint8 field10": self._serdes_uint8(type(self)._opt_map_select_with_shortname(val, "uint8 field10")),
-                "Variant field20": self._serdes_variant(type(self)._opt_map_select_with_shortname(val, "Variant field20")),
-                "Variant field30": self._serdes_variant(type(self)._opt_map_select_with_shortname(val, "Variant field30")),
-                "Variant field40": self._serdes_variant(type(self)._opt_map_select_with_shortname(val, "Variant field40")),
-                "vec3 field50": self._serdes_vec3(type(self)._opt_map_select_with_shortname(val, "vec3 field50"))
-            })
+        self._serdes_plan(savegame_schema.compile_fields(type(self), savegame_schema.ERA_FIELDS, self.era_format), deser_out, deser_in_shortnames)
         if ((self.body_in is not None) and self.offs < len(self.body_in)) or ((deser_in is not None) and "binary-as-base64 rest after Era" in deser_in_shortnames):
             print("Warning: Encountered data after the expected end! Processing as unknown binary suffix.")
             self._serdes_rest(deser_out, deser_in_shortnames, "binary-as-base64 rest after Era")
@@ -503,75 +670,1772 @@ class EraSerdes(FledgeSerdes): #Atlas Fallen
             print("Error: The input position after processing is %d, but the actual size is %d! Expect invalid results." % (self.offs, len(self.body_in)))
         return deser_out
 
-with open(sys.argv[2], 'rb') as fin:
-    savegame_data=fin.read()
-    pos=0
-    headerheader_magic = struct.unpack("I",savegame_data[pos:pos+4])[0]
-    pos += 4
+class SavegameFormatError(ValueError):
+    pass
+
+def read_savegame(savegame_data, max_body_size=MAX_BODY_SIZE):
+    #Splits the contents of a .sav file into (header, body), with the body decompressed.
+    return read_savegame_stream(io.BytesIO(savegame_data), max_body_size)
+
+SavegameHeader = collections.namedtuple('SavegameHeader', ['checksum', 'header', 'body_is_compressed', 'body_compressed_size', 'body_decompressed_size', 'body_offset', 'file_size'])
+SAVEGAME_CHECKSUM_OFFSET = 4 #Position of the checksum in the file, if savegame_has_checksum
+
+def read_savegame_header(fin):
+    #Reads everything in front of the body from a binary file object, which is left at the start of the body.
+    file_size = fin.seek(0, os.SEEK_END)
+    fin.seek(0)
+    def read_uint32s(count):
+        data = fin.read(4*count)
+        if len(data) != 4*count:
+            raise SavegameFormatError("Unexpected end of file (file size %08X)" % file_size)
+        return struct.unpack("%dI" % count, data)
+    headerheader_magic = read_uint32s(1)[0]
     if headerheader_magic != ATLASFALLEN_MAGIC:
-        print("No valid Atlas Fallen savegame (magic mismatch: got %08X, expected %08X)" % (headerheader_magic, ATLASFALLEN_MAGIC))
-        exit()
+        raise SavegameFormatError("No valid Atlas Fallen savegame (magic mismatch: got %08X, expected %08X)" % (headerheader_magic, ATLASFALLEN_MAGIC))
     checksum = 0
     if savegame_has_checksum:
-        checksum = struct.unpack("I",savegame_data[pos:pos+4])[0]
-        pos += 4
-    header_size = struct.unpack("I",savegame_data[pos:pos+4])[0]
-    pos += 4
-    header = savegame_data[pos:pos+header_size]
-    pos += header_size
-    
-    body_is_compressed = struct.unpack("I",savegame_data[pos:pos+4])[0]
-    body_compressed_size = struct.unpack("I",savegame_data[pos+4:pos+8])[0]
-    body_decompressed_size = struct.unpack("I",savegame_data[pos+8:pos+12])[0]
-    pos += 12
-    
+        checksum = read_uint32s(1)[0]
+    header_size = read_uint32s(1)[0]
+    header = fin.read(header_size)
+
+    body_is_compressed, body_compressed_size, body_decompressed_size = read_uint32s(3)
+    return SavegameHeader(checksum, header, body_is_compressed, body_compressed_size, body_decompressed_size, fin.tell(), file_size)
+
+def read_savegame_stream(fin, max_body_size=MAX_BODY_SIZE, ref_checksum=None):
+    #As read_savegame, reading from a binary file object in chunks. The body is decompressed into a buffer
+    # preallocated from the advertised size, and the checksum is computed while the chunks arrive.
+    #ref_checksum: Optional list, ref_checksum[0] is set to the computed checksum.
+    import zlib
+    checksum, header, body_is_compressed, body_compressed_size, body_decompressed_size, pos, file_size = read_savegame_header(fin)
+    if body_decompressed_size > max_body_size:
+        raise SavegameFormatError("Advertised body size %d exceeds the maximum of %d" % (body_decompressed_size, max_body_size))
+
+    body = bytearray(body_decompressed_size)
+    body_len = 0
+    computed_checksum = 0
     if body_is_compressed != 0:
-        if pos + body_compressed_size != len(savegame_data):
-            print("File size mismatch (compressed body size %08X, but have %08X to EOF)" % (body_compressed_size, len(savegame_data) - pos))
+        if pos + body_compressed_size != file_size:
+            print("File size mismatch (compressed body size %08X, but have %08X to EOF)" % (body_compressed_size, file_size - pos))
         decompressor = zlib.decompressobj(wbits=15)
-        body = decompressor.decompress(savegame_data[pos:pos+body_compressed_size])
-        body += decompressor.flush()
-        if len(body) != body_decompressed_size:
-            print("Warning: Advertised body size %d does not match the decompressed size %d!" % (body_decompressed_size, len(body)))
+        compressed_remaining = body_compressed_size
+        while True:
+            if len(decompressor.unconsumed_tail) > 0:
+                chunk_in = decompressor.unconsumed_tail
+            elif compressed_remaining > 0 and not decompressor.eof:
+                chunk_in = fin.read(min(SAVEGAME_READ_CHUNK, compressed_remaining))
+                compressed_remaining -= len(chunk_in)
+            else:
+                chunk_in = b''
+            if len(chunk_in) == 0:
+                chunk_out = decompressor.flush()
+            else:
+                chunk_out = decompressor.decompress(chunk_in, SAVEGAME_READ_CHUNK)
+            if len(chunk_out) > 0:
+                if body_len + len(chunk_out) > max_body_size:
+                    raise SavegameFormatError("Decompressed body size exceeds the maximum of %d" % max_body_size)
+                body[body_len:body_len+len(chunk_out)] = chunk_out #Grows the buffer if the advertised size was too small.
+                body_len += len(chunk_out)
+                computed_checksum = sdbm_update(computed_checksum, chunk_out)
+            elif len(chunk_in) == 0:
+                break
+        if body_len != body_decompressed_size:
+            print("Warning: Advertised body size %d does not match the decompressed size %d!" % (body_decompressed_size, body_len))
     else:
-        if pos + body_decompressed_size != len(savegame_data):
-            print("File size mismatch (body size %08X, but have %08X to EOF)" % (body_decompressed_size, len(savegame_data) - pos))
-        body = savegame_data[pos:pos+body_decompressed_size]
-    computed_checksum = compute_checksum(body)
+        if pos + body_decompressed_size != file_size:
+            print("File size mismatch (body size %08X, but have %08X to EOF)" % (body_decompressed_size, file_size - pos))
+        with memoryview(body) as body_view:
+            while body_len < body_decompressed_size:
+                chunk_len = fin.readinto(body_view[body_len:body_len+SAVEGAME_READ_CHUNK])
+                if not chunk_len:
+                    break
+                computed_checksum = sdbm_update(computed_checksum, body_view[body_len:body_len+chunk_len])
+                body_len += chunk_len
+    del body[body_len:]
     if savegame_has_checksum and checksum != computed_checksum:
         print("Checksum mismatch (header says %08X, but computed %08X)" % (checksum, computed_checksum))
-    
+    if ref_checksum is not None:
+        ref_checksum[0] = computed_checksum
+    return header, body
+
+SCAN_READ_SIZE = 0x100 #Bytes read from the start of a file by scan_save: Base header, 0xD0 byte header, body block header, zlib header
+#Result of scan_save. Fields after path and problems are None if they could not be read.
+SaveScan = collections.namedtuple('SaveScan', ['path', 'problems', 'file_size', 'mtime', 'checksum', 'era_format', 'header_size',
+    'body_is_compressed', 'body_compressed_size', 'body_decompressed_size'])
+
+def _pread(fd, size, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET) #Windows
+    return os.read(fd, size)
+
+def scan_save(path):
+    #Reads the headers of a save file with positional reads of at most a few hundred bytes, without reading the body.
+    # Sizes that do not match the file and invalid zlib headers are listed in problems (the body is not decompressed).
+    pos = 12 if savegame_has_checksum else 8 #Start of the header
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            stat = os.fstat(fd)
+            data = _pread(fd, SCAN_READ_SIZE, 0)
+            header_size = struct.unpack_from("I", data, pos - 4)[0] if (len(data) >= pos) else 0
+            block = data[pos+header_size:pos+header_size+14] #Body block header and zlib header
+            if len(block) < 14 and len(data) == SCAN_READ_SIZE: #Header larger than expected
+                block = _pread(fd, 14, pos + header_size)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        return SaveScan(path, ["%s: %s" % (type(e).__name__, e.strerror or str(e))], None, None, None, None, None, None, None, None)
+    problems = []
+    info = [stat.st_size, stat.st_mtime, None, None, None, None, None, None]
+    if len(data) < 4 or struct.unpack_from("I", data, 0)[0] != ATLASFALLEN_MAGIC:
+        problems.append("No valid Atlas Fallen savegame (magic mismatch)")
+        return SaveScan(path, problems, *info)
+    if len(data) < pos + 4 or len(block) < 12:
+        problems.append("Unexpected end of file (file size %08X)" % stat.st_size)
+        if len(data) < pos + 4:
+            return SaveScan(path, problems, *info)
+    info[2] = struct.unpack_from("I", data, 4)[0] if savegame_has_checksum else None
+    info[3] = struct.unpack_from("I", data, pos)[0] #fledge_body_format (era_format)
+    info[4] = header_size
+    if len(block) < 12:
+        return SaveScan(path, problems, *info)
+    body_offset = pos + header_size + 12
+    body_is_compressed, body_compressed_size, body_decompressed_size = struct.unpack_from("3I", block, 0)
+    info[5:8] = [body_is_compressed != 0, body_compressed_size, body_decompressed_size]
+    if body_decompressed_size > MAX_BODY_SIZE:
+        problems.append("Advertised body size %d exceeds the maximum of %d" % (body_decompressed_size, MAX_BODY_SIZE))
+    if body_is_compressed != 0:
+        if body_offset + body_compressed_size != stat.st_size:
+            problems.append("File size mismatch (compressed body size %08X, but have %08X to EOF)" % (body_compressed_size, stat.st_size - body_offset))
+        if len(block) < 14 or (block[12] & 0x0F) != 8 or ((block[12] << 8) | block[13]) % 31 != 0:
+            problems.append("Compressed body does not start with a zlib header")
+    elif body_offset + body_decompressed_size != stat.st_size:
+        problems.append("File size mismatch (body size %08X, but have %08X to EOF)" % (body_decompressed_size, stat.st_size - body_offset))
+    return SaveScan(path, problems, *info)
+
+def scan_saves(paths, workers=1):
+    #scan_save for each path, in order. workers: Number of threads reading headers concurrently (helps with network drives).
+    if workers <= 1:
+        yield from map(scan_save, paths)
+        return
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(scan_save, paths)
+
+def _deflate_block(block, level, zdict, last):
+    #Raw deflate of one block of compress_body, continuing the stream that ended with zdict.
+    import zlib
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict) if (len(zdict) > 0) else zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def compress_body(body, level=-1, threads=1, block_size=SAVEGAME_COMPRESS_BLOCK):
+    #Returns the zlib stream (wbits=15) of body.
+    #threads > 1: Compresses blocks of block_size on a thread pool (zlib releases the GIL). Each block is raw deflate,
+    # primed with the 32 KiB in front of it as preset dictionary and ended with a sync flush (as pigz does), so the
+    # concatenation is one valid stream. It compresses about as well, but is not byte identical to the single stream.
+    import zlib
+    if threads <= 1 or len(body) <= block_size:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 15)
+        return compressor.compress(body) + compressor.flush()
+    import concurrent.futures
+    flevel = 2 if (level == -1) else (0 if level < 2 else (1 if level < 6 else (2 if level == 6 else 3)))
+    cmf = 0x78 #deflate, 32 KiB window
+    flg = flevel << 6
+    flg |= (31 - ((cmf << 8) | flg) % 31) % 31
+    with memoryview(body) as body_view:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            adler_future = executor.submit(zlib.adler32, body_view)
+            block_futures = [executor.submit(_deflate_block, body_view[offs:offs+block_size], level, body_view[max(0, offs-0x8000):offs], offs + block_size >= len(body))
+                for offs in range(0, len(body), block_size)]
+            parts = [bytes((cmf, flg))]
+            parts += [future.result() for future in block_futures]
+            parts.append(struct.pack(">I", adler_future.result()))
+    return b''.join(parts)
+
+def write_savegame(fout, header, body, compress, checksum=None, compress_level=-1, compress_threads=1):
+    #checksum: Checksum of body if already known (e.g. updated with sdbm_replace), computed otherwise.
+    #compress_level, compress_threads: See compress_body.
+    computed_checksum = compute_checksum(body) if (checksum is None) else checksum
+    fout.write(struct.pack("III", ATLASFALLEN_MAGIC, computed_checksum, len(header)))
+    fout.write(header)
+    if compress:
+        #Default compression level with one thread can produce identical files to the game
+        # (depending on zlib version - game uses zlib 1.2.3; is the case for Python 3.9 and 3.11, probably not for future versions - https://github.com/python/cpython/issues/91349 )
+        body_compressed = compress_body(body, compress_level, compress_threads)
+        fout.write(struct.pack("III", 1, len(body_compressed), len(body)))
+        fout.write(body_compressed)
+    else:
+        fout.write(struct.pack("III", 0, len(body), len(body)))
+        fout.write(body)
+
+#Offset index and lazy reader: Locates fields in a body without decoding it, and decodes only what is asked for.
+#Field paths follow the extract_json structure, separated by '/': Field names and array indexes, e.g. "fieldEra40" or "fieldEra20/0/field00".
+# A field name matches its full name ("vec3 fieldEra40_pos"), short name ("vec3 fieldEra40") or either without the type ("fieldEra40_pos", "fieldEra40").
+# Variant payloads are selected by their type name, e.g. "fieldEra310/0/field20/VariantArray/1".
+BodyIndex = collections.namedtuple('BodyIndex', ['fields', 'offsets']) #Top level fields (savegame_schema.Field), field i at body[offsets[i]:offsets[i+1]].
+_REST_TYPE = "rest" #Unaligned binary until the end of the body
+_VARIANT_LAYOUT = { #Variant payloads that are not scalars from savegame_schema.SCALAR_CODECS
+    "Rect": savegame_schema.record(savegame_schema.field("uint16 a", "uint16"), savegame_schema.field("uint16 b", "uint16")),
+    "Ref": savegame_schema.BinaryType(16),
+    "void_or_null": savegame_schema.BinaryType(0),
+    "VariantArray": savegame_schema.ArrayType("Variant"),
+    "VariantDictionary": savegame_schema.ArrayType(savegame_schema.VARIANT_DICTIONARY_ELEMENT),
+    "Curve": savegame_schema.ArrayType(savegame_schema.CURVE_ELEMENT),
+}
+_fixed_size_cache = {}
+
+def _path_names(fieldname):
+    fieldname_short = FledgeSerdes._fieldname_short(fieldname)
+    untyped = fieldname.partition(' ')[2]
+    return (fieldname, fieldname_short, untyped, FledgeSerdes._fieldname_short(untyped))
+
+def _path_split(path):
+    return [comp for comp in path.split('/') if comp != ""]
+
+def _fixed_size(fldtype):
+    #Encoded size of a type if it is the same for all values, None otherwise.
+    key = id(fldtype) if isinstance(fldtype, tuple) else fldtype
+    if key in _fixed_size_cache:
+        return _fixed_size_cache[key][1]
+    size = None
+    if isinstance(fldtype, str) and fldtype in savegame_schema.SCALAR_CODECS:
+        size = savegame_schema.SCALAR_CODECS[fldtype].struct.size
+    elif isinstance(fldtype, savegame_schema.BinaryType):
+        size = (fldtype.size + 3) & ~3
+    elif isinstance(fldtype, savegame_schema.RecordType):
+        sizes = [_fixed_size(fld.type) for fld in fldtype.fields]
+        size = None if (None in sizes) else sum(sizes)
+    _fixed_size_cache[key] = (fldtype, size) #Keeps fldtype alive, so its id stays unique.
+    return size
+
+def _read_uint32(body, offs):
+    if offs + 4 > len(body):
+        raise ValueError("Offset 0x%x is beyond the end of the body" % offs)
+    return _codec_uint32.struct.unpack_from(body, offs)[0]
+
+def _variant_payload_type(body, offs):
+    typeid = _read_uint32(body, offs)
+    typename = _variant_typeinfo_lookup[typeid][0] if (typeid < len(_variant_typeinfo_lookup)) else None
+    if typename is None:
+        raise ValueError("Variant typeid %d unknown" % typeid)
+    return typename, (_VARIANT_LAYOUT[typename] if typename in _VARIANT_LAYOUT else typename)
+
+def _skip_value(body, offs, fldtype):
+    #End offset of the value of type fldtype at offs, without decoding it.
+    size = _fixed_size(fldtype)
+    if size is not None:
+        end = offs + size
+    elif isinstance(fldtype, savegame_schema.ArrayType):
+        count = _read_uint32(body, offs)
+        element_size = _fixed_size(fldtype.element)
+        if element_size is not None:
+            end = offs + 4 + count * element_size
+        else:
+            end = offs + 4
+            for i in range(count):
+                end = _skip_value(body, end, fldtype.element)
+    elif isinstance(fldtype, savegame_schema.RecordType):
+        end = offs
+        for fld in fldtype.fields:
+            end = _skip_value(body, end, fld.type)
+    elif fldtype == "Variant":
+        end = _skip_value(body, offs + 4, _variant_payload_type(body, offs)[1])
+    elif fldtype in ("string", "json", "binaryarray"):
+        end = offs + 4 + (((_read_uint32(body, offs) & ~0x80000000) + 3) & ~3)
+    elif fldtype == _REST_TYPE:
+        end = len(body)
+    else:
+        raise ValueError("Unknown field type %s" % str(fldtype))
+    if end > len(body):
+        raise ValueError("Value at offset 0x%x ends beyond the end of the body" % offs)
+    return end
+
+def iter_body_fields(header, body):
+    #Walks the top level fields like EraSerdes.serdes_body, skipping over the values. Yields (field, start offset, end offset).
+    era_format = struct.unpack("I", header[0:4])[0]
+    offs = 0
+    for fld in savegame_schema.CORE_HEADER_FIELDS:
+        end = _skip_value(body, offs, fld.type)
+        yield fld, offs, end
+        offs = end
+    body_format = _read_uint32(body, offs - 4) #fieldCore30_format
+    if body_format > 2:
+        rest_name = "binary-as-base64 rest after fieldCore30"
+    else:
+        field_lists = [(savegame_schema.CORE_FIELDS, body_format)]
+        if era_format <= 0x29:
+            field_lists.append((savegame_schema.ERA_FIELDS, era_format))
+            rest_name = "binary-as-base64 rest after Era"
+        else:
+            rest_name = "binary-as-base64 rest after Core"
+        for field_list, fmt in field_lists:
+            for fld in field_list:
+                if savegame_schema.field_enabled(fld, fmt):
+                    end = _skip_value(body, offs, fld.type)
+                    yield fld, offs, end
+                    offs = end
+    if offs < len(body):
+        yield savegame_schema.field(rest_name, _REST_TYPE), offs, len(body)
+
+def build_body_index(header, body):
+    fields = []
+    offsets = array.array('I', [0])
+    for fld, offs, end in iter_body_fields(header, body):
+        fields.append(fld)
+        offsets.append(end)
+    return BodyIndex(tuple(fields), offsets)
+
+class LazySave:
+    #Read access to single fields of a body. The offset index is built only as far as needed for the fields asked for,
+    # or can be passed in to reuse it.
+    def __init__(self, header, body, index=None, keep_inner_json_as_string=False):
+        self.header = header
+        self.body = body
+        self._index = index
+        self._partial_fields = [] #(field, start offset) found so far while the index is incomplete
+        self._partial_iter = None
+        self.keep_inner_json_as_string = keep_inner_json_as_string
+    def index(self):
+        if self._index is None:
+            self._index = build_body_index(self.header, self.body)
+        return self._index
+    def fields(self):
+        return [fld.name for fld in self.index().fields]
+    def _find_field(self, name):
+        #(start offset, type) of the top level field, or None.
+        if self._index is not None:
+            for i, fld in enumerate(self._index.fields):
+                if name in _path_names(fld.name):
+                    return self._index.offsets[i], fld.type
+            return None
+        for fld, offs in self._partial_fields:
+            if name in _path_names(fld.name):
+                return offs, fld.type
+        if self._partial_iter is None:
+            self._partial_iter = iter_body_fields(self.header, self.body)
+        for fld, offs, end in self._partial_iter:
+            self._partial_fields.append((fld, offs))
+            if name in _path_names(fld.name):
+                return offs, fld.type
+        return None
+    def locate(self, path):
+        #Returns (start offset, end offset, type, remaining path components) of the innermost value the path leads to
+        # without decoding. Remaining components select within the decoded value (e.g. a vec3 component).
+        comps = _path_split(path)
+        if len(comps) == 0:
+            raise ValueError("Empty field path")
+        found = self._find_field(comps[0])
+        if found is None:
+            raise ValueError("Field '%s' not found" % comps[0])
+        offs, fldtype = found
+        comps = comps[1:]
+        while len(comps) > 0:
+            if isinstance(fldtype, savegame_schema.ArrayType):
+                count = _read_uint32(self.body, offs)
+                try:
+                    element_i = int(comps[0])
+                except ValueError:
+                    raise ValueError("Expected an array index in field path '%s', got '%s'" % (path, comps[0]))
+                if element_i < 0:
+                    element_i += count
+                if element_i < 0 or element_i >= count:
+                    raise ValueError("Array index %s out of range in field path '%s' (length %d)" % (comps[0], path, count))
+                element_size = _fixed_size(fldtype.element)
+                if element_size is not None:
+                    offs = offs + 4 + element_i * element_size
+                else:
+                    offs = offs + 4
+                    for j in range(element_i):
+                        offs = _skip_value(self.body, offs, fldtype.element)
+                fldtype = fldtype.element
+            elif isinstance(fldtype, savegame_schema.RecordType):
+                for fld in fldtype.fields:
+                    if comps[0] in _path_names(fld.name):
+                        fldtype = fld.type
+                        break
+                    offs = _skip_value(self.body, offs, fld.type)
+                else:
+                    raise ValueError("Field '%s' not found in field path '%s'" % (comps[0], path))
+            elif fldtype == "Variant":
+                typename, payload_type = _variant_payload_type(self.body, offs)
+                if comps[0] != typename:
+                    raise ValueError("Variant in field path '%s' has type %s, not %s" % (path, typename, comps[0]))
+                if not isinstance(payload_type, savegame_schema.ArrayType):
+                    break #Decode the whole variant.
+                offs, fldtype = offs + 4, payload_type
+            else:
+                break
+            comps = comps[1:]
+        return offs, _skip_value(self.body, offs, fldtype), fldtype, comps
+    def _decode(self, offs, fldtype):
+        serdes = EraSerdes(self.header, self.body, keep_inner_json_as_string=self.keep_inner_json_as_string, extract_only=True)
+        serdes.offs = offs
+        if fldtype == _REST_TYPE:
+            return serdes._serdes_binary_unaligned(len(self.body) - offs)
+        element = savegame_schema.compile_element_cached(EraSerdes, fldtype)
+        if element.record:
+            return serdes._serdes_record(element.steps)
+        if element.fixed is not None:
+            deser_out = {}
+            serdes._serdes_run(element.fixed, deser_out, None)
+            return deser_out[None]
+        step = element.steps[0]
+        return step.fn(serdes, *step.args, None)
+    def _encode(self, fldtype, value):
+        serdes = EraSerdes(self.header, None)
+        if fldtype == _REST_TYPE:
+            serdes._serdes_binary_unaligned(0, value)
+            return serdes.body_out
+        element = savegame_schema.compile_element_cached(EraSerdes, fldtype)
+        if element.record:
+            serdes._serdes_record(element.steps, value)
+        elif element.fixed is not None:
+            serdes._serdes_run(element.fixed, {}, {None: value})
+        else:
+            step = element.steps[0]
+            step.fn(serdes, *step.args, value)
+        return serdes.body_out
+    def _select(self, value, comps, path):
+        #Returns (container, key) of the value selected by the path components within value.
+        container, key = None, None
+        for comp in comps:
+            if key is not None:
+                value = container[key]
+            if isinstance(value, dict):
+                keys = [key for key in value.keys() if comp in _path_names(key)]
+                if len(keys) == 0:
+                    raise ValueError("Field '%s' not found in field path '%s'" % (comp, path))
+                container, key = value, keys[0]
+            elif isinstance(value, list):
+                try:
+                    key = int(comp)
+                    value[key]
+                except (ValueError, IndexError):
+                    raise ValueError("Invalid index '%s' in field path '%s'" % (comp, path))
+                container = value
+            else:
+                raise ValueError("Cannot select '%s' in field path '%s'" % (comp, path))
+        return container, key
+    def get(self, path):
+        offs, end, fldtype, comps = self.locate(path)
+        ret = self._decode(offs, fldtype)
+        container, key = self._select(ret, comps, path)
+        return ret if (key is None) else container[key]
+    def encode_at(self, path, value):
+        #Encodes value (json representation) for the field path. Returns (start offset, end offset, data) to replace body[start:end] with.
+        import json
+        offs, end, fldtype, comps = self.locate(path)
+        if len(comps) > 0:
+            #Within a value that is decoded as a whole, e.g. a vec3 component: Replace that value with the modified one.
+            value_full = self._decode(offs, fldtype)
+            container, key = self._select(value_full, comps, path)
+            container[key] = value
+            value = value_full
+        try:
+            data = self._encode(fldtype, value)
+        except (TypeError, KeyError, IndexError, AttributeError, struct.error) as e:
+            raise ValueError("Value %s does not fit field path '%s' (%s: %s)" % (json.dumps(value), path, type(e).__name__, str(e)))
+        return offs, end, data
+
+def patch_body(header, body, assignments, checksum=None):
+    #Applies the (field path, json value) assignments to body, a bytearray or writable memoryview.
+    # Values with an unchanged encoded size are replaced in place, and the checksum (if given) is updated from the changed bytes alone.
+    # If a size changes, the changes go to a copy of the body instead. Returns (body, checksum), with checksum None if it needs to be recomputed.
+    # The original body is left unchanged if an assignment fails.
+    body_orig = body
+    undo = [] #(offset, original data) written to body_orig
+    def undo_orig():
+        for offs, data_old in reversed(undo):
+            body_orig[offs:offs+len(data_old)] = data_old
+        undo.clear()
+    lazy = LazySave(header, body)
+    try:
+        for path, value in assignments:
+            offs, end, data = lazy.encode_at(path, value)
+            if len(data) == end - offs:
+                data_old = bytes(body[offs:end])
+                if checksum is not None:
+                    checksum = sdbm_replace(checksum, len(body), offs, data_old, data)
+                if body is body_orig:
+                    undo.append((offs, data_old))
+                body[offs:end] = data
+            else:
+                if body is body_orig:
+                    body = bytearray(body)
+                    undo_orig()
+                body[offs:end] = data
+                checksum = None
+                lazy = LazySave(header, body)
+    except BaseException:
+        undo_orig()
+        raise
+    return body, checksum
+
+class SidecarWriter:
+    #Binary fields of an extraction, concatenated in a container file. The json references each by offset, size and crc32
+    # (zlib.crc32 runs at C speed, unlike sdbm).
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self._fout = open(path, 'wb')
+        self._size = 0
+    def add(self, data):
+        import zlib
+        offs = self._size
+        self._fout.write(data)
+        self._size += len(data)
+        return {"sidecar": self.name, "offset": offs, "size": len(data), "crc32": "0x%08x" % zlib.crc32(data)}
+    def close(self):
+        self._fout.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+class SidecarReader:
+    #Resolves sidecar references for composing, with the container files (relative to base_dir) memory-mapped.
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._files = {}
+    def read(self, ref):
+        import zlib
+        name = ref["sidecar"]
+        mm = self._files.get(name)
+        if mm is None:
+            with open(os.path.join(self.base_dir, name), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if (os.fstat(f.fileno()).st_size > 0) else b''
+            self._files[name] = mm
+        offs, size = int(ref["offset"]), int(ref["size"])
+        if offs < 0 or size < 0 or offs + size > len(mm):
+            raise ValueError("Sidecar reference (offset %d, size %d) is beyond the end of %s" % (offs, size, name))
+        data = mm[offs:offs+size]
+        if "crc32" in ref and int(ref["crc32"], 0) != zlib.crc32(data):
+            print("Warning: Sidecar data at offset %d in %s was changed since the extraction." % (offs, name))
+        return data
+    def close(self):
+        for mm in self._files.values():
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+        self._files = {}
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+def sidecar_path(json_path):
+    return os.path.splitext(json_path)[0] + ".bin"
+
+def json_default(value):
+    #default= for json.dump(s) of extract(typed_arrays=True) output: Writes array.array (or numpy.ndarray) values as lists.
+    if isinstance(value, array.array) or hasattr(value, '__array__'):
+        return value.tolist()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+def numpy_view(values):
+    #numpy.ndarray sharing the memory of an array.array from extract(typed_arrays=True). Requires numpy.
+    import numpy
+    return numpy.frombuffer(values, dtype=values.typecode)
+
+class JsonObjectWriter:
+    #Top level fields of an extraction, written to a text file as an indented json object (same as json.dumps(indent=4))
+    # as soon as they are set. Only scalar values are kept (e.g. the body format is read back), so memory use is bounded
+    # by the largest field instead of the whole body. annotate: Optional function called with {name: value} before writing.
+    # fout None: Nothing is written, e.g. to not keep the output values when composing.
+    def __init__(self, fout, annotate=None):
+        self._fout = fout
+        self._count = 0
+        self._scalars = {}
+        self.annotate = annotate
+    def __setitem__(self, key, value):
+        import json
+        if not isinstance(value, (dict, list, str, array.array)):
+            self._scalars[key] = value
+        if self._fout is None:
+            return
+        if self.annotate is not None:
+            self.annotate({key: value})
+        self._fout.write(("{\n    " if (self._count == 0) else ",\n    ") + json.dumps(key) + ": " + json.dumps(value, indent=4, default=json_default).replace("\n", "\n    "))
+        self._count += 1
+    def __getitem__(self, key):
+        return self._scalars[key]
+    def close(self):
+        if self._fout is not None:
+            self._fout.write("\n}" if (self._count > 0) else "{}")
+
+class JsonObjectReader:
+    #Reads the top level object of a json text file one member at a time, for composing with bounded memory.
+    # Members are looked up by short name (see FledgeSerdes._fieldname_short), each once, and are expected in the order
+    # extract_json writes them: A lookup reads ahead to the member (keeping the members in between), and a membership
+    # test only looks at the members read so far and the next one.
+    def __init__(self, fin, chunk_size=0x100000):
+        import json
+        self._fin = fin
+        self._decoder = json.JSONDecoder()
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._done = False
+        self._pending = {}
+        self._next_char("{")
+        if self._peek_char() == "}":
+            self._pos += 1
+            self._done = True
+    def _fill(self, min_size):
+        chunk = self._fin.read(max(self._chunk_size, min_size))
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        if len(chunk) == 0:
+            self._eof = True
+    def _peek_char(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                raise ValueError("Unexpected end of the json file")
+            self._fill(0)
+    def _next_char(self, expected):
+        char = self._peek_char()
+        if char not in expected:
+            raise ValueError("Invalid json: Expected '%s', got '%s'" % (expected, char))
+        self._pos += 1
+        return char
+    def _value(self):
+        import json
+        self._peek_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof: #A number could continue in the next chunk.
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(len(self._buf) - self._pos) #Doubles the buffered part of a value that is not complete yet.
+    def _read_member(self):
+        #Reads the next member into self._pending. Returns its short name, None at the end of the object.
+        if self._done:
+            return None
+        key = self._value()
+        if not isinstance(key, str):
+            raise ValueError("Invalid json: Expected a member name, got %s" % repr(key))
+        self._next_char(":")
+        shortname = FledgeSerdes._fieldname_short(key)
+        self._pending[shortname] = self._value()
+        if self._next_char(",}") == "}":
+            self._done = True
+        return shortname
+    def __getitem__(self, shortname):
+        while shortname not in self._pending:
+            if self._read_member() is None:
+                raise KeyError(shortname)
+        return self._pending.pop(shortname)
+    def __contains__(self, shortname):
+        if shortname in self._pending:
+            return True
+        return self._read_member() == shortname
+
+def _write_savegame_file(path, header, body, compress, checksum=None):
+    #Writes to a temporary file first, so that path is never left half written.
+    path_tmp = path + ".tmp"
+    with open(path_tmp, 'wb') as fout:
+        write_savegame(fout, header, body, compress, checksum)
+    os.replace(path_tmp, path)
+
+def patch_file(args, flags):
+    #args: <sav file in> [<sav file out> unless --in-place] {<field path>=<json value>}. Returns False if the patch failed.
+    import json
+    in_place = "--in-place" in flags
+    path_in = args[0]
+    path_out = path_in if in_place else args[1]
+    assignments = []
+    for arg in args[1 if in_place else 2:]:
+        path, sep, value = arg.partition("=")
+        if sep == "":
+            print("Error: Expected <field path>=<json value>, got '%s'" % arg)
+            return False
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass #Plain string
+        assignments.append((path, value))
+    if not in_place and os.path.exists(path_out) and os.path.samefile(path_in, path_out):
+        print("Error: The output file is the input file, use --in-place to patch it.")
+        return False
+
+    try:
+        if in_place:
+            #Uncompressed: Patch the file directly, only touching the changed bytes and the checksum.
+            patched = False
+            body_resized = None
+            with open(path_in, 'r+b') as f:
+                info = read_savegame_header(f)
+                if info.body_is_compressed == 0 and info.body_offset + info.body_decompressed_size <= info.file_size and info.body_decompressed_size > 0:
+                    with mmap.mmap(f.fileno(), 0) as mm:
+                        body_view = memoryview(mm)[info.body_offset:info.body_offset+info.body_decompressed_size]
+                        try:
+                            body, checksum = patch_body(info.header, body_view, assignments, info.checksum)
+                        finally:
+                            body_view.release()
+                        if body is not body_view:
+                            body_resized = (body, checksum) #Size changed.
+                        elif savegame_has_checksum:
+                            mm[SAVEGAME_CHECKSUM_OFFSET:SAVEGAME_CHECKSUM_OFFSET+4] = struct.pack("I", checksum)
+                    patched = True
+            if body_resized is not None:
+                #Replaced only after the mmap and file are closed (os.replace fails on open files on Windows).
+                _write_savegame_file(path_out, info.header, body_resized[0], False, body_resized[1])
+            if patched:
+                print("Patched %d field(s) in place." % len(assignments))
+                return True
+        with open(path_in, 'rb') as fin:
+            info = read_savegame_header(fin)
+            computed_checksum = [0]
+            header, body = read_savegame_stream(fin, ref_checksum=computed_checksum)
+        body, checksum = patch_body(header, body, assignments, computed_checksum[0])
+        _write_savegame_file(path_out, header, body, info.body_is_compressed != 0, checksum)
+    except SavegameFormatError:
+        raise
+    except ValueError as e:
+        print("Error: %s" % str(e))
+        return False
+    print("Patched %d field(s)." % len(assignments))
+    return True
+
+def open_lazy(path, keep_inner_json_as_string=False):
+    header, body = load_save(path)
+    return LazySave(header, body, keep_inner_json_as_string=keep_inner_json_as_string)
+
+def query_file(paths, flags):
+    #Prints the values of the field paths paths[1:] in save file paths[0], or the top level fields if there are none.
+    import json
+    lazy = open_lazy(paths[0], "--keep-inner-json-as-string" in flags)
+    if len(paths) == 1:
+        index = lazy.index()
+        for i, fld in enumerate(index.fields):
+            print("0x%08x %10d  %s" % (index.offsets[i], index.offsets[i+1] - index.offsets[i], fld.name))
+        return
+    for path in paths[1:]:
+        try:
+            print("%s = %s" % (path, json.dumps(lazy.get(path))))
+        except ValueError as e:
+            print("%s: Error: %s" % (path, str(e)))
+
+#Structural diff of two bodies. Values are compared by the crc32 of their encoded bytes first, and only values that
+# differ are walked into (arrays, records, Variant arrays) or decoded. Binary fields are compared per block of
+# DIFF_BLOCK_SIZE bytes and reported as ranges of changed 32-bit words instead of their contents.
+# kind: "changed" (old, new), "added" (new), "removed" (old) or "binary" (old, new: sizes in bytes, ranges: [start word, end word) ranges).
+BodyChange = collections.namedtuple('BodyChange', ['path', 'kind', 'old', 'new', 'ranges'])
+DIFF_BLOCK_SIZE = 0x1000
+
+def _is_binary_type(fldtype):
+    return isinstance(fldtype, savegame_schema.BinaryType) or fldtype in ("binaryarray", _REST_TYPE)
+
+def _binary_span(body, offs, end, fldtype):
+    #Data of a binary value without its length and padding.
+    if fldtype == "binaryarray":
+        return offs + 4, offs + 4 + _read_uint32(body, offs)
+    if isinstance(fldtype, savegame_schema.BinaryType):
+        return offs, offs + fldtype.size
+    return offs, end
+
+def diff_binary(data_a, data_b, block_size=DIFF_BLOCK_SIZE):
+    #Returns the [start word, end word) ranges in which two binary values differ (32-bit words, the longer value's tail counts as changed).
+    import zlib
+    ranges = []
+    common_len = min(len(data_a), len(data_b))
+    for block_start in range(0, common_len, block_size):
+        block_end = min(block_start + block_size, common_len)
+        if zlib.crc32(data_a[block_start:block_end]) == zlib.crc32(data_b[block_start:block_end]):
+            continue
+        for offs in range(block_start, block_end, 4):
+            if data_a[offs:offs+4] != data_b[offs:offs+4]:
+                word = offs // 4
+                if len(ranges) > 0 and ranges[-1][1] == word:
+                    ranges[-1][1] = word + 1
+                else:
+                    ranges.append([word, word + 1])
+    if len(data_a) != len(data_b):
+        word_start, word_end = common_len // 4, (max(len(data_a), len(data_b)) + 3) // 4
+        if len(ranges) > 0 and ranges[-1][1] >= word_start:
+            ranges[-1][1] = word_end
+        else:
+            ranges.append([word_start, word_end])
+    return [tuple(word_range) for word_range in ranges]
+
+def _diff_json(old, new, path, changes):
+    #Diff of decoded values, for the types that are not walked in the encoded form.
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys():
+            if key in new:
+                _diff_json(old[key], new[key], path + (key,), changes)
+            else:
+                changes.append(BodyChange(path + (key,), "removed", old[key], None, None))
+        for key in new.keys():
+            if key not in old:
+                changes.append(BodyChange(path + (key,), "added", None, new[key], None))
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(min(len(old), len(new))):
+            _diff_json(old[i], new[i], path + (str(i),), changes)
+        for i in range(len(new), len(old)):
+            changes.append(BodyChange(path + (str(i),), "removed", old[i], None, None))
+        for i in range(len(old), len(new)):
+            changes.append(BodyChange(path + (str(i),), "added", None, new[i], None))
+    elif old != new and not (old != old and new != new): #NaN equals NaN here
+        changes.append(BodyChange(path, "changed", old, new, None))
+
+class _BodyDiff:
+    def __init__(self, lazy_a, lazy_b):
+        import zlib
+        self.crc32 = zlib.crc32
+        self.lazy_a, self.lazy_b = lazy_a, lazy_b
+        self.body_a, self.body_b = memoryview(lazy_a.body), memoryview(lazy_b.body)
+        self.changes = []
+    def value(self, offs_a, offs_b, fldtype, path):
+        body_a, body_b = self.body_a, self.body_b
+        end_a = _skip_value(body_a, offs_a, fldtype)
+        end_b = _skip_value(body_b, offs_b, fldtype)
+        if end_a - offs_a == end_b - offs_b and self.crc32(body_a[offs_a:end_a]) == self.crc32(body_b[offs_b:end_b]):
+            return
+        if _is_binary_type(fldtype):
+            start_a, stop_a = _binary_span(body_a, offs_a, end_a, fldtype)
+            start_b, stop_b = _binary_span(body_b, offs_b, end_b, fldtype)
+            ranges = diff_binary(body_a[start_a:stop_a], body_b[start_b:stop_b])
+            if len(ranges) > 0:
+                self.changes.append(BodyChange(path, "binary", stop_a - start_a, stop_b - start_b, ranges))
+        elif isinstance(fldtype, savegame_schema.ArrayType):
+            count_a, count_b = _read_uint32(body_a, offs_a), _read_uint32(body_b, offs_b)
+            offs_a, offs_b = offs_a + 4, offs_b + 4
+            for i in range(max(count_a, count_b)):
+                if i >= count_a:
+                    self.changes.append(BodyChange(path + (str(i),), "added", None, self.lazy_b._decode(offs_b, fldtype.element), None))
+                elif i >= count_b:
+                    self.changes.append(BodyChange(path + (str(i),), "removed", self.lazy_a._decode(offs_a, fldtype.element), None, None))
+                else:
+                    self.value(offs_a, offs_b, fldtype.element, path + (str(i),))
+                if i < count_a:
+                    offs_a = _skip_value(body_a, offs_a, fldtype.element)
+                if i < count_b:
+                    offs_b = _skip_value(body_b, offs_b, fldtype.element)
+        elif isinstance(fldtype, savegame_schema.RecordType):
+            for fld in fldtype.fields:
+                self.value(offs_a, offs_b, fld.type, path + (fld.name,))
+                offs_a = _skip_value(body_a, offs_a, fld.type)
+                offs_b = _skip_value(body_b, offs_b, fld.type)
+        elif fldtype == "Variant" and _read_uint32(body_a, offs_a) == _read_uint32(body_b, offs_b) and \
+            isinstance(_variant_payload_type(body_a, offs_a)[1], (savegame_schema.ArrayType, savegame_schema.RecordType)):
+            typename, payload_type = _variant_payload_type(body_a, offs_a)
+            self.value(offs_a + 4, offs_b + 4, payload_type, path + (typename,))
+        elif fldtype == "Variant" and _read_uint32(body_a, offs_a) != _read_uint32(body_b, offs_b):
+            self.changes.append(BodyChange(path, "changed", self.lazy_a._decode(offs_a, fldtype), self.lazy_b._decode(offs_b, fldtype), None))
+        else:
+            _diff_json(self.lazy_a._decode(offs_a, fldtype), self.lazy_b._decode(offs_b, fldtype), path, self.changes)
+
+def diff_saves(header_a, body_a, header_b, body_b, keep_inner_json_as_string=False):
+    #Returns the differences from body_a to body_b as a list of BodyChange, paths as tuples (join with '/' for query/patch).
+    lazy_a = LazySave(header_a, body_a, keep_inner_json_as_string=keep_inner_json_as_string)
+    lazy_b = LazySave(header_b, body_b, keep_inner_json_as_string=keep_inner_json_as_string)
+    differ = _BodyDiff(lazy_a, lazy_b)
+    if bytes(header_a) != bytes(header_b):
+        differ.changes.append(BodyChange(("header",), "binary", len(header_a), len(header_b), diff_binary(header_a, header_b)))
+    index_a, index_b = lazy_a.index(), lazy_b.index()
+    fields_b = {fld.name: i for i, fld in enumerate(index_b.fields)}
+    for i, fld in enumerate(index_a.fields):
+        j = fields_b.get(fld.name)
+        if j is None:
+            differ.changes.append(BodyChange((fld.name,), "removed", lazy_a._decode(index_a.offsets[i], fld.type), None, None))
+        elif fld.type != index_b.fields[j].type:
+            _diff_json(lazy_a._decode(index_a.offsets[i], fld.type), lazy_b._decode(index_b.offsets[j], index_b.fields[j].type), (fld.name,), differ.changes)
+        else:
+            differ.value(index_a.offsets[i], index_b.offsets[j], fld.type, (fld.name,))
+    fields_a = set(fld.name for fld in index_a.fields)
+    for j, fld in enumerate(index_b.fields):
+        if fld.name not in fields_a:
+            differ.changes.append(BodyChange((fld.name,), "added", None, lazy_b._decode(index_b.offsets[j], fld.type), None))
+    return differ.changes
+
+def _diff_value_str(value, max_len=200):
+    import json
+    value_str = json.dumps(value)
+    return value_str if (len(value_str) <= max_len) else "%s... (%d characters)" % (value_str[:max_len], len(value_str))
+
+def diff_file(paths, flags):
+    #Prints the differences between save files paths[0] and paths[1]. Returns the number of differences.
+    import json
+    header_a, body_a = load_save(paths[0])
+    header_b, body_b = load_save(paths[1])
+    changes = diff_saves(header_a, body_a, header_b, body_b, "--keep-inner-json-as-string" in flags)
+    if "--json" in flags:
+        print(json.dumps([{"path": "/".join(change.path), "kind": change.kind, "old": change.old, "new": change.new, "ranges": change.ranges}
+            for change in changes], indent=4))
+        return len(changes)
+    for change in changes:
+        path = "/".join(change.path)
+        if change.kind == "changed":
+            print("%s: %s -> %s" % (path, _diff_value_str(change.old), _diff_value_str(change.new)))
+        elif change.kind == "added":
+            print("%s: added %s" % (path, _diff_value_str(change.new)))
+        elif change.kind == "removed":
+            print("%s: removed %s" % (path, _diff_value_str(change.old)))
+        else:
+            words_changed = sum(end - start for start, end in change.ranges)
+            size_str = "%d bytes" % change.old if (change.old == change.new) else "%d -> %d bytes" % (change.old, change.new)
+            print("%s: binary, %s, %d word(s) changed in %d range(s): %s%s" % (path, size_str, words_changed, len(change.ranges),
+                ", ".join(("0x%x" % start) if (end == start + 1) else ("0x%x-0x%x" % (start, end - 1)) for start, end in change.ranges[:8]), ", ..." if len(change.ranges) > 8 else ""))
+    print("%d difference(s)." % len(changes))
+    return len(changes)
+
+class SerdesProfiler:
+    #Accounting per field path and per Variant type id, filled by a serializer class from profiled_serdes.
+    # Fixed size fields in a Run are (un)packed together and are accounted together, as 'name1+name2+...'.
+    def __init__(self, callback=None):
+        self.callback = callback #Optional callback(path, seconds, bytes_consumed, bytes_emitted) after each field / Variant, path as tuple of names.
+        self.fields = {} #path tuple: [calls, seconds, self seconds, bytes consumed, bytes emitted]
+        self.variants = {} #typeid: [calls, seconds, bytes consumed, bytes emitted]
+        self._path = []
+        self._child_seconds = [0.0]
+    def measure(self, serdes, name, typeid, fn, *args):
+        #Returns fn(*args), accounted as field name below the current path (and as Variant typeid, if not None).
+        self._path.append(name)
+        self._child_seconds.append(0.0)
+        offs_pre = serdes.offs
+        out_offs_pre = serdes._out_pos()
+        time_pre = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            seconds = time.perf_counter() - time_pre
+            consumed = serdes.offs - offs_pre
+            emitted = serdes._out_pos() - out_offs_pre
+            child_seconds = self._child_seconds.pop()
+            self._child_seconds[-1] += seconds
+            path = tuple(self._path)
+            self._path.pop()
+            stats = self.fields.get(path)
+            if stats is None:
+                stats = self.fields[path] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += seconds - child_seconds
+            stats[3] += consumed
+            stats[4] += emitted
+            if typeid is not None:
+                stats = self.variants.get(typeid)
+                if stats is None:
+                    stats = self.variants[typeid] = [0, 0.0, 0, 0]
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] += consumed
+                stats[3] += emitted
+            if self.callback is not None:
+                self.callback(path, seconds, consumed, emitted)
+    def print_report(self, limit=30):
+        #Field paths sorted by self time (not spent in nested fields), then the Variant types sorted by time.
+        print("%10s %10s %10s %12s %12s  %s" % ("calls", "total ms", "self ms", "consumed", "emitted", "field path"))
+        for path, (calls, seconds, self_seconds, consumed, emitted) in sorted(self.fields.items(), key=lambda item: -item[1][2])[:limit]:
+            print("%10d %10.2f %10.2f %12d %12d  %s" % (calls, seconds * 1000, self_seconds * 1000, consumed, emitted, "/".join(path)))
+        if len(self.fields) > limit:
+            print("(%d more field paths)" % (len(self.fields) - limit))
+        if len(self.variants) > 0:
+            print("")
+            print("%10s %10s %10s %12s %12s  %s" % ("calls", "total ms", "", "consumed", "emitted", "Variant type"))
+            for typeid, (calls, seconds, consumed, emitted) in sorted(self.variants.items(), key=lambda item: -item[1][1]):
+                print("%10d %10.2f %10s %12d %12d  %s (%d)" % (calls, seconds * 1000, "", consumed, emitted, _variant_typename(typeid), typeid))
+    def to_json(self):
+        return {
+            "fields": [{"path": "/".join(path), "calls": stats[0], "seconds": stats[1], "self_seconds": stats[2], "bytes_consumed": stats[3], "bytes_emitted": stats[4]}
+                for path, stats in sorted(self.fields.items())],
+            "variants": [{"typeid": typeid, "type": _variant_typename(typeid), "calls": stats[0], "seconds": stats[1], "bytes_consumed": stats[2], "bytes_emitted": stats[3]}
+                for typeid, stats in sorted(self.variants.items())],
+        }
+    def write(self, path):
+        #Writes json for a .json path, otherwise folded stacks ('a;b;c <self microseconds>' per line) for flamegraph.pl.
+        if path.lower().endswith(".json"):
+            import json
+            with open(path, 'w') as fout:
+                json.dump(self.to_json(), fout, indent=4)
+            return
+        with open(path, 'w') as fout:
+            for fieldpath, stats in sorted(self.fields.items()):
+                fout.write("%s %d\n" % (";".join(fieldpath), round(stats[2] * 1e6)))
+
+def _variant_typename(typeid):
+    return _variant_typeinfo_lookup[typeid][0] if (0 < typeid < len(_variant_typeinfo_lookup)) else "Variant"
+
+_profiled_classes = {}
+_run_names = {} #Run: Name in the profile
+def profiled_serdes(cls):
+    #Subclass of the serializer class cls that reports each field and Variant to its profiler attribute (a SerdesProfiler).
+    # Only the subclass pays for the instrumentation; compile_fields caches its plans separately from those of cls.
+    profiled = _profiled_classes.get(cls)
+    if profiled is not None:
+        return profiled
+    class ProfiledSerdes(cls):
+        profiler = None
+        def _serdes_field(self, deser_out, deser_in_shortnames, fieldname, fieldfn):
+            if self._skip_record is not None: #Skip table pass (see _build_skip_table)
+                return cls._serdes_field(self, deser_out, deser_in_shortnames, fieldname, fieldfn)
+            return self.profiler.measure(self, fieldname, None, cls._serdes_field, self, deser_out, deser_in_shortnames, fieldname, fieldfn)
+        def _serdes_plan(self, plan, deser_out, deser_in_shortnames, top_level=True):
+            return cls._serdes_plan(self, plan, deser_out, deser_in_shortnames, True) #Nested fields through _serdes_field as well.
+        def _serdes_run(self, run, deser_out, deser_in_shortnames):
+            if self._skip_record is not None:
+                return cls._serdes_run(self, run, deser_out, deser_in_shortnames)
+            name = _run_names.get(run)
+            if name is None:
+                name = _run_names[run] = "+".join(fld.name for fld in run.fields)
+            return self.profiler.measure(self, name, None, cls._serdes_run, self, run, deser_out, deser_in_shortnames)
+        def _serdes_variant(self, deser_in=None):
+            if self._skip_record is not None:
+                return cls._serdes_variant(self, deser_in)
+            if deser_in is not None:
+                typeid = FledgeSerdes._typename_to_id(next(iter(deser_in.keys())))
+            else:
+                typeid = _codec_uint32.struct.unpack_from(self.body_in, self.offs)[0]
+            return self.profiler.measure(self, _variant_typename(typeid), typeid, cls._serdes_variant, self, deser_in)
+    ProfiledSerdes.__name__ = "Profiled" + cls.__name__
+    ProfiledSerdes._variant_dictionary_element = savegame_schema.compile_element(ProfiledSerdes, savegame_schema.VARIANT_DICTIONARY_ELEMENT)
+    _profiled_classes[cls] = ProfiledSerdes
+    return ProfiledSerdes
+
+def _serdes_for(cls, profiler):
+    return cls if (profiler is None) else profiled_serdes(cls)
+
+PARSE_CACHE_VERSION = 1 #Increase when the extract output changes without a change of the field lists in savegame_schema.
+PARSE_CACHE_SIZE = 0x20000000 #Default size limit of a ParseCache directory
+PARSE_CACHE_MAGIC = b'SGC2' #Entries: (warnings, result)
+_schema_fingerprint = None
+
+def schema_fingerprint():
+    #crc32 of the field lists, so that cached results are not used after a schema change.
+    global _schema_fingerprint
+    if _schema_fingerprint is None:
+        import zlib
+        _schema_fingerprint = zlib.crc32(repr((savegame_schema.CORE_HEADER_FIELDS, savegame_schema.CORE_FIELDS, savegame_schema.ERA_FIELDS)).encode('utf8'))
+    return _schema_fingerprint
+
+class ParseCache:
+    #On-disk cache of extract results in a directory. An entry is keyed by what identifies the body without reading it:
+    # magic, header, stored checksum and body sizes (and the extract options, schema and PARSE_CACHE_VERSION).
+    # Entries are marshal dumps (compact and fast to load) of the result and of the warnings printed while parsing,
+    # so that a hit reports the same problems as a fresh parse. The least recently used entries are removed once the
+    # directory holds more than max_size bytes. An entry is only checked when it is loaded: The stored key has to
+    # match, and unreadable entries are removed.
+    def __init__(self, path, max_size=PARSE_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+    def key(self, info, skip_era=False, keep_inner_json_as_string=False):
+        #info: SavegameHeader from read_savegame_header. None if the file has no checksum to identify the body by.
+        if not savegame_has_checksum:
+            return None
+        return struct.pack("<6I2B", ATLASFALLEN_MAGIC, info.checksum, info.body_is_compressed, info.body_compressed_size, info.body_decompressed_size,
+            PARSE_CACHE_VERSION, skip_era, keep_inner_json_as_string) + struct.pack("<I", schema_fingerprint()) + bytes(info.header)
+    def _entry_path(self, key):
+        import hashlib
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + ".cache")
+    def get(self, key):
+        #Returns (cached result, warnings), or None.
+        import marshal
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as fin:
+                data = fin.read()
+        except OSError:
+            return None
+        prefix = PARSE_CACHE_MAGIC + struct.pack("<I", len(key)) + key
+        try:
+            if data[:len(prefix)] != prefix:
+                raise ValueError("Key mismatch")
+            warnings, ret = marshal.loads(memoryview(data)[len(prefix):])
+        except (ValueError, EOFError, TypeError):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path) #Most recently used
+        except OSError:
+            pass
+        return ret, warnings
+    def put(self, key, deser_out, warnings=""):
+        import marshal
+        path = self._entry_path(key)
+        path_tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(path_tmp, 'wb') as fout:
+            fout.write(PARSE_CACHE_MAGIC + struct.pack("<I", len(key)) + key)
+            fout.write(marshal.dumps((warnings, deser_out)))
+        os.replace(path_tmp, path)
+        self.evict()
+    def evict(self):
+        entries = []
+        with os.scandir(self.path) as dir_entries:
+            for entry in dir_entries:
+                if entry.name.endswith(".cache"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        total_size = sum(entry[1] for entry in entries)
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+def load_extract(path, skip_era=False, keep_inner_json_as_string=False, cache=None, name32_index=None):
+    #extract() for a save file, through cache (ParseCache) if given: A hit skips decompressing and parsing the body,
+    # and prints the warnings of the parse again. Returns (json representation, body size).
+    import contextlib
+    with open(path, 'rb') as fin:
+        info = read_savegame_header(fin)
+        key = None if (cache is None) else cache.key(info, skip_era, keep_inner_json_as_string)
+        entry = None if (key is None) else cache.get(key)
+        if entry is None:
+            log = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(log):
+                    header, body = read_savegame_stream(fin)
+                    body_size = len(body)
+                    deser_out = extract(header, body, skip_era, keep_inner_json_as_string)
+                    del header, body
+            finally:
+                print(log.getvalue(), end="")
+            if key is not None:
+                cache.put(key, deser_out, log.getvalue())
+        else:
+            deser_out, warnings = entry
+            print(warnings, end="")
+            body_size = info.body_decompressed_size
+    if name32_index is not None:
+        import name32_index as name32_index_module
+        name32_index_module.annotate_name32(deser_out, name32_index)
+    return deser_out, body_size
+
+#Library API, for use without the command line (e.g. a long running worker):
+#  header, body = load_save("in.sav")
+#  body_obj = extract(header, body)
+#  body_obj["bool fieldEra60"] = True
+#  sav_data = compose(header, body_obj, compress=True)
+def load_save(source, max_body_size=MAX_BODY_SIZE):
+    #source: Path of a .sav file, its contents (bytes-like) or a binary file object. Returns (header, decompressed body).
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return read_savegame(source, max_body_size)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as fin:
+            return read_savegame_stream(fin, max_body_size)
+    return read_savegame_stream(source, max_body_size)
+
+def extract(header, body, skip_era=False, keep_inner_json_as_string=False, sidecar=None, name32_index=None, profiler=None, fout=None, typed_arrays=False):
+    #Returns the json representation (dicts/lists) of the body, as written by extract_json.
+    # sidecar: Optional SidecarWriter for the binary fields, name32_index: Optional name32_index.Name32Index for annotations.
+    # profiler: Optional SerdesProfiler to account the fields in.
+    # fout: Optional text file to write the json to field by field while parsing (see JsonObjectWriter), returns None then.
+    # typed_arrays: Arrays of single numeric scalars (e.g. uint32[]) as array.array, see json_default and numpy_view.
+    serdes = _serdes_for(EraSerdes, profiler)(header, body, skip_era, keep_inner_json_as_string, extract_only=True)
+    serdes.sidecar = sidecar
+    serdes.profiler = profiler
+    serdes.typed_arrays = typed_arrays
+    annotate = None
+    if name32_index is not None:
+        import name32_index as name32_index_module
+        annotate = lambda deser: name32_index_module.annotate_name32(deser, name32_index)
+    if fout is not None:
+        serdes.top_level_out = JsonObjectWriter(fout, annotate)
+        serdes.serdes_body(None)
+        serdes.top_level_out.close()
+        return None
+    deser_out = serdes.serdes_body(None)
+    if annotate is not None:
+        annotate(deser_out)
+    return deser_out
+
+def _original_fields(header, body_orig, orig_obj=None):
+    #orig_fields for compose_body: Top level fields of body_orig with their value and encoded bytes (a view of body_orig).
+    # orig_obj: Optional json representation of body_orig (e.g. from load_extract with a ParseCache), otherwise body_orig is parsed.
+    # Fields up to a parse error are kept.
+    import contextlib
+    if orig_obj is None:
+        serdes = EraSerdes(header, body_orig, keep_inner_json_as_string=True, extract_only=True) #Inner json as written.
+        serdes._orig_record = {}
+        try:
+            with contextlib.redirect_stdout(io.StringIO()): #Warnings are printed by the compose itself.
+                serdes.serdes_body(None)
+        except (ValueError, IndexError, struct.error):
+            pass
+        return serdes._orig_record
+    orig_fields = {}
+    body_view = memoryview(body_orig)
+    try:
+        for fld, start, end in iter_body_fields(header, body_view):
+            if fld.name in _JSON_FIELD_NAMES:
+                orig_fields[fld.name] = (_marshal_dump(_json_field_string(body_view[start:end])), body_view[start:end])
+            elif fld.name in orig_obj:
+                orig_fields[fld.name] = (_marshal_dump(orig_obj[fld.name]), body_view[start:end])
+    except (ValueError, IndexError, struct.error):
+        pass
+    return orig_fields
+
+def compose_body(header, body_obj, body_orig=None, sidecar=None, profiler=None, orig_obj=None):
+    #Returns the body (bytearray) from its json representation (or a JsonObjectReader).
+    # body_orig: Optional original body. Top level fields whose value did not change are copied from it instead of encoded.
+    #  orig_obj: Optional json representation of body_orig, saves parsing it (see _original_fields).
+    # sidecar: Optional SidecarReader for sidecar references, profiler: Optional SerdesProfiler.
+    serdes = _serdes_for(EraSerdes, profiler)(header, None)
+    if body_orig is not None:
+        serdes.orig_fields = _original_fields(header, body_orig, orig_obj)
+    serdes.sidecar = sidecar
+    serdes.profiler = profiler
+    if isinstance(body_obj, JsonObjectReader):
+        serdes.top_level_out = JsonObjectWriter(None) #Streaming: Do not collect the output values either.
+    serdes.serdes_body(body_obj)
+    return serdes.body_out
+
+def compose(header, body_obj, compress=False, body_orig=None, sidecar=None, profiler=None, compress_level=-1, compress_threads=1):
+    #Returns the contents of a .sav file with the body from its json representation (or raw, if body_obj is bytes-like).
+    body = body_obj if isinstance(body_obj, (bytes, bytearray, memoryview)) else compose_body(header, body_obj, body_orig, sidecar, profiler)
+    fout = io.BytesIO()
+    write_savegame(fout, header, body, compress, None, compress_level, compress_threads)
+    return fout.getvalue()
+
+def process_file(mode, paths, flags, options=None):
+    #Runs one of the single file modes (extract_raw, extract_json, compose_raw, compose_json). Returns the body size.
+    import json
+    import contextlib
+    options = {} if (options is None) else options
+    profiler = SerdesProfiler() if ("--profile" in flags or "--profile-out" in options) else None
+    cache = None
+    if mode in ("extract_json", "compose_json") and "--cache" in options and "--sidecar" not in flags and "--stream" not in flags and profiler is None:
+        cache = ParseCache(options["--cache"], int(float(options.get("--cache-size", PARSE_CACHE_SIZE / 0x100000)) * 0x100000))
+    header, body = (None, None) if (cache is not None and mode == "extract_json") else load_save(paths[0]) #With the cache, the body is only read on a miss.
+
     if mode == "extract_raw":
-        with open(sys.argv[3], 'wb') as fout:
+        with open(paths[1], 'wb') as fout:
             fout.write(body)
     if mode == "extract_json":
-        with open(sys.argv[3], 'wb') as fout:
-            serdes = EraSerdes(header, body, "--skip-era" in flags, "--keep-inner-json-as-string" in flags)
-            body_json = json.dumps(serdes.serdes_body(None), indent=4)
-            fout.write(body_json.encode('utf8'))
+        with contextlib.ExitStack() as stack:
+            sidecar = stack.enter_context(SidecarWriter(sidecar_path(paths[1]))) if ("--sidecar" in flags) else None
+            index = None
+            if "--name32-index" in options:
+                import name32_index
+                index = stack.enter_context(name32_index.Name32Index(options["--name32-index"]))
+            if "--stream" in flags:
+                with open(paths[1] + ".tmp", 'w', encoding='utf8', newline='') as fout: #Not left half written on errors.
+                    extract(header, body, "--skip-era" in flags, "--keep-inner-json-as-string" in flags, sidecar, index, profiler, fout)
+                os.replace(paths[1] + ".tmp", paths[1])
+            else:
+                if cache is not None:
+                    deser_out, body_size = load_extract(paths[0], "--skip-era" in flags, "--keep-inner-json-as-string" in flags, cache, index)
+                else:
+                    deser_out = extract(header, body, "--skip-era" in flags, "--keep-inner-json-as-string" in flags, sidecar, index, profiler)
+                body_json = json.dumps(deser_out, indent=4)
+                with open(paths[1], 'wb') as fout:
+                    fout.write(body_json.encode('utf8'))
     if mode.startswith("compose_"):
-        with open(sys.argv[3], 'rb') as fin_body:
+        with open(paths[1], 'rb') as fin_body:
             if mode == "compose_raw":
                 body = fin_body.read()
             if mode == "compose_json":
-                body_json = json.loads(fin_body.read().decode('utf8'))
-                serdes = EraSerdes(header, None)
-                serdes.serdes_body(body_json)
-                body = serdes.body_out
-        computed_checksum = compute_checksum(body)
-        with open(sys.argv[4], 'wb') as fout:
-            fout.write(struct.pack("III", ATLASFALLEN_MAGIC, computed_checksum, header_size))
-            fout.write(header)
-            if "--compress" in flags:
-                #Default compression level can produce identical files to the game
-                # (depending on zlib version - game uses zlib 1.2.3; is the case for Python 3.9 and 3.11, probably not for future versions - https://github.com/python/cpython/issues/91349 )
-                compressor = zlib.compressobj(wbits=15) 
-                body_compressed = compressor.compress(body)
-                body_compressed += compressor.flush()
-                fout.write(struct.pack("III", 1, len(body_compressed), len(body)))
-                fout.write(body_compressed)
+                body_orig, orig_obj = body, None #Unchanged top level fields are copied from the original body.
+                if "--stream" in flags:
+                    body_json = JsonObjectReader(io.TextIOWrapper(fin_body, encoding='utf8'))
+                    body_orig = None #Would hold all of the original values.
+                else:
+                    body_json = json.loads(fin_body.read().decode('utf8'))
+                if cache is not None: #Original values from an earlier extract_json, instead of parsing the original body.
+                    with open(paths[0], 'rb') as fin:
+                        key = cache.key(read_savegame_header(fin), "--skip-era" in flags, "--keep-inner-json-as-string" in flags)
+                    entry = None if (key is None) else cache.get(key)
+                    orig_obj = None if (entry is None) else entry[0]
+                with SidecarReader(os.path.dirname(paths[1])) as sidecar:
+                    body = compose_body(header, body_json, body_orig, sidecar, profiler, orig_obj)
+        with open(paths[2], 'wb') as fout:
+            write_savegame(fout, header, body, "--compress" in flags, None,
+                int(options.get("--compress-level", -1)), int(options.get("--compress-threads", 1)))
+    if "--profile" in flags:
+        profiler.print_report()
+    if "--profile-out" in options:
+        profiler.write(options["--profile-out"])
+    return len(body) if (body is not None) else body_size
+
+
+def _batch_files(pattern):
+    import glob
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(glob.escape(pattern), "*.sav")))
+    return sorted(glob.glob(pattern))
+
+def _batch_job(mode, paths, flags, options):
+    #Runs in a worker process. Returns (paths, error or None, printed messages, body size, seconds).
+    import contextlib
+    time_start = time.perf_counter()
+    log = io.StringIO()
+    error = None
+    body_size = 0
+    try:
+        with contextlib.redirect_stdout(log):
+            body_size = process_file(mode, paths, flags, options)
+    except Exception as e:
+        error = "%s: %s" % (type(e).__name__, str(e))
+    return paths, error, log.getvalue(), body_size, time.perf_counter() - time_start
+
+def run_batch(mode, args, flags, options, workers):
+    #Runs the single file mode for each save file matched by args[0] on a process pool. Returns the number of failed files.
+    import concurrent.futures
+    file_mode = mode[:-len("_batch")]
+    jobs = []
+    for path in _batch_files(args[0]):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if file_mode == "extract_json":
+            jobs.append((path, os.path.join(args[1], name + ".json")))
+        else:
+            jobs.append((path, os.path.join(args[1], name + ".json"), os.path.join(args[2], name + ".sav")))
+    if len(jobs) == 0:
+        print("No save files found for '%s'." % args[0])
+        return 0
+    out_dir = args[-1]
+    os.makedirs(out_dir, exist_ok=True)
+    for job in jobs:
+        if os.path.exists(job[-1]) and os.path.samefile(job[0], job[-1]):
+            print("The output directory cannot contain the input files.")
+            return len(jobs)
+
+    time_start = time.perf_counter()
+    results = []
+    if workers <= 1:
+        for job in jobs:
+            results.append(_batch_job(file_mode, job, flags, options))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_batch_job, file_mode, job, flags, options) for job in jobs]
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+    elapsed = time.perf_counter() - time_start
+
+    failed = [result for result in results if result[1] is not None]
+    for paths, error, log, body_size, seconds in sorted(results):
+        if error is None and len(log) > 0:
+            print("%s:\n  %s" % (paths[0], log.rstrip().replace("\n", "\n  ")))
+    for paths, error, log, body_size, seconds in sorted(failed):
+        print("FAILED %s: %s" % (paths[0], error))
+        if len(log) > 0:
+            print("  " + log.rstrip().replace("\n", "\n  "))
+    body_total = sum(result[3] for result in results)
+    print("Processed %d files (%d failed) in %.2f s with %d worker(s): %.1f files/s, %.2f MB/s (decompressed body)" % (
+        len(results), len(failed), elapsed, max(1, workers), len(results) / max(elapsed, 1e-9), body_total / 1e6 / max(elapsed, 1e-9)))
+    print("Slowest files:")
+    for paths, error, log, body_size, seconds in sorted(results, key=lambda result: -result[4])[:5]:
+        print("  %7.3f s  %s" % (seconds, paths[0]))
+    return len(failed)
+
+
+def _watch_job(sav_path, json_path, flags, options):
+    #Runs extract_json into a temporary directory next to json_path (same file system, for os.replace) and then moves
+    # the results in place, so that readers never see a partially written json (or sidecar) file.
+    import shutil
+    import tempfile
+    tmp_dir = tempfile.mkdtemp(prefix=".watch_tmp", dir=os.path.dirname(json_path))
+    try:
+        tmp_json_path = os.path.join(tmp_dir, os.path.basename(json_path))
+        result = _batch_job("extract_json", (sav_path, tmp_json_path), flags, options)
+        if result[1] is None:
+            if "--sidecar" in flags:
+                os.replace(sidecar_path(tmp_json_path), sidecar_path(json_path))
+            os.replace(tmp_json_path, json_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return result
+
+class SaveWatcher:
+    #Mirrors the save files in a directory to json (as extract_json), re-extracting only saves whose content changed.
+    # Each poll only stats the files. A file whose mtime or size changed is read once it has kept them for the debounce time
+    # (the game may still be writing it), and then only its header: If the stored checksum, header and body sizes match
+    # the last extraction, the file was rewritten with the same content and is not parsed again.
+    def __init__(self, sav_dir, json_dir, flags, options, workers, interval=1.0, debounce=1.0):
+        self.sav_dir = sav_dir
+        self.json_dir = json_dir
+        self.flags = flags
+        self.options = options
+        self.workers = max(1, workers) #Process pool size
+        self.interval = interval
+        self.debounce = debounce
+        self.states = {} #path: [stat (mtime, size), time of the last stat change, stat when last extracted, content key when last extracted]
+        self.running = set()
+    def _json_path(self, sav_path):
+        return os.path.join(self.json_dir, os.path.splitext(os.path.basename(sav_path))[0] + ".json")
+    def _content_key(self, path, stat):
+        #Header, stored checksum and body sizes, None if the file is not complete (yet).
+        try:
+            with open(path, 'rb') as fin:
+                info = read_savegame_header(fin)
+        except (OSError, SavegameFormatError):
+            return None
+        body_size = info.body_compressed_size if (info.body_is_compressed != 0) else info.body_decompressed_size
+        if info.body_offset + body_size != info.file_size:
+            return None
+        return (info.header, info.checksum if savegame_has_checksum else stat, info.body_is_compressed, info.body_compressed_size, info.body_decompressed_size)
+    def poll(self, now, debounce):
+        #Returns the saves to extract: [(path, stat, content key)]
+        ready = []
+        seen = set()
+        with os.scandir(self.sav_dir) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(".sav"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stat = (st.st_mtime_ns, st.st_size)
+                seen.add(entry.path)
+                state = self.states.get(entry.path)
+                if state is None:
+                    state = self.states[entry.path] = [stat, now, None, None]
+                    try:
+                        if os.stat(self._json_path(entry.path)).st_mtime_ns >= st.st_mtime_ns:
+                            state[2] = stat #Extracted before (e.g. by an earlier run).
+                            state[3] = self._content_key(entry.path, stat)
+                    except OSError:
+                        pass
+                elif state[0] != stat:
+                    state[0] = stat
+                    state[1] = now
+                if state[2] == stat or entry.path in self.running or now - state[1] < debounce:
+                    continue
+                content_key = self._content_key(entry.path, stat)
+                if content_key is None:
+                    state[1] = now #Incomplete, wait for the next write.
+                elif content_key == state[3]:
+                    state[2] = stat
+                else:
+                    ready.append((entry.path, stat, content_key))
+        for path in list(self.states.keys()):
+            if path not in seen:
+                del self.states[path]
+        return ready
+    async def _extract(self, loop, executor, path, stat, content_key):
+        self.running.add(path)
+        try:
+            paths, error, log, body_size, seconds = await loop.run_in_executor(executor, _watch_job, path, self._json_path(path), self.flags, self.options)
+        finally:
+            self.running.discard(path)
+        state = self.states.get(path)
+        if state is not None:
+            state[2] = stat #Also on errors: Retry once the file changes again.
+            state[3] = content_key if (error is None) else None
+        if error is None:
+            print("Extracted %s (%.2f s)" % (path, seconds))
+        else:
+            print("FAILED %s: %s" % (path, error))
+        if len(log) > 0:
+            print("  " + log.rstrip().replace("\n", "\n  "))
+    async def run(self, once=False):
+        #Polls until cancelled. once: Extracts the saves that need it (without debouncing) and returns.
+        import asyncio
+        import concurrent.futures
+        os.makedirs(self.json_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                for path, stat, content_key in self.poll(time.monotonic(), 0 if once else self.debounce):
+                    task = asyncio.ensure_future(self._extract(loop, executor, path, stat, content_key))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if once:
+                    if len(tasks) > 0:
+                        await asyncio.gather(*tasks)
+                    return
+                await asyncio.sleep(self.interval)
+
+def run_watch(args, flags, options):
+    import asyncio
+    workers = int(options.get("--workers", os.cpu_count() or 1))
+    watcher = SaveWatcher(args[0], args[1], flags, options, workers, float(options.get("--interval", 1.0)), float(options.get("--debounce", 1.0)))
+    if "--once" not in flags:
+        print("Watching %s (Ctrl+C to stop)" % args[0])
+    try:
+        asyncio.run(watcher.run("--once" in flags))
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+INDEX_DB_VERSION = 2 #PRAGMA user_version of the index database, saves indexed with an older version are indexed again
+INDEX_DB_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS saves (path TEXT PRIMARY KEY, checksum INTEGER, era_format INTEGER, body_size INTEGER, extract_key TEXT, indexed REAL)",
+    #One row per scalar of the extract_json output. path: json keys and list indices joined with '/', field: the same with '*' for array indices.
+    "CREATE TABLE IF NOT EXISTS fields (save TEXT, checksum INTEGER, era_format INTEGER, path TEXT, field TEXT, value)",
+    "CREATE INDEX IF NOT EXISTS fields_field_value ON fields (field, value)",
+    "CREATE INDEX IF NOT EXISTS fields_save ON fields (save)",
+)
+
+_INDEX_FIXED_TYPES = set(savegame_schema.SCALAR_TYPES) | {"Ref"} #Types whose json value is a list of fixed length (e.g. vec3, Name32)
+_INDEX_ELEMENT_TYPES = {"Name32": ("Name32 hash",), "Ref": (None, "uint64")} #Types of the first list elements of fixed size types, see _index_value
+
+def _index_value(value, valtype):
+    #Stores Name32 hashes and 64 bit integers (strings in the json) as INTEGER, so that they compare as numbers.
+    # uint64 values above the int64 range of SQLite stay TEXT.
+    try:
+        if valtype == "Name32 hash":
+            return int(value, 16)
+        if valtype == "int64" or valtype == "uint64":
+            ret = int(value)
+            return ret if (ret < (1 << 63)) else value
+    except ValueError:
+        pass
+    return value
+
+def _flatten_fields(value, path, field, rows, valtype=None):
+    #Appends (path, field, value) for each scalar in the json representation. Binary fields (base64) are left out.
+    # valtype: Type from the json key (e.g. "vec3", "Name32[]"), the list indices of fixed size types stay in field.
+    if isinstance(value, dict):
+        for key, val in value.items():
+            if "-as-base64 " not in key:
+                _flatten_fields(val, path + "/" + key if path else key, field + "/" + key if field else key, rows, key.partition(' ')[0])
+    elif isinstance(value, (list, array.array)):
+        fixed = valtype in _INDEX_FIXED_TYPES
+        element_type = valtype if fixed else (valtype[:-2] if (valtype is not None and valtype.endswith("[]")) else None)
+        element_types = _INDEX_ELEMENT_TYPES.get(valtype, ()) if fixed else ()
+        for i, val in enumerate(value):
+            _flatten_fields(val, "%s/%d" % (path, i), "%s/%d" % (field, i) if fixed else field + "/*", rows,
+                element_types[i] if (i < len(element_types) and element_types[i] is not None) else element_type)
+    else:
+        rows.append((path, field, _index_value(value, valtype) if isinstance(value, str) else value))
+
+def _index_job(path, skip_era, keep_inner_json_as_string):
+    #Runs in a worker process. Returns (path, error or None, [(path, field, value)], body size).
+    import contextlib
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            deser_out, body_size = load_extract(path, skip_era, keep_inner_json_as_string)
+    except Exception as e:
+        return path, "%s: %s" % (type(e).__name__, str(e)), None, 0
+    rows = []
+    _flatten_fields(deser_out, "", "", rows)
+    return path, None, rows, body_size
+
+def index_saves(db_path, paths, skip_era=False, keep_inner_json_as_string=False, workers=1):
+    #Upserts the scalar fields of the given save files into the SQLite database at db_path. Saves whose stored checksum
+    # (and extract options) did not change since they were indexed are skipped, saves that no longer exist are removed.
+    # Returns (indexed paths, unchanged paths, {failed path: error}, removed paths).
+    import sqlite3
+    import concurrent.futures
+    db = sqlite3.connect(db_path)
+    try:
+        with db:
+            for statement in INDEX_DB_SCHEMA:
+                db.execute(statement)
+            db.execute("PRAGMA user_version = %d" % INDEX_DB_VERSION)
+        extract_key = "%08x:%d:%d:%d:%d" % (schema_fingerprint(), PARSE_CACHE_VERSION, INDEX_DB_VERSION, skip_era, keep_inner_json_as_string)
+        known = {path: (checksum, key) for path, checksum, key in db.execute("SELECT path, checksum, extract_key FROM saves")}
+        jobs = {}
+        unchanged = []
+        failed = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                with open(path, 'rb') as fin:
+                    info = read_savegame_header(fin)
+            except (OSError, SavegameFormatError) as e:
+                failed[path] = "%s: %s" % (type(e).__name__, str(e))
+                continue
+            if savegame_has_checksum and known.get(path) == (info.checksum, extract_key):
+                unchanged.append(path)
             else:
-                fout.write(struct.pack("III", 0, len(body), len(body)))
-                fout.write(body)
+                jobs[path] = (info.checksum, struct.unpack("I", info.header[0:4])[0])
+
+        indexed = []
+        def store(result):
+            path, error, rows, body_size = result
+            if error is not None:
+                failed[path] = error
+                return
+            checksum, era_format = jobs[path]
+            with db:
+                db.execute("DELETE FROM fields WHERE save = ?", (path,))
+                db.executemany("INSERT INTO fields VALUES (?, ?, ?, ?, ?, ?)", ((path, checksum, era_format) + row for row in rows))
+                db.execute("INSERT OR REPLACE INTO saves VALUES (?, ?, ?, ?, ?, ?)", (path, checksum, era_format, body_size, extract_key, time.time()))
+            indexed.append(path)
+        if workers <= 1:
+            for path in jobs:
+                store(_index_job(path, skip_era, keep_inner_json_as_string))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_index_job, path, skip_era, keep_inner_json_as_string) for path in jobs]
+                for future in concurrent.futures.as_completed(futures):
+                    store(future.result())
+
+        removed = [path for path in known if not os.path.exists(path)]
+        with db:
+            for path in removed + [path for path in failed if path in known]: #No stale rows for saves that cannot be read anymore.
+                db.execute("DELETE FROM fields WHERE save = ?", (path,))
+                db.execute("DELETE FROM saves WHERE path = ?", (path,))
+    finally:
+        db.close()
+    return indexed, unchanged, failed, removed
+
+def run_index(args, flags, options):
+    #Returns the number of failed files.
+    paths = _batch_files(args[0])
+    if len(paths) == 0:
+        print("No save files found for '%s'." % args[0])
+    workers = int(options.get("--workers", os.cpu_count() or 1))
+    time_start = time.perf_counter()
+    indexed, unchanged, failed, removed = index_saves(args[1], paths, "--skip-era" in flags, "--keep-inner-json-as-string" in flags, workers)
+    for path, error in sorted(failed.items()):
+        print("FAILED %s: %s" % (path, error))
+    print("Indexed %d files (%d unchanged, %d failed, %d removed) in %.2f s with %d worker(s)." % (
+        len(indexed), len(unchanged), len(failed), len(removed), time.perf_counter() - time_start, max(1, workers)))
+    return len(failed)
+
+def run_scan(mode, args, flags, options):
+    #scan (table) and info (one value per line). Returns the number of files with problems.
+    import json
+    paths = _batch_files(args[0]) if (mode == "scan") else args
+    details = mode == "info"
+    workers = int(options.get("--workers", 1))
+    time_start = time.perf_counter()
+    num_files = 0
+    num_problems = 0
+    def fmt(value, fmt_str):
+        return "-" if (value is None) else fmt_str % value
+    if "--json" not in flags and not details:
+        print("%10s  %8s  %4s  %4s  %10s  %10s  %s" % ("file size", "checksum", "era", "comp", "body size", "compressed", "path"))
+    for result in scan_saves(paths, workers):
+        num_files += 1
+        num_problems += len(result.problems) > 0
+        if "--json" in flags:
+            sys.stdout.write(json.dumps(result._asdict()) + "\n") #One json object per line
+        elif details:
+            for name, value in result._asdict().items():
+                if name in ("checksum", "era_format") and value is not None:
+                    value = "0x%08X" % value if (name == "checksum") else "0x%X" % value
+                print("%-24s %s" % (name + ":", value))
+            print("")
+        else:
+            print("%10s  %8s  %4s  %4s  %10s  %10s  %s" % (fmt(result.file_size, "%d"), fmt(result.checksum, "%08X"), fmt(result.era_format, "0x%X"),
+                fmt(result.body_is_compressed, "%d"), fmt(result.body_decompressed_size, "%d"),
+                fmt(result.body_compressed_size if result.body_is_compressed else None, "%d"), result.path))
+            for problem in result.problems:
+                print("    " + problem)
+    if "--json" not in flags and not details:
+        elapsed = time.perf_counter() - time_start
+        print("Scanned %d files (%d with problems) in %.2f s: %.0f files/s" % (num_files, num_problems, elapsed, num_files / max(elapsed, 1e-9)))
+    return num_problems
+
+CLI_MODES = { #mode: (number of path arguments - negative: at least that many, allowed options - options ending with '=' take a value)
+    "extract_raw": (2, []),
+    "extract_json": (2, ["--skip-era", "--keep-inner-json-as-string", "--name32-index=", "--sidecar", "--stream", "--cache=", "--cache-size=", "--profile", "--profile-out="]),
+    "compose_raw": (3, ["--compress", "--compress-level=", "--compress-threads="]),
+    "compose_json": (3, ["--compress", "--stream", "--compress-level=", "--compress-threads=", "--cache=", "--cache-size=", "--skip-era", "--keep-inner-json-as-string", "--profile", "--profile-out="]),
+    "extract_json_batch": (2, ["--skip-era", "--keep-inner-json-as-string", "--name32-index=", "--sidecar", "--stream", "--cache=", "--cache-size=", "--workers="]),
+    "compose_json_batch": (3, ["--compress", "--stream", "--compress-level=", "--compress-threads=", "--cache=", "--cache-size=", "--skip-era", "--keep-inner-json-as-string", "--workers="]),
+    "query": (-1, ["--keep-inner-json-as-string"]),
+    "patch": (-2, ["--in-place"]),
+    "diff": (2, ["--keep-inner-json-as-string", "--json"]),
+    "watch": (2, ["--skip-era", "--keep-inner-json-as-string", "--name32-index=", "--sidecar", "--stream", "--cache=", "--cache-size=", "--workers=", "--interval=", "--debounce=", "--once"]),
+    "index": (2, ["--skip-era", "--keep-inner-json-as-string", "--workers="]),
+    "scan": (1, ["--json", "--workers="]),
+    "info": (-1, ["--json"]),
+}
+
+CLI_NUMBER_OPTIONS = { #option: (type, minimum, maximum or None)
+    "--compress-level": (int, -1, 9),
+    "--compress-threads": (int, 1, None),
+    "--workers": (int, 1, None),
+    "--cache-size": (float, 0, None),
+    "--interval": (float, 0, None),
+    "--debounce": (float, 0, None),
+}
+
+def _option_value_valid(arg_name, arg_value):
+    if arg_name not in CLI_NUMBER_OPTIONS:
+        return True
+    value_type, value_min, value_max = CLI_NUMBER_OPTIONS[arg_name]
+    try:
+        value = value_type(arg_value)
+    except ValueError:
+        return False
+    return value >= value_min and (value_max is None or value <= value_max)
+
+def main(argv):
+    if len(argv) < 2:
+        print("Missing option.")
+        print_usage()
+        return
+    mode = argv[1]
+    if mode not in CLI_MODES:
+        print_usage()
+        return
+    num_args, allowed_flags = CLI_MODES[mode]
+    if num_args < 0: #Options and arguments can be mixed.
+        args = [arg for arg in argv[2:] if not arg.startswith("--")]
+        option_args = [arg for arg in argv[2:] if arg.startswith("--")]
+        num_args = -num_args
+    else:
+        args = argv[2:2+num_args]
+        option_args = argv[2+num_args:]
+    if len(args) < num_args:
+        print("Missing arguments.")
+        print_usage()
+        return
+    flags = set()
+    options = {}
+    for arg in option_args:
+        arg_name, arg_sep, arg_value = arg.partition("=")
+        arg_name = arg_name.lower()
+        if arg_sep == "" and arg_name in allowed_flags:
+            flags.add(arg_name)
+        elif arg_sep != "" and (arg_name + "=") in allowed_flags:
+            if not _option_value_valid(arg_name, arg_value):
+                print("Invalid value for option '%s'" % arg)
+                print_usage()
+                return
+            options[arg_name] = arg_value
+        else:
+            print("Unknown option argument '%s'" % arg)
+            print_usage()
+            return
+
+    if mode == "watch":
+        run_watch(args, flags, options)
+        return
+    if mode == "scan" or mode == "info":
+        if run_scan(mode, args, flags, options) > 0:
+            sys.exit(1)
+        return
+    if mode == "index":
+        if run_index(args, flags, options) > 0:
+            sys.exit(1)
+        return
+    if mode.endswith("_batch"):
+        workers = int(options.get("--workers", os.cpu_count() or 1))
+        if run_batch(mode, args, flags, options, workers) > 0:
+            sys.exit(1)
+        return
+    try:
+        if mode == "query":
+            query_file(args, flags)
+            return
+        if mode == "diff":
+            if diff_file(args, flags) > 0:
+                sys.exit(1)
+            return
+        if mode == "patch":
+            if not patch_file(args, flags):
+                return
+        else:
+            process_file(mode, args, flags, options)
+    except SavegameFormatError as e:
+        print(str(e))
+        return
+    print("Done")
 
-print("Done")
+if __name__ == "__main__":
+    main(sys.argv)
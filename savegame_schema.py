@@ -0,0 +1,272 @@
+import math
+import struct
+import array
+from collections import namedtuple
+
+# Declarative layout of Fledge::Core::SaveGameDesc and Era::SaveGameDesc (see format-docs.md).
+# A field list is compiled once per format version and serializer class into a plan:
+#  consecutive fixed size fields are merged into one precompiled struct.Struct ('Run'),
+#  everything else is handled by a serializer method ('Step').
+
+Field = namedtuple('Field', ['name', 'type', 'min_format', 'max_format'])
+ArrayType = namedtuple('ArrayType', ['element']) #'uint32 len, element[len]'
+RecordType = namedtuple('RecordType', ['fields'])
+BinaryType = namedtuple('BinaryType', ['size']) #Constant size binary
+
+def field(name, type, min_format=None, max_format=None):
+    #min_format: Field present if format >= min_format; max_format: Field present if format < max_format.
+    return Field(name, type, min_format, max_format)
+
+def record(*fields):
+    return RecordType(tuple(fields))
+
+
+def check_nan(val):
+    if math.isnan(val):
+        raise ValueError("float/double is NaN") #There are lots of possible NaN encodings, the json representation wouldn't be precise anymore.
+    return val
+
+#Scalar codecs: decode(values, index) converts the unpacked struct values to the json representation,
+# encode(flat_values, json_value) appends the values to pack.
+ScalarType = namedtuple('ScalarType', ['codes', 'decode', 'encode'])
+
+def _decode_value(vals, i):
+    return vals[i]
+def _encode_value(flat, val):
+    flat.append(val)
+def _decode_bool(vals, i):
+    if vals[i] > 1:
+        raise ValueError("bool representation is not in [0,1]")
+    return vals[i] != 0
+def _encode_bool(flat, val):
+    flat.append(1 if (val == True) else 0)
+def _decode_int64(vals, i):
+    return str(vals[i]) #JSON numbers only fit 53 int bits.
+def _encode_int64(flat, val):
+    flat.append(int(val))
+def _decode_float(vals, i):
+    return check_nan(vals[i])
+def _decode_vec2(vals, i):
+    return [check_nan(vals[i]), check_nan(vals[i+1])]
+def _decode_vec3(vals, i):
+    return [check_nan(vals[i]), check_nan(vals[i+1]), check_nan(vals[i+2])]
+def _decode_vec4(vals, i):
+    return [check_nan(vals[i]), check_nan(vals[i+1]), check_nan(vals[i+2]), check_nan(vals[i+3])]
+def _encode_vec2(flat, val):
+    flat.append(val[0])
+    flat.append(val[1])
+def _encode_vec3(flat, val):
+    flat.append(val[0])
+    flat.append(val[1])
+    flat.append(val[2])
+def _encode_vec4(flat, val):
+    flat.append(val[0])
+    flat.append(val[1])
+    flat.append(val[2])
+    flat.append(val[3])
+def _decode_uvector2(vals, i):
+    return [_decode_vec2(vals, i), _decode_vec2(vals, i+2)]
+def _encode_uvector2(flat, val):
+    _encode_vec2(flat, val[0])
+    _encode_vec2(flat, val[1])
+def _decode_name32(vals, i):
+    return ['0x%08x' % vals[i], vals[i+1], _decode_bool(vals, i+2)]
+def _encode_name32(flat, val):
+    flat.append(int(val[0],0))
+    flat.append(val[1])
+    _encode_bool(flat, val[2])
+
+SCALAR_TYPES = {
+    "int8": ScalarType('b', _decode_value, _encode_value),
+    "uint8": ScalarType('B', _decode_value, _encode_value),
+    "int16": ScalarType('h', _decode_value, _encode_value),
+    "uint16": ScalarType('H', _decode_value, _encode_value),
+    "int32": ScalarType('i', _decode_value, _encode_value),
+    "uint32": ScalarType('I', _decode_value, _encode_value),
+    "int64": ScalarType('q', _decode_int64, _encode_int64),
+    "uint64": ScalarType('Q', _decode_int64, _encode_int64),
+    "bool": ScalarType('I', _decode_bool, _encode_bool), #4 bytes
+    "float": ScalarType('f', _decode_float, _encode_value),
+    "double": ScalarType('d', _decode_float, _encode_value),
+    "Degree": ScalarType('f', _decode_float, _encode_value),
+    "Radian": ScalarType('f', _decode_float, _encode_value),
+    "vec2": ScalarType('ff', _decode_vec2, _encode_vec2),
+    "vec3": ScalarType('fff', _decode_vec3, _encode_vec3),
+    "vec4": ScalarType('ffff', _decode_vec4, _encode_vec4),
+    "Color": ScalarType('ffff', _decode_vec4, _encode_vec4),
+    "Rotate": ScalarType('fff', _decode_vec3, _encode_vec3),
+    "quat": ScalarType('ffff', _decode_vec4, _encode_vec4),
+    "UDim": ScalarType('ff', _decode_vec2, _encode_vec2),
+    "UVector2": ScalarType('ffff', _decode_uvector2, _encode_uvector2),
+    "Name32": ScalarType('III', _decode_name32, _encode_name32),
+}
+#Single scalars as precompiled structs, for serializer methods outside of a plan.
+ScalarCodec = namedtuple('ScalarCodec', ['struct', 'decode', 'encode'])
+SCALAR_CODECS = {typename: ScalarCodec(struct.Struct('>' + scalar.codes), scalar.decode, scalar.encode) for typename, scalar in SCALAR_TYPES.items()}
+
+
+CORE_HEADER_FIELDS = (
+    field("Name32 fieldCore00", "Name32"),
+    field("Name32 fieldCore10", "Name32"),
+    field("string fieldCore20", "string"),
+    field("uint32 fieldCore30_format", "uint32"),
+)
+#Gated by the core body format (fieldCore30).
+CORE_FIELDS = (
+    field("uint8 fieldCore40", "uint8"),
+    field("uint64 fieldCore50", "uint64"),
+    field("uint16 fieldCore60", "uint16", max_format=1),
+    field("bool fieldCore70", "bool"),
+    field("uint32 fieldCore80", "uint32", min_format=2),
+    field("array fieldCore90", ArrayType(record(
+        field("uint64 field00", "uint64"),
+        field("bool field10", "bool")))),
+    field("array fieldCore100", ArrayType(record(
+        field("Name32 field00", "Name32"),
+        field("int32 field10", "int32")))),
+    field("array fieldCore110", ArrayType(record(
+        field("Name32 field00", "Name32"),
+        field("bool field10", "bool")))),
+    field("string fieldCore120_json", "json"),
+)
+#Gated by the Era format (first uint32 of the header).
+ERA_FIELDS = (
+    field("binary[96]-as-base64 fieldEra00", BinaryType(96)),
+    field("array fieldEra10", ArrayType(record(
+        field("uint64 field00", "uint64"),
+        field("uint8 field10", "uint8")))),
+    field("array fieldEra20", ArrayType(record(
+        field("Name32 field00_ui_map_type", "Name32"),
+        #field("uint32[0x10000] field10_image", ...)
+        field("uint32[0x10000]-as-base64 field10_image", BinaryType(4*0x10000))))),
+    field("Name32 fieldEra30_ui_map_type", "Name32"),
+    field("vec3 fieldEra40_pos", "vec3"),
+    field("float fieldEra50", "float"),
+    field("bool fieldEra60", "bool"),
+    field("bool fieldEra70", "bool"),
+    field("bool fieldEra80", "bool"),
+    field("bool fieldEra90", "bool"),
+    field("bool fieldEra100", "bool"),
+    field("bool fieldEra110", "bool", min_format=0x27),
+    field("bool fieldEra120", "bool", min_format=0x28),
+    field("bool fieldEra130", "bool", min_format=0x28),
+    field("bool fieldEra140", "bool", min_format=0x28),
+    field("bool fieldEra150", "bool", min_format=0x28),
+    field("bool fieldEra160", "bool"),
+    field("bool fieldEra170", "bool"),
+    field("uint8 fieldEra180", "uint8"),
+    field("bool fieldEra190", "bool"),
+    field("uint8 fieldEra200", "uint8"),
+    field("bool fieldEra210", "bool"),
+    field("uint8 fieldEra220", "uint8"),
+    field("int32 fieldEra230", "int32", min_format=0x26),
+    field("uint32 fieldEra240", "int32", max_format=0x29),
+    field("uint32[] fieldEra250", ArrayType("uint32")),
+    field("uint32[] fieldEra260", ArrayType("uint32")),
+    field("Name32[] fieldEra270_buffs", ArrayType("Name32"), min_format=0x18),
+    field("binary-as-base64 fieldEra280", "binaryarray"),
+    field("Name32[] fieldEra290_npc_voices", ArrayType("Name32"), min_format=0x1B),
+    field("uint32 fieldEra300_mapdata_1", "uint32", min_format=0x25),
+    field("array fieldEra310_mapdata_2", ArrayType(record(
+        field("uint8 field00", "uint8"),
+        field("uint8 field10", "uint8"),
+        field("Variant field20", "Variant"),
+        field("Variant field30", "Variant"),
+        field("Variant field40", "Variant"),
+        field("vec3 field50", "vec3"))), min_format=0x25),
+)
+#Variant payloads with a record layout.
+CURVE_ELEMENT = record( #Curve array element size: 28 bytes
+    field("float a", "float"),
+    field("vec2 b", "vec2"),
+    field("vec2 c", "vec2"),
+    field("vec2 d", "vec2"))
+VARIANT_DICTIONARY_ELEMENT = record(
+    field("string key", "string"),
+    field("Variant value", "Variant"))
+
+#Serializer method names for the variable size types.
+DYNAMIC_TYPE_METHODS = {
+    "string": "_serdes_string",
+    "json": "_serdes_json",
+    "Variant": "_serdes_variant",
+    "binaryarray": "_serdes_binaryarray_aligned",
+}
+
+
+RunField = namedtuple('RunField', ['name', 'short', 'index', 'decode', 'encode'])
+Run = namedtuple('Run', ['struct', 'fields']) #Fixed size fields read/written with a single (un)pack
+Step = namedtuple('Step', ['name', 'short', 'fn', 'args']) #Variable size field: fn(serdes, *args, deser_in)
+#Compiled array element. fixed: Run if all of the element is fixed size, steps: plan otherwise.
+# record: Element is a dict of fields (otherwise the single value of fixed.fields[0] / steps[0]).
+# typecode: array.array typecode if the element is a single number whose json value is the unpacked value
+#  (the whole array is (un)packed at once and can stay an array.array), otherwise None.
+ArrayElement = namedtuple('ArrayElement', ['fixed', 'steps', 'record', 'typecode'])
+
+def field_enabled(fld, fmt):
+    return (fld.min_format is None or fmt >= fld.min_format) and (fld.max_format is None or fmt < fld.max_format)
+
+def _compile_dynamic(cls, fldtype):
+    if isinstance(fldtype, ArrayType):
+        return cls._serdes_array, (compile_element(cls, fldtype.element),)
+    if isinstance(fldtype, BinaryType):
+        return cls._serdes_constantsize_binary, (fldtype.size,)
+    if fldtype in DYNAMIC_TYPE_METHODS:
+        return getattr(cls, DYNAMIC_TYPE_METHODS[fldtype]), ()
+    raise ValueError("Unknown field type %s" % str(fldtype))
+
+def _compile_steps(cls, fields):
+    steps = []
+    run_fields = []
+    run_codes = ''
+    for fld in fields:
+        short = None if (fld.name is None) else cls._fieldname_short(fld.name)
+        if isinstance(fld.type, str) and fld.type in SCALAR_TYPES:
+            scalar = SCALAR_TYPES[fld.type]
+            run_fields.append(RunField(fld.name, short, len(run_codes), scalar.decode, scalar.encode))
+            run_codes += scalar.codes
+            continue
+        if len(run_fields) > 0:
+            steps.append(Run(struct.Struct('>' + run_codes), tuple(run_fields)))
+            run_fields = []
+            run_codes = ''
+        fn, args = _compile_dynamic(cls, fld.type)
+        steps.append(Step(fld.name, short, fn, args))
+    if len(run_fields) > 0:
+        steps.append(Run(struct.Struct('>' + run_codes), tuple(run_fields)))
+    return tuple(steps)
+
+def compile_element(cls, elemtype):
+    if isinstance(elemtype, RecordType):
+        steps = _compile_steps(cls, elemtype.fields)
+        is_record = True
+    else:
+        steps = _compile_steps(cls, [Field(None, elemtype, None, None)])
+        is_record = False
+    fixed = steps[0] if (len(steps) == 1 and isinstance(steps[0], Run)) else None
+    typecode = None
+    if fixed is not None and not is_record and fixed.fields[0].decode in (_decode_value, _decode_float):
+        code = fixed.struct.format.lstrip('>')
+        if array.array(code).itemsize == fixed.struct.size:
+            typecode = code
+    return ArrayElement(fixed, steps, is_record, typecode)
+
+_element_cache = {}
+def compile_element_cached(cls, elemtype):
+    #compile_element, cached per serializer class and type (e.g. for repeated lookups of the same field).
+    key = (cls, id(elemtype))
+    cached = _element_cache.get(key)
+    if cached is None:
+        cached = (elemtype, compile_element(cls, elemtype)) #Keeps elemtype alive, so its id stays unique.
+        _element_cache[key] = cached
+    return cached[1]
+
+_plan_cache = {}
+def compile_fields(cls, fields, fmt=0):
+    #Compiled plan of the fields enabled for format fmt, cached per serializer class.
+    key = (cls, id(fields), fmt)
+    cached = _plan_cache.get(key)
+    if cached is None:
+        cached = (fields, _compile_steps(cls, [fld for fld in fields if field_enabled(fld, fmt)])) #Keeps fields alive, so its id stays unique.
+        _plan_cache[key] = cached
+    return cached[1]
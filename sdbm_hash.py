@@ -0,0 +1,183 @@
+import operator
+import os
+import sys
+import time
+
+# 'sdbm' hash (http://www.cse.yorku.ca/~oz/hash.html#sdbm), as used for the savegame body checksum and for Name32 values.
+# The hash is linear: sdbm(a+b) == sdbm(a) * 0x1003F^len(b) + sdbm(b) (mod 2^32).
+# This allows hashing fixed-size blocks independently (as a dot product with precomputed powers of 0x1003F)
+#  and combining the block results afterwards, optionally spread over several processes.
+
+SDBM_MULTIPLIER = 0x1003F
+SDBM_MASK = 0xFFFFFFFF
+SDBM_BLOCK_SIZE = 0x10000
+
+_np = None #numpy module (optional, only used to speed up the dot products), imported on first use by _get_np
+_np_checked = False
+
+_block_weights = None
+_block_weights_np = None
+_block_power = pow(SDBM_MULTIPLIER, SDBM_BLOCK_SIZE, 1 << 32)
+
+def _get_block_weights():
+    #_block_weights[i] = 0x1003F^(SDBM_BLOCK_SIZE-1-i) mod 2^32, i.e. the weight of byte i in a full block.
+    global _block_weights
+    if _block_weights is None:
+        weights = [0] * SDBM_BLOCK_SIZE
+        cur = 1
+        for i in range(SDBM_BLOCK_SIZE - 1, -1, -1):
+            weights[i] = cur
+            cur = (cur * SDBM_MULTIPLIER) & SDBM_MASK
+        _block_weights = weights
+    return _block_weights
+
+def _get_np():
+    #numpy, or None if it is not installed.
+    global _np, _np_checked
+    if not _np_checked:
+        try:
+            import numpy as _np
+        except ImportError:
+            _np = None
+        _np_checked = True
+    return _np
+
+def _get_block_weights_np():
+    global _block_weights_np
+    if _block_weights_np is None:
+        np = _get_np()
+        _block_weights_np = np.array(_get_block_weights(), dtype=np.uint64)
+    return _block_weights_np
+
+def sdbm_reference(data, seed=0):
+    # Matches 'sdbm' (http://www.cse.yorku.ca/~oz/hash.html#sdbm)
+    sum = seed
+    for i in range(len(data)):
+        sum = ((sum*0x1003F)&0xFFFFFFFF) + data[i]
+        sum = sum&0xFFFFFFFF
+    return sum
+
+def sdbm_power(length):
+    return pow(SDBM_MULTIPLIER, length, 1 << 32)
+
+def sdbm_combine(hash_front, hash_back, len_back):
+    #Hash of the concatenation front+back, given the separate hashes and the length of back.
+    return (hash_front * sdbm_power(len_back) + hash_back) & SDBM_MASK
+
+def sdbm_replace(hash_in, data_len, offs, data_old, data_new):
+    #Hash of the data after replacing data_old at offs with data_new of the same length, given the hash and length of the data before.
+    # Only depends on the changed bytes: Byte i contributes byte * 0x1003F^(data_len-1-i).
+    if len(data_old) != len(data_new):
+        raise ValueError("sdbm_replace needs data of the same length")
+    return (hash_in + (sdbm(data_new) - sdbm(data_old)) * sdbm_power(data_len - offs - len(data_new))) & SDBM_MASK
+
+def _sdbm_block(block, weights):
+    #Hash of a single block with len(block) <= SDBM_BLOCK_SIZE (with seed 0).
+    if len(block) != SDBM_BLOCK_SIZE:
+        weights = weights[SDBM_BLOCK_SIZE - len(block):]
+    return sum(map(operator.mul, block, weights)) & SDBM_MASK
+
+def _sdbm_block_np(block, weights):
+    if len(block) != SDBM_BLOCK_SIZE:
+        weights = weights[SDBM_BLOCK_SIZE - len(block):]
+    #uint64 arithmetic wraps around mod 2^64, which keeps the result exact mod 2^32.
+    return int(_np.dot(_np.frombuffer(block, dtype=_np.uint8).astype(_np.uint64), weights)) & SDBM_MASK
+
+def sdbm_update(state, data):
+    #Continues the hash 'state' (result of a previous sdbm/sdbm_update call, or 0) over data.
+    data_len = len(data)
+    if data_len < 64:
+        return sdbm_reference(data, state) #Not worth the block setup (e.g. short Name32 strings).
+    data = memoryview(data).cast('B')
+    if _get_np() is not None:
+        block_fn, weights = _sdbm_block_np, _get_block_weights_np()
+    else:
+        block_fn, weights = _sdbm_block, _get_block_weights()
+    offs = 0
+    full_end = data_len - (data_len % SDBM_BLOCK_SIZE)
+    while offs < full_end:
+        state = (state * _block_power + block_fn(data[offs:offs+SDBM_BLOCK_SIZE], weights)) & SDBM_MASK
+        offs += SDBM_BLOCK_SIZE
+    if offs < data_len:
+        state = sdbm_combine(state, block_fn(data[offs:], weights), data_len - offs)
+    return state
+
+def sdbm_many(items):
+    #Hashes of many short byte strings (e.g. Name32 strings), about twice as fast as separate sdbm calls.
+    weights_rev = _get_block_weights()[:-257:-1] #0x1003F^i for i in 0..255
+    ret = []
+    for item in items:
+        if len(item) <= len(weights_rev):
+            ret.append(sum(map(operator.mul, item[::-1], weights_rev)) & SDBM_MASK)
+        else:
+            ret.append(sdbm(item))
+    return ret
+
+def sdbm(data, workers=1):
+    if workers > 1 and len(data) >= 4 * SDBM_BLOCK_SIZE:
+        return sdbm_parallel(data, workers)
+    return sdbm_update(0, data)
+
+def _sdbm_shared(name, offs, length):
+    #Runs in a worker process: Hashes a slice of the shared memory block created by sdbm_parallel.
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return sdbm(shm.buf[offs:offs+length])
+    finally:
+        shm.close()
+
+def sdbm_parallel(data, workers, executor=None):
+    #Splits data into one slice per worker, hashes the slices in separate processes and combines the results.
+    # The data is copied once into shared memory, and the workers only get the offsets of their slices (instead of a pickled copy each).
+    # An existing concurrent.futures executor can be passed in to avoid the pool startup cost on every call.
+    import concurrent.futures
+    from multiprocessing import shared_memory
+    data = memoryview(data).cast('B')
+    data_len = len(data)
+    slice_len = -(-data_len // workers)
+    slice_len = max(SDBM_BLOCK_SIZE, -(-slice_len // SDBM_BLOCK_SIZE) * SDBM_BLOCK_SIZE)
+    offsets = list(range(0, data_len, slice_len))
+    lengths = [min(slice_len, data_len - offs) for offs in offsets]
+    shm = shared_memory.SharedMemory(create=True, size=max(data_len, 1))
+    try:
+        shm.buf[:data_len] = data
+        names = [shm.name] * len(offsets)
+        if executor is None:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                slice_hashes = list(executor.map(_sdbm_shared, names, offsets, lengths))
+        else:
+            slice_hashes = list(executor.map(_sdbm_shared, names, offsets, lengths))
+    finally:
+        shm.close()
+        shm.unlink()
+    ret = 0
+    for slice_len, slice_hash in zip(lengths, slice_hashes):
+        ret = sdbm_combine(ret, slice_hash, slice_len)
+    return ret
+
+def _benchmark(size_mib, workers):
+    data = os.urandom(int(size_mib * 0x100000))
+    ref_len = min(len(data), 0x100000) #The reference loop is too slow for the full size.
+    print("sdbm throughput, %.1f MiB of random data (numpy %s):" % (len(data) / 0x100000, "available" if _get_np() is not None else "not available"))
+    def run(name, fn, length):
+        run_data = data[:length]
+        time_start = time.perf_counter()
+        ret = fn(run_data)
+        elapsed = time.perf_counter() - time_start
+        print(" %-24s %08X  %8.2f MiB/s" % (name, ret, (length / 0x100000) / max(elapsed, 1e-9)))
+        return ret
+    ref_hash = run("reference loop", sdbm_reference, ref_len)
+    if run("block", sdbm, ref_len) != ref_hash:
+        raise ValueError("block hash does not match the reference")
+    block_hash = run("block (full size)", sdbm, len(data)) if ref_len != len(data) else ref_hash
+    if workers > 1 and run("parallel (%d workers)" % workers, lambda d: sdbm_parallel(d, workers), len(data)) != block_hash:
+        raise ValueError("parallel hash does not match the block hash")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 or (len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help")):
+        print("Usage: ")
+        print("sdbm_hash [<size in MiB> [<workers>]]")
+        print(" -> Benchmarks the block hash (and parallel hash, if workers > 1) against the reference loop.")
+        exit()
+    _benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 16, int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1))
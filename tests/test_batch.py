@@ -0,0 +1,39 @@
+import io
+import os
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _write_saves(sav_dir):
+    sav_dir.mkdir()
+    for era_format in (0x18, 0x29):
+        with contextlib.redirect_stdout(io.StringIO()):
+            header, body, sav_data = savegame_benchmark.generate_save(era_format, 2, images=1, array_len=5, map_entries=10)
+        (sav_dir / ("e%02x.sav" % era_format)).write_bytes(sav_data)
+    (sav_dir / "broken.sav").write_bytes(b"not a save")
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_compose_batch(tmp_path, workers):
+    sav_dir, json_dir, out_dir = tmp_path / "saves", tmp_path / "json", tmp_path / "out"
+    _write_saves(sav_dir)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        failed = savegame_body.run_batch("extract_json_batch", [str(sav_dir), str(json_dir)], set(), {}, workers)
+    assert failed == 1
+    assert "FAILED %s" % str(sav_dir / "broken.sav") in log.getvalue()
+    assert sorted(os.listdir(str(json_dir))) == ["e18.json", "e29.json"]
+    os.remove(str(sav_dir / "broken.sav"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        failed = savegame_body.run_batch("compose_json_batch", [str(sav_dir), str(json_dir), str(out_dir)], {"--compress"}, {}, workers)
+    assert failed == 0
+    for name in ("e18", "e29"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert savegame_body.load_save(str(out_dir / (name + ".sav"))) == savegame_body.load_save(str(sav_dir / (name + ".sav")))
+
+def test_output_is_input(tmp_path):
+    sav_dir = tmp_path / "saves"
+    _write_saves(sav_dir)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        failed = savegame_body.run_batch("compose_json_batch", [str(sav_dir), str(sav_dir), str(sav_dir)], set(), {}, 1)
+    assert failed > 0
+    assert "cannot contain the input files" in log.getvalue()
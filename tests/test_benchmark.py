@@ -0,0 +1,51 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+SMALL = {"images": 1, "depth": 2, "array_len": 3, "map_entries": 4}
+
+@pytest.mark.parametrize("era_format", savegame_benchmark.ERA_FORMATS)
+@pytest.mark.parametrize("body_format", savegame_benchmark.BODY_FORMATS)
+def test_generate_save(era_format, body_format):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era_format, body_format, **SMALL)
+        body_obj = savegame_body.extract(header, body)
+        assert savegame_body.read_savegame(sav_data) == (header, body)
+    assert body_obj["uint32 fieldCore30_format"] == body_format
+    assert savegame_body.compose_body(header, json.loads(json.dumps(body_obj))) == body
+
+def test_generate_save_seed():
+    with contextlib.redirect_stdout(io.StringIO()):
+        saves = [savegame_benchmark.generate_save(0x29, 2, seed=seed, **SMALL)[2] for seed in (1, 1, 2)]
+    assert saves[0] == saves[1] and saves[0] != saves[2]
+
+def test_run_benchmark():
+    results = savegame_benchmark.run_benchmark([0x29], [2], repeat=1, measure_memory=False, compress_threads=2, **SMALL)
+    assert set(results.keys()) == set(savegame_benchmark.BENCHMARK_OPS)
+    assert all(result["mb"] > 0 and result["seconds"] > 0 and result["peak_alloc_mib"] is None for result in results.values())
+
+def test_compare_baseline():
+    results = {"extract_json": {"mb_per_s": 80.0}, "compose_json": {"mb_per_s": 100.0}, "checksum": {"mb_per_s": 1.0}}
+    baseline = {"results": {"extract_json": {"mb_per_s": 100.0}, "compose_json": {"mb_per_s": 100.0}}}
+    assert savegame_benchmark.compare_baseline(results, baseline, 0.1) == ["extract_json"]
+    assert savegame_benchmark.compare_baseline(results, baseline, 0.25) == []
+
+def test_baseline_cli(tmp_path):
+    args = ["savegame_benchmark", "--era-formats=0x29", "--body-formats=2", "--images=1", "--array-len=3", "--map-entries=4", "--repeat=1", "--no-memory"]
+    baseline_path = str(tmp_path / "baseline.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert savegame_benchmark.main(args + ["--save-baseline=" + baseline_path]) == 0
+        baseline = json.loads((tmp_path / "baseline.json").read_text())
+        for result in baseline["results"].values():
+            result["mb_per_s"] *= 1000
+        (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+        assert savegame_benchmark.main(args + ["--baseline=" + baseline_path]) == 1
+        assert savegame_benchmark.main(args + ["--unknown"]) == 2
+
+def test_write_saves(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert savegame_benchmark.main(["savegame_benchmark", "--era-formats=0x18,0x29", "--body-formats=0", "--write-saves=" + str(tmp_path)]) == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["e18_b0.sav", "e29_b0.sav"]
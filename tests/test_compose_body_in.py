@@ -0,0 +1,37 @@
+import io
+import json
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+    return header, body
+
+def _compose_with_body_in(header, body, body_obj, sidecar=None):
+    serdes = savegame_body.EraSerdes(header, body)
+    serdes.sidecar = sidecar
+    serdes.serdes_body(body_obj)
+    return serdes.body_out
+
+def test_compose_body_in():
+    #Composing along the original body (skipping unchanged subtrees) gives the same as composing from scratch.
+    header, body = _generate()
+    body_obj = json.loads(json.dumps(savegame_body.extract(header, body)))
+    assert _compose_with_body_in(header, body, body_obj) == body
+    mapdata = body_obj["array fieldEra310_mapdata_2"]
+    mapdata[1]["Variant field20"] = {"uint32": 7}
+    del mapdata[3]
+    mapdata.append(mapdata[0])
+    body_obj["Name32[] fieldEra270_buffs"].pop(0)
+    body_new = savegame_body.compose_body(header, body_obj)
+    assert body_new != body
+    assert _compose_with_body_in(header, body, body_obj) == body_new
+
+def test_compose_body_in_sidecar(tmp_path):
+    header, body = _generate()
+    with savegame_body.SidecarWriter(str(tmp_path / "a.bin")) as sidecar:
+        body_obj = savegame_body.extract(header, body, sidecar=sidecar)
+    with savegame_body.SidecarReader(str(tmp_path)) as sidecar:
+        assert _compose_with_body_in(header, body, body_obj, sidecar) == body
@@ -0,0 +1,46 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate(era_format=0x29, body_format=2):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era_format, body_format, images=1, array_len=5, map_entries=10)
+    return header, body
+
+def _compose_all(header, body_obj, body_orig):
+    #Without the original, with the original parsed, and with the original values given.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return (savegame_body.compose_body(header, body_obj), savegame_body.compose_body(header, body_obj, body_orig=body_orig),
+            savegame_body.compose_body(header, body_obj, body_orig=body_orig, orig_obj=savegame_body.extract(header, body_orig)))
+
+@pytest.mark.parametrize("era_format,body_format", [(0x18, 0), (0x20, 1), (0x29, 2)])
+def test_unchanged(era_format, body_format):
+    header, body = _generate(era_format, body_format)
+    body_obj = json.loads(json.dumps(savegame_body.extract(header, body)))
+    assert _compose_all(header, body_obj, body) == (body, body, body)
+
+def test_edits():
+    #Changed fields are encoded, including changes that compare equal with == (1 vs 1.0, 0.0 vs -0.0).
+    header, body = _generate()
+    body_obj = json.loads(json.dumps(savegame_body.extract(header, body)))
+    body_obj["bool fieldEra60"] = not body_obj["bool fieldEra60"]
+    body_obj["Name32[] fieldEra270_buffs"].pop()
+    body_obj["vec3 fieldEra40_pos"] = [-0.0, 1.0, float(int(body_obj["vec3 fieldEra40_pos"][2]))]
+    body_full, body_parsed, body_given = _compose_all(header, body_obj, body)
+    assert body_full != body
+    assert body_parsed == body_full and body_given == body_full
+
+def test_inner_json():
+    #An inner json string that is not compact parses to the same value, but a full encode writes it compact.
+    header, body = _generate()
+    with contextlib.redirect_stdout(io.StringIO()):
+        body_obj = savegame_body.extract(header, body, keep_inner_json_as_string=True)
+        body_obj["string fieldCore120_json"] = json.dumps(json.loads(body_obj["string fieldCore120_json"]), indent=1)
+        body_pretty = savegame_body.compose_body(header, body_obj)
+        body_obj = savegame_body.extract(header, body_pretty)
+    body_full, body_parsed, body_given = _compose_all(header, body_obj, body_pretty)
+    assert body_full != body_pretty
+    assert body_parsed == body_full and body_given == body_full
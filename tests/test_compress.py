@@ -0,0 +1,38 @@
+import io
+import zlib
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_compress(threads):
+    header, body, sav_data = _generate()
+    for level in (-1, 1, 9):
+        sav_data = savegame_body.compose(header, body, compress=True, compress_level=level, compress_threads=threads)
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            assert savegame_body.load_save(sav_data) == (header, body)
+        assert log.getvalue() == ""
+
+@pytest.mark.parametrize("block_size", [0x8000, 0x10000, 100000])
+def test_compress_blocks(block_size):
+    #Blocks smaller than the body, so the parallel path is used.
+    header, body, sav_data = _generate()
+    for level in (-1, 0, 9):
+        body_compressed = savegame_body.compress_body(body, level, threads=4, block_size=block_size)
+        assert zlib.decompress(body_compressed, wbits=15) == body
+
+def test_compress_single_thread_matches_zlib():
+    header, body, sav_data = _generate()
+    assert savegame_body.compress_body(body) == zlib.compress(body)
+
+@pytest.mark.parametrize("option", ["--compress-level=10", "--compress-level=x", "--compress-threads=0", "--workers=0"])
+def test_invalid_option_values(option, tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        savegame_body.main(["savegame_body.py", "compose_json_batch", str(tmp_path), str(tmp_path), str(tmp_path / "out"), option])
+    assert log.getvalue().startswith("Invalid value for option '%s'" % option)
+    assert not (tmp_path / "out").exists()
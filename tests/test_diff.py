@@ -0,0 +1,69 @@
+import io
+import json
+import base64
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate(era=0x29):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(era, 2, compress=False, images=1, array_len=5, map_entries=10)
+
+def _changed(header, body, changes):
+    body_obj = savegame_body.extract(header, body)
+    changes(body_obj)
+    return savegame_body.compose_body(header, body_obj)
+
+def test_diff_same():
+    header, body, sav_data = _generate()
+    assert savegame_body.diff_saves(header, body, header, bytes(body)) == []
+
+def test_diff_changed_values():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    def changes(body_obj):
+        body_obj["bool fieldEra60"] = not body_obj["bool fieldEra60"]
+        body_obj["string fieldCore20"] = "a longer string than before"
+        body_obj["uint32[] fieldEra250"].append(7)
+        del body_obj["Name32[] fieldEra270_buffs"][-1]
+    body_b = _changed(header, body, changes)
+    diff = {change.path: change for change in savegame_body.diff_saves(header, body, header, body_b)}
+    assert set(diff.keys()) == {("bool fieldEra60",), ("string fieldCore20",), ("uint32[] fieldEra250", "5"), ("Name32[] fieldEra270_buffs", "4")}
+    assert diff[("bool fieldEra60",)] == savegame_body.BodyChange(("bool fieldEra60",), "changed", body_obj["bool fieldEra60"], not body_obj["bool fieldEra60"], None)
+    assert diff[("string fieldCore20",)].new == "a longer string than before"
+    assert diff[("uint32[] fieldEra250", "5")][1:4] == ("added", None, 7)
+    assert diff[("Name32[] fieldEra270_buffs", "4")][1:4] == ("removed", body_obj["Name32[] fieldEra270_buffs"][4], None)
+
+def test_diff_binary_ranges():
+    header, body, sav_data = _generate()
+    def changes(body_obj):
+        data = bytearray(base64.b64decode(body_obj["binary[96]-as-base64 fieldEra00"]))
+        data[40] ^= 0xFF
+        data[44:52] = bytes(b ^ 0xFF for b in data[44:52])
+        body_obj["binary[96]-as-base64 fieldEra00"] = base64.b64encode(data).decode('utf8')
+    changes = savegame_body.diff_saves(header, body, header, _changed(header, body, changes))
+    assert changes == [savegame_body.BodyChange(("binary[96]-as-base64 fieldEra00",), "binary", 96, 96, [(10, 13)])]
+
+def test_diff_binary():
+    assert savegame_body.diff_binary(b"\0" * 32, b"\0" * 32) == []
+    assert savegame_body.diff_binary(b"\0" * 32, b"\0" * 4 + b"\1" + b"\0" * 23 + b"\1", block_size=8) == [(1, 2), (7, 8)]
+    assert savegame_body.diff_binary(b"\0" * 10, b"\0" * 20) == [(2, 5)] #The longer tail counts as changed.
+
+def test_diff_added_removed_fields():
+    header_a, body_a, sav_a = _generate(0x29)
+    header_b, body_b, sav_b = _generate(0x28)
+    added = [change for change in savegame_body.diff_saves(header_a, body_a, header_b, body_b) if change.kind in ("added", "removed")]
+    removed = [change for change in savegame_body.diff_saves(header_b, body_b, header_a, body_a) if change.kind in ("added", "removed")]
+    assert [(change.path, change.kind) for change in added] == [(("uint32 fieldEra240",), "added")]
+    assert [(change.path, change.kind) for change in removed] == [(("uint32 fieldEra240",), "removed")]
+    assert added[0].new == removed[0].old
+
+def test_diff_file(tmp_path):
+    header, body, sav_data = _generate()
+    (tmp_path / "a.sav").write_bytes(sav_data)
+    flag = savegame_body.LazySave(header, body).get("fieldEra60")
+    with contextlib.redirect_stdout(io.StringIO()):
+        savegame_body.patch_file([str(tmp_path / "a.sav"), str(tmp_path / "b.sav"), "fieldEra60=%s" % ("false" if flag else "true")], set())
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.diff_file([str(tmp_path / "a.sav"), str(tmp_path / "b.sav")], set()) == 1
+    assert log.getvalue() == "bool fieldEra60: %s -> %s\n1 difference(s).\n" % (json.dumps(flag), json.dumps(not flag))
@@ -0,0 +1,35 @@
+import io
+import mmap
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+    return header, body, sav_data
+
+def test_extract_only_matches_copying_parse():
+    header, body, sav_data = _generate()
+    serdes = savegame_body.EraSerdes(header, body)
+    expected = serdes.serdes_body(None)
+    assert serdes.body_out == body #The copying parse also re-emits the body.
+    serdes = savegame_body.EraSerdes(header, memoryview(body), extract_only=True)
+    assert serdes.serdes_body(None) == expected
+    assert serdes.body_out is None
+    for body_in in (bytes(body), bytearray(body), memoryview(body)):
+        assert savegame_body.extract(header, body_in) == expected
+
+def test_extract_from_mmap(tmp_path):
+    #The body of an uncompressed save can be parsed in place, e.g. from a memory-mapped file.
+    header, body, sav_data = _generate()
+    path = tmp_path / "a.sav"
+    path.write_bytes(sav_data)
+    with open(str(path), 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                body_view = view[len(sav_data) - len(body):]
+                try:
+                    assert savegame_body.extract(header, body_view) == savegame_body.extract(header, body)
+                finally:
+                    body_view.release()
@@ -0,0 +1,66 @@
+import io
+import os
+import sqlite3
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate(tmp_path, name="a.sav", era=0x29):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era, 2, images=1, array_len=5, map_entries=10)
+    (tmp_path / name).write_bytes(sav_data)
+    return header, body, str(tmp_path / name)
+
+def _query(db_path, sql, *params):
+    db = sqlite3.connect(db_path)
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+def test_index_rows(tmp_path):
+    header, body, path = _generate(tmp_path)
+    db_path = str(tmp_path / "index.db")
+    assert savegame_body.index_saves(db_path, [path]) == ([path], [], {}, [])
+    body_obj = savegame_body.extract(header, body)
+    assert _query(db_path, "SELECT body_size FROM saves WHERE path = ?", path) == [(len(body),)]
+    assert _query(db_path, "SELECT value FROM fields WHERE path = 'string fieldCore20'") == [(body_obj["string fieldCore20"],)]
+    assert _query(db_path, "SELECT value FROM fields WHERE path = 'vec3 fieldEra40_pos/2'") == [(body_obj["vec3 fieldEra40_pos"][2],)]
+    values = _query(db_path, "SELECT path, value FROM fields WHERE field = 'uint32[] fieldEra250/*' ORDER BY path")
+    assert [value for path, value in values] == body_obj["uint32[] fieldEra250"]
+    assert _query(db_path, "SELECT COUNT(*) FROM fields WHERE path LIKE 'binary%'") == [(0,)] #Binary fields are left out.
+
+def test_index_integer_types(tmp_path):
+    header, body, path = _generate(tmp_path)
+    db_path = str(tmp_path / "index.db")
+    savegame_body.index_saves(db_path, [path])
+    body_obj = savegame_body.extract(header, body)
+    name32 = _query(db_path, "SELECT value, typeof(value) FROM fields WHERE path = 'Name32 fieldCore00/0'")
+    assert name32 == [(int(body_obj["Name32 fieldCore00"][0], 16), "integer")]
+    uint64 = _query(db_path, "SELECT value FROM fields WHERE path = 'uint64 fieldCore50'")[0][0]
+    assert str(uint64) == body_obj["uint64 fieldCore50"]
+    assert isinstance(uint64, int) == (int(body_obj["uint64 fieldCore50"]) < (1 << 63)) #Beyond int64: TEXT.
+    assert savegame_body._index_value("18446744073709551615", "uint64") == "18446744073709551615"
+    assert savegame_body._index_value("0x0000ffff", "Name32 hash") == 0xffff
+
+def test_index_unchanged_removed_failed(tmp_path):
+    paths = [_generate(tmp_path, name, era)[2] for name, era in (("a.sav", 0x29), ("b.sav", 0x28))]
+    db_path = str(tmp_path / "index.db")
+    assert sorted(savegame_body.index_saves(db_path, paths)[0]) == sorted(paths)
+    assert savegame_body.index_saves(db_path, paths) == ([], paths, {}, [])
+    assert savegame_body.index_saves(db_path, paths, skip_era=True)[0] == paths #Other extract options: Indexed again.
+    os.remove(paths[1])
+    (tmp_path / "c.sav").write_bytes(b"not a save")
+    indexed, unchanged, failed, removed = savegame_body.index_saves(db_path, [paths[0], str(tmp_path / "c.sav")], skip_era=True)
+    assert (indexed, unchanged, list(failed.keys()), removed) == ([], [paths[0]], [str(tmp_path / "c.sav")], [paths[1]])
+    assert "SavegameFormatError" in failed[str(tmp_path / "c.sav")]
+    assert _query(db_path, "SELECT path FROM saves") == [(paths[0],)]
+    assert _query(db_path, "SELECT DISTINCT save FROM fields") == [(paths[0],)]
+
+def test_index_cli(tmp_path):
+    header, body, path = _generate(tmp_path)
+    db_path = str(tmp_path / "index.db")
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        savegame_body.main(["savegame_body", "index", str(tmp_path), db_path, "--workers=1"])
+    assert log.getvalue().startswith("Indexed 1 files (0 unchanged, 0 failed, 0 removed)")
+    assert _query(db_path, "SELECT path FROM saves") == [(path,)]
@@ -0,0 +1,50 @@
+import io
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+@pytest.fixture(scope="module")
+def save():
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+    return header, body, savegame_body.extract(header, body)
+
+def test_fields_match_extract(save):
+    header, body, body_obj = save
+    lazy = savegame_body.LazySave(header, body)
+    assert lazy.fields() == list(body_obj.keys())
+    for name, value in body_obj.items():
+        assert lazy.get(name.split(' ')[-1]) == value
+
+def test_lookup_before_index(save):
+    #Without an index, fields are found by walking the body only as far as needed.
+    header, body, body_obj = save
+    lazy = savegame_body.LazySave(header, body)
+    assert lazy.get("fieldCore30_format") == 2
+    assert lazy._index is None
+    assert lazy.get("fieldCore20") == body_obj["string fieldCore20"]
+
+def test_nested_paths(save):
+    header, body, body_obj = save
+    lazy = savegame_body.LazySave(header, body)
+    mapdata = body_obj["array fieldEra310_mapdata_2"]
+    assert lazy.get("fieldEra310_mapdata_2/3") == mapdata[3]
+    assert lazy.get("fieldEra310_mapdata_2/-1/field50") == mapdata[-1]["vec3 field50"]
+    assert lazy.get("fieldEra310_mapdata_2/2/field50/1") == mapdata[2]["vec3 field50"][1]
+    assert lazy.get("fieldEra270_buffs/0") == body_obj["Name32[] fieldEra270_buffs"][0]
+    with pytest.raises(ValueError):
+        lazy.get("fieldEra310_mapdata_2/1000")
+    with pytest.raises(ValueError):
+        lazy.get("fieldDoesNotExist")
+
+def test_query_file(save, tmp_path):
+    header, body, body_obj = save
+    path = str(tmp_path / "a.sav")
+    with open(path, 'wb') as fout:
+        fout.write(savegame_body.compose(header, body, compress=True))
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        savegame_body.query_file([path, "fieldCore30_format", "fieldNope"], set())
+    lines = log.getvalue().splitlines()
+    assert lines[0] == "fieldCore30_format = 2"
+    assert lines[1].startswith("fieldNope: Error:")
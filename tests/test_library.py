@@ -0,0 +1,28 @@
+import io
+import os
+import sys
+import subprocess
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def test_import_is_lazy():
+    #Modules only needed by some modes are not imported by 'import savegame_body'.
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, savegame_body; print(' '.join(m for m in ('json', 'base64', 'zlib', 'numpy', 'sqlite3', 'concurrent.futures') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=repo_dir, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == ""
+
+def test_load_extract_compose(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+    path = str(tmp_path / "a.sav")
+    with open(path, 'wb') as fout:
+        fout.write(sav_data)
+    for source in (path, sav_data, io.BytesIO(sav_data)):
+        assert savegame_body.load_save(source) == (header, body)
+    body_obj = savegame_body.extract(header, body)
+    body_obj["bool fieldEra60"] = not body_obj["bool fieldEra60"]
+    header_new, body_new = savegame_body.load_save(savegame_body.compose(header, body_obj, compress=True))
+    assert header_new == header and body_new != body
+    assert savegame_body.extract(header_new, body_new) == body_obj
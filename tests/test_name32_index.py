@@ -0,0 +1,62 @@
+import io
+import json
+import contextlib
+import pytest
+import name32_index
+import savegame_benchmark
+import savegame_body
+from sdbm_hash import sdbm_reference
+
+def test_build_lookup(tmp_path):
+    path = str(tmp_path / "names.idx")
+    names = [b"CharacterState", b"b", b"a", b"", b"b"]
+    assert name32_index.build_name32_index(names, path) == 3
+    with name32_index.Name32Index(path) as index:
+        assert index.count == 3
+        assert index.lookup(sdbm_reference(b"CharacterState")) == ["CharacterState"]
+        assert index.lookup(sdbm_reference(b"a")) == ["a"]
+        assert index.lookup(sdbm_reference(b"c")) == []
+        assert list(index.items()) == sorted((sdbm_reference(name), name) for name in (b"CharacterState", b"a", b"b"))
+
+def test_collisions(tmp_path):
+    path = str(tmp_path / "names.idx")
+    entries = [(5, b"y"), (5, b"x"), (1, b"a"), (9, b"z"), (5, b"x")]
+    assert name32_index.write_name32_index(entries, path) == 4
+    with name32_index.Name32Index(path) as index:
+        assert [index.lookup(namehash) for namehash in (0, 1, 5, 9, 10)] == [[], ["a"], ["x", "y"], ["z"], []]
+
+def test_invalid_file(tmp_path):
+    (tmp_path / "short.idx").write_bytes(b"N32I")
+    (tmp_path / "magic.idx").write_bytes(b"XXXX" + b"\1\0\0\0" + b"\0" * 4)
+    (tmp_path / "count.idx").write_bytes(b"N32I" + b"\1\0\0\0" + b"\5\0\0\0")
+    for name in ("short.idx", "magic.idx", "count.idx"):
+        with pytest.raises(ValueError):
+            name32_index.Name32Index(str(tmp_path / name))
+
+def test_annotate(tmp_path):
+    path = str(tmp_path / "names.idx")
+    name32_index.write_name32_index([(0x1234, b"known")], path)
+    deser = {"Name32 field00": ["0x00001234", 0, False], "Name32 field10": ["0x00004321", 0, False],
+        "array field20": [{"Name32[] field00": [["0x00001234", 0, True]]}], "Variant field30": {"Name32": ["0x00001234", 0, False]}}
+    with name32_index.Name32Index(path) as index:
+        name32_index.annotate_name32(deser, index)
+        name32_index.annotate_name32(deser, index) #Not appended twice.
+    assert deser["Name32 field00"] == ["0x00001234", 0, False, ["known"]]
+    assert deser["Name32 field10"] == ["0x00004321", 0, False]
+    assert deser["array field20"][0]["Name32[] field00"][0] == ["0x00001234", 0, True, ["known"]]
+    assert deser["Variant field30"]["Name32"] == ["0x00001234", 0, False, ["known"]]
+
+def test_extract_compose_annotated(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+    body_obj = savegame_body.extract(header, body)
+    namehash = int(body_obj["Name32 fieldCore00"][0], 16)
+    path = str(tmp_path / "names.idx")
+    name32_index.write_name32_index([(namehash, b"known")], path)
+    with name32_index.Name32Index(path) as index:
+        annotated = savegame_body.extract(header, body, name32_index=index)
+        fout = io.StringIO()
+        savegame_body.extract(header, body, name32_index=index, fout=fout)
+    assert annotated["Name32 fieldCore00"] == body_obj["Name32 fieldCore00"] + [["known"]]
+    assert json.loads(fout.getvalue()) == annotated
+    assert savegame_body.compose_body(header, annotated) == body #Compose ignores the names.
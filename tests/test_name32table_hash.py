@@ -0,0 +1,28 @@
+import name32table_hash
+from sdbm_hash import sdbm_reference
+
+NAMES = [b"CharacterState", b"", b"a", b"0x06d58c3a", b"0x123456789", b"0xnothex", "été".encode('utf8')]
+
+def test_name32hash():
+    assert name32table_hash.name32hash(b"CharacterState") == sdbm_reference(b"CharacterState")
+    assert name32table_hash.name32hash(b"0x06d58c3a") == 0x06d58c3a
+    assert name32table_hash.name32hash(b"0x123456789") == 0x23456789 #Masked to 32 bits.
+    assert name32table_hash.name32hash(b"0xnothex") == sdbm_reference(b"0xnothex")
+    assert name32table_hash.name32hash_many(NAMES) == [name32table_hash.name32hash(name) for name in NAMES]
+
+def test_hash_names_parallel(monkeypatch):
+    monkeypatch.setattr(name32table_hash, "NAME32_HASH_CHUNK", 16)
+    names = NAMES + [b"name_%d" % i for i in range(100)] + [b"0x%x" % (i << 28) for i in range(20)]
+    assert name32table_hash.hash_names(names, workers=2) == [name32table_hash.name32hash(name) for name in names]
+
+def test_write_merge_results(tmp_path):
+    hash_by_name = {}
+    names = [name for name in NAMES if len(name) > 0] + [b"tab\tand\\backslash\n"] #The index leaves out empty names.
+    assert name32table_hash.add_names(hash_by_name, names + names) == len(names)
+    for file_name in ("names.tsv", "names.idx"):
+        path = str(tmp_path / file_name)
+        name32table_hash.write_results(hash_by_name, path)
+        assert name32table_hash.read_results(path) == hash_by_name
+    merged = name32table_hash.read_results(str(tmp_path / "names.tsv"))
+    assert name32table_hash.add_names(merged, [b"a", b"new name"]) == 1
+    assert name32table_hash.find_collisions({b"x": 1, b"y": 1, b"z": 2}) == {1: [b"x", b"y"]}
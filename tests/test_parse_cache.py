@@ -0,0 +1,92 @@
+import io
+import os
+import struct
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate(tmp_path, name="a.sav", era=0x29, compress=True):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era, 2, compress=compress, images=1, array_len=5, map_entries=10)
+    (tmp_path / name).write_bytes(sav_data)
+    return header, body, str(tmp_path / name)
+
+def _load_extract(path, cache, skip_era=False):
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        ret = savegame_body.load_extract(path, skip_era, False, cache)
+    return ret, log.getvalue()
+
+def test_cache_hit(tmp_path):
+    header, body, path = _generate(tmp_path)
+    cache = savegame_body.ParseCache(str(tmp_path / "cache"))
+    (obj, body_size), log = _load_extract(path, cache)
+    assert (obj, body_size, log) == (savegame_body.extract(header, body), len(body), "")
+    assert len(os.listdir(str(tmp_path / "cache"))) == 1
+    with open(path, 'r+b') as f: #A hit does not read the body.
+        f.seek(-16, os.SEEK_END)
+        f.write(b"\0" * 16)
+    assert _load_extract(path, cache) == ((obj, body_size), "")
+
+def test_cache_warning_replay(tmp_path):
+    header, body, path = _generate(tmp_path)
+    with open(path, 'r+b') as f:
+        f.seek(savegame_body.SAVEGAME_CHECKSUM_OFFSET)
+        checksum = struct.unpack("<I", f.read(4))[0]
+        f.seek(savegame_body.SAVEGAME_CHECKSUM_OFFSET)
+        f.write(struct.pack("<I", checksum ^ 1))
+    cache = savegame_body.ParseCache(str(tmp_path / "cache"))
+    result, log = _load_extract(path, cache)
+    assert "Checksum mismatch" in log
+    assert _load_extract(path, cache) == (result, log)
+
+def test_cache_key_options(tmp_path):
+    header, body, path = _generate(tmp_path)
+    cache = savegame_body.ParseCache(str(tmp_path / "cache"))
+    (obj, body_size), log = _load_extract(path, cache)
+    (obj_skip, body_size), log = _load_extract(path, cache, skip_era=True)
+    assert obj_skip == savegame_body.extract(header, body, skip_era=True)
+    assert obj_skip != obj
+    assert len(os.listdir(str(tmp_path / "cache"))) == 2
+
+def test_cache_corrupted_entry(tmp_path):
+    header, body, path = _generate(tmp_path)
+    cache = savegame_body.ParseCache(str(tmp_path / "cache"))
+    result, log = _load_extract(path, cache)
+    entry_path = os.path.join(str(tmp_path / "cache"), os.listdir(str(tmp_path / "cache"))[0])
+    with open(entry_path, 'r+b') as f:
+        f.truncate(os.path.getsize(entry_path) // 2)
+    with open(path, 'rb') as fin:
+        assert cache.get(cache.key(savegame_body.read_savegame_header(fin))) is None
+    assert not os.path.exists(entry_path)
+    assert _load_extract(path, cache) == (result, log)
+
+def test_cache_eviction(tmp_path):
+    paths = [_generate(tmp_path, "%d.sav" % i, era, compress)[2] for i, (era, compress) in enumerate([(0x29, True), (0x29, False), (0x28, True)])]
+    cache = savegame_body.ParseCache(str(tmp_path / "cache"), 1)
+    for path in paths:
+        _load_extract(path, cache)
+    assert os.listdir(str(tmp_path / "cache")) == [] #Larger than max_size, so none is kept.
+    cache.max_size = 1 << 30
+    for path in paths:
+        _load_extract(path, cache)
+    assert len(os.listdir(str(tmp_path / "cache"))) == 3
+    entry_paths = []
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as fin:
+            entry_paths.append(cache._entry_path(cache.key(savegame_body.read_savegame_header(fin))))
+        os.utime(entry_paths[-1], ns=(i * 10**9, i * 10**9))
+    cache.max_size = sum(os.path.getsize(entry_path) for entry_path in entry_paths) - 1
+    cache.evict()
+    assert [os.path.exists(entry_path) for entry_path in entry_paths] == [False, True, True] #Least recently used first.
+
+def test_cache_cli(tmp_path):
+    header, body, path = _generate(tmp_path)
+    json_path, out_path = str(tmp_path / "a.json"), str(tmp_path / "b.sav")
+    cache_opt = "--cache=%s" % (tmp_path / "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        savegame_body.main(["savegame_body", "extract_json", path, json_path, cache_opt])
+        json_first = (tmp_path / "a.json").read_bytes()
+        savegame_body.main(["savegame_body", "extract_json", path, json_path, cache_opt])
+        assert (tmp_path / "a.json").read_bytes() == json_first
+        savegame_body.main(["savegame_body", "compose_json", path, json_path, out_path, cache_opt])
+    assert savegame_body.load_save(out_path) == (header, body)
@@ -0,0 +1,66 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+from sdbm_hash import sdbm_reference
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+
+def _patched_expected(header, body, changes):
+    body_obj = savegame_body.extract(header, body)
+    changes(body_obj)
+    return savegame_body.compose_body(header, body_obj)
+
+def test_patch_body_same_size():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    flag = body_obj["bool fieldEra60"]
+    body_patched, checksum = savegame_body.patch_body(header, bytearray(body), [("fieldEra60", not flag), ("fieldEra40_pos/1", 2.5)], sdbm_reference(body))
+    def changes(body_obj):
+        body_obj["bool fieldEra60"] = not flag
+        body_obj["vec3 fieldEra40_pos"][1] = 2.5
+    assert body_patched == _patched_expected(header, body, changes)
+    assert checksum == sdbm_reference(body_patched) #Updated from the changed bytes.
+
+def test_patch_body_size_change():
+    header, body, sav_data = _generate()
+    body_orig = bytearray(body)
+    body_patched, checksum = savegame_body.patch_body(header, body_orig, [("fieldCore20", "a longer string than before")], sdbm_reference(body))
+    assert body_orig == body #Changes go to a copy.
+    assert checksum is None
+    assert body_patched == _patched_expected(header, body, lambda body_obj: body_obj.__setitem__("string fieldCore20", "a longer string than before"))
+
+def test_patch_body_failure_leaves_body():
+    header, body, sav_data = _generate()
+    body_orig = bytearray(body)
+    with pytest.raises(ValueError):
+        savegame_body.patch_body(header, body_orig, [("fieldEra60", True), ("fieldEra40_pos", "not a vec3")])
+    assert body_orig == body
+
+@pytest.mark.parametrize("value", ["true", "false", '"a longer string than before"'])
+def test_patch_file_in_place(tmp_path, value):
+    header, body, sav_data = _generate()
+    path = tmp_path / "a.sav"
+    path.write_bytes(sav_data)
+    field = "fieldCore20" if value.startswith('"') else "fieldEra60"
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.patch_file([str(path), "%s=%s" % (field, value)], {"--in-place"})
+        header_new, body_new = savegame_body.load_save(str(path))
+    assert log.getvalue().startswith("Patched 1 field(s) in place.")
+    assert "mismatch" not in log.getvalue()
+    assert savegame_body.LazySave(header_new, body_new).get(field) == json.loads(value)
+    assert [p.name for p in tmp_path.iterdir()] == ["a.sav"]
+
+def test_patch_file_compressed(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+    path_in, path_out = tmp_path / "a.sav", tmp_path / "b.sav"
+    path_in.write_bytes(sav_data)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert savegame_body.patch_file([str(path_in), str(path_out), "fieldCore30_format=2"], set())
+        assert savegame_body.load_save(str(path_out)) == (header, body)
+        assert not savegame_body.patch_file([str(path_in), str(path_in), "fieldCore30_format=2"], set()) #Needs --in-place.
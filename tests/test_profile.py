@@ -0,0 +1,60 @@
+import io
+import json
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+
+def _top_level(profiler, stat):
+    return sum(stats[stat] for path, stats in profiler.fields.items() if len(path) == 1)
+
+def test_profile_extract():
+    header, body, sav_data = _generate()
+    calls = []
+    profiler = savegame_body.SerdesProfiler(lambda path, seconds, consumed, emitted: calls.append(path))
+    assert savegame_body.extract(header, body, profiler=profiler) == savegame_body.extract(header, body)
+    assert _top_level(profiler, 3) == len(body) #Every byte is accounted to one top level field.
+    assert ("array fieldEra310_mapdata_2",) in profiler.fields
+    assert profiler.fields[("array fieldEra310_mapdata_2", "Variant field20")][0] == 10
+    assert sum(stats[0] for stats in profiler.variants.values()) >= 30
+    assert len(calls) == sum(stats[0] for stats in profiler.fields.values())
+    assert all(stats[2] <= stats[1] + 1e-6 for stats in profiler.fields.values()) #Self time within the total.
+
+def test_profile_compose():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    profiler = savegame_body.SerdesProfiler()
+    assert savegame_body.compose_body(header, body_obj, profiler=profiler) == body
+    assert _top_level(profiler, 4) == len(body)
+
+def test_profile_run_names():
+    header, body, sav_data = _generate()
+    profiler = savegame_body.SerdesProfiler()
+    savegame_body.extract(header, body, profiler=profiler)
+    assert ("uint8 fieldCore40+uint64 fieldCore50+bool fieldCore70+uint32 fieldCore80",) in profiler.fields #Fixed size fields of a Run.
+
+def test_profile_write(tmp_path):
+    header, body, sav_data = _generate()
+    profiler = savegame_body.SerdesProfiler()
+    savegame_body.extract(header, body, profiler=profiler)
+    profiler.write(str(tmp_path / "profile.json"))
+    profile = json.loads((tmp_path / "profile.json").read_text())
+    assert len(profile["fields"]) == len(profiler.fields)
+    assert sum(field["bytes_consumed"] for field in profile["fields"] if "/" not in field["path"]) == len(body)
+    assert all(variant["type"] != "" for variant in profile["variants"])
+    profiler.write(str(tmp_path / "profile.folded"))
+    lines = (tmp_path / "profile.folded").read_text().splitlines()
+    assert len(lines) == len(profiler.fields)
+    assert all(line.rpartition(" ")[2].isdigit() for line in lines)
+
+def test_profile_cli(tmp_path):
+    header, body, sav_data = _generate()
+    (tmp_path / "a.sav").write_bytes(sav_data)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        savegame_body.main(["savegame_body", "extract_json", str(tmp_path / "a.sav"), str(tmp_path / "a.json"), "--profile", "--profile-out=%s" % (tmp_path / "p.json")])
+    assert "field path" in log.getvalue()
+    assert json.loads((tmp_path / "a.json").read_text()) == savegame_body.extract(header, body)
+    assert len(json.loads((tmp_path / "p.json").read_text())["fields"]) > 0
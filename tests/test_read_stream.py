@@ -0,0 +1,48 @@
+import io
+import struct
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+from sdbm_hash import sdbm_reference
+
+def _generate(compress):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=compress, images=1, array_len=5, map_entries=10)
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("chunk", [1000, 0x10000])
+def test_chunked_read(monkeypatch, compress, chunk):
+    monkeypatch.setattr(savegame_body, "SAVEGAME_READ_CHUNK", chunk)
+    header, body, sav_data = _generate(compress)
+    ref_checksum = [None]
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.read_savegame_stream(io.BytesIO(sav_data), ref_checksum=ref_checksum) == (header, body)
+    assert log.getvalue() == ""
+    assert ref_checksum[0] == sdbm_reference(body)
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_checksum_mismatch(compress):
+    header, body, sav_data = _generate(compress)
+    sav_data = bytearray(sav_data)
+    sav_data[savegame_body.SAVEGAME_CHECKSUM_OFFSET] ^= 1
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.read_savegame(sav_data)[1] == body
+    assert log.getvalue().startswith("Checksum mismatch")
+
+def test_wrong_advertised_size():
+    #The buffer is preallocated from the advertised size, but the actual size counts.
+    header, body, sav_data = _generate(True)
+    info = savegame_body.read_savegame_header(io.BytesIO(sav_data))
+    sav_data = bytearray(sav_data)
+    struct.pack_into("I", sav_data, info.body_offset - 4, len(body) - 100)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.read_savegame(sav_data)[1] == body
+    assert "does not match the decompressed size" in log.getvalue()
+    with pytest.raises(savegame_body.SavegameFormatError):
+        savegame_body.read_savegame(sav_data, max_body_size=len(body) - 1)
+
+def test_truncated():
+    header, body, sav_data = _generate(True)
+    with pytest.raises(savegame_body.SavegameFormatError):
+        savegame_body.read_savegame(sav_data[:10])
@@ -0,0 +1,21 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+SAVE_PARAMS = [(era_format, body_format) for era_format in savegame_benchmark.ERA_FORMATS for body_format in savegame_benchmark.BODY_FORMATS]
+
+def _generate(era_format, body_format):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(era_format, body_format, images=1, array_len=5, map_entries=10)
+
+@pytest.mark.parametrize("era_format,body_format", SAVE_PARAMS)
+def test_extract_compose(era_format, body_format):
+    header, body, sav_data = _generate(era_format, body_format)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.load_save(sav_data) == (header, body)
+        body_json = json.dumps(savegame_body.extract(header, body), indent=4)
+        assert savegame_body.compose_body(header, json.loads(body_json)) == body
+    assert "mismatch" not in log.getvalue()
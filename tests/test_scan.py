@@ -0,0 +1,60 @@
+import io
+import json
+import struct
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate(tmp_path, name="a.sav", compress=True):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, compress=compress, images=1, array_len=5, map_entries=10)
+    (tmp_path / name).write_bytes(sav_data)
+    return sav_data, str(tmp_path / name)
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_scan_good(tmp_path, compress):
+    sav_data, path = _generate(tmp_path, compress=compress)
+    with open(path, 'rb') as fin:
+        info = savegame_body.read_savegame_header(fin)
+    result = savegame_body.scan_save(path)
+    assert result.problems == []
+    assert (result.file_size, result.checksum, result.header_size) == (len(sav_data), info.checksum, len(info.header))
+    assert result.era_format == struct.unpack_from("I", info.header, 0)[0]
+    assert (result.body_is_compressed, result.body_compressed_size, result.body_decompressed_size) == \
+        (info.body_is_compressed != 0, info.body_compressed_size, info.body_decompressed_size)
+
+def test_scan_problems(tmp_path):
+    sav_data, path = _generate(tmp_path)
+    (tmp_path / "truncated.sav").write_bytes(sav_data[:-10])
+    (tmp_path / "short.sav").write_bytes(sav_data[:10])
+    (tmp_path / "magic.sav").write_bytes(b"\0" * 4 + sav_data[4:])
+    info = savegame_body.scan_save(path)
+    zlib_data = bytearray(sav_data)
+    zlib_data[len(sav_data) - info.body_compressed_size] = 0
+    (tmp_path / "zlib.sav").write_bytes(zlib_data)
+    problems = {name: savegame_body.scan_save(str(tmp_path / name)).problems for name in ("truncated.sav", "short.sav", "magic.sav", "zlib.sav", "missing.sav")}
+    assert [problem.split(" (")[0] for problem in problems["truncated.sav"]] == ["File size mismatch"]
+    assert [problem.split(" (")[0] for problem in problems["short.sav"]] == ["Unexpected end of file"]
+    assert problems["magic.sav"] == ["No valid Atlas Fallen savegame (magic mismatch)"]
+    assert problems["zlib.sav"] == ["Compressed body does not start with a zlib header"]
+    assert problems["missing.sav"][0].startswith("FileNotFoundError")
+
+def test_scan_saves_order(tmp_path):
+    paths = [_generate(tmp_path, "%d.sav" % i)[1] for i in range(3)] + [str(tmp_path / "missing.sav")]
+    assert [result.path for result in savegame_body.scan_saves(paths, 2)] == paths
+    assert list(savegame_body.scan_saves(paths, 2)) == list(savegame_body.scan_saves(paths))
+
+def test_scan_cli(tmp_path):
+    sav_data, path = _generate(tmp_path)
+    (tmp_path / "b.sav").write_bytes(sav_data[:-10])
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.run_scan("scan", [str(tmp_path)], set(), {}) == 1
+    assert "Scanned 2 files (1 with problems)" in log.getvalue()
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.run_scan("scan", [str(tmp_path)], {"--json"}, {}) == 1
+    results = [json.loads(line) for line in log.getvalue().splitlines()]
+    assert [(result["path"], len(result["problems"])) for result in results] == [(path, 0), (str(tmp_path / "b.sav"), 1)]
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        assert savegame_body.run_scan("info", [path], set(), {}) == 0
+    assert "file_size:               %d\n" % len(sav_data) in log.getvalue()
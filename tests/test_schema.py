@@ -0,0 +1,36 @@
+import io
+import struct
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+import savegame_schema
+
+def test_compile_fields_cached_and_batched():
+    plan = savegame_schema.compile_fields(savegame_body.EraSerdes, savegame_schema.CORE_HEADER_FIELDS)
+    assert savegame_schema.compile_fields(savegame_body.EraSerdes, savegame_schema.CORE_HEADER_FIELDS) is plan
+    #Consecutive fixed size fields are unpacked together.
+    assert type(plan[0]) is savegame_schema.Run
+    assert [fld.name for fld in plan[0].fields] == ["Name32 fieldCore00", "Name32 fieldCore10"]
+    assert plan[0].struct.size == 24
+    assert type(plan[1]) is savegame_schema.Step and plan[1].name == "string fieldCore20"
+    assert [fld.name for fld in plan[2].fields] == ["uint32 fieldCore30_format"]
+
+@pytest.mark.parametrize("era_format,body_format", [(0x18, 0), (0x1b, 1), (0x29, 2)])
+def test_fields_follow_schema(era_format, body_format):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era_format, body_format, images=1, array_len=5, map_entries=10)
+    fields = list(savegame_schema.CORE_HEADER_FIELDS)
+    fields += [fld for fld in savegame_schema.CORE_FIELDS if savegame_schema.field_enabled(fld, body_format)]
+    fields += [fld for fld in savegame_schema.ERA_FIELDS if savegame_schema.field_enabled(fld, era_format)]
+    assert list(savegame_body.extract(header, body).keys()) == [fld.name for fld in fields]
+
+def test_invalid_bool():
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(0x29, 2, images=1, array_len=5, map_entries=10)
+    index = savegame_body.build_body_index(header, body)
+    offs = index.offsets[[fld.name for fld in index.fields].index("bool fieldCore70")]
+    body = bytearray(body)
+    struct.pack_into(">B", body, offs, 2)
+    with pytest.raises(ValueError):
+        savegame_body.extract(header, body)
@@ -0,0 +1,36 @@
+import random
+import pytest
+import sdbm_hash
+
+def _data(length, seed=1):
+    return random.Random(seed).randbytes(length)
+
+@pytest.mark.parametrize("length", [0, 1, 63, 64, 1000, sdbm_hash.SDBM_BLOCK_SIZE - 1, sdbm_hash.SDBM_BLOCK_SIZE, sdbm_hash.SDBM_BLOCK_SIZE + 1, 3 * sdbm_hash.SDBM_BLOCK_SIZE + 17])
+def test_sdbm_matches_reference(length):
+    data = _data(length)
+    assert sdbm_hash.sdbm(data) == sdbm_hash.sdbm_reference(data)
+    assert sdbm_hash.sdbm(bytearray(data)) == sdbm_hash.sdbm_reference(data)
+    assert sdbm_hash.sdbm(memoryview(data)) == sdbm_hash.sdbm_reference(data)
+
+def test_sdbm_update_in_pieces():
+    data = _data(2 * sdbm_hash.SDBM_BLOCK_SIZE + 100)
+    for split in (0, 10, 100, sdbm_hash.SDBM_BLOCK_SIZE, sdbm_hash.SDBM_BLOCK_SIZE + 1000, len(data)):
+        state = sdbm_hash.sdbm_update(0, data[:split])
+        assert sdbm_hash.sdbm_update(state, data[split:]) == sdbm_hash.sdbm_reference(data)
+
+def test_sdbm_many():
+    rand = random.Random(2)
+    items = [rand.randbytes(rand.randint(0, 300)) for i in range(200)] + [b"", b"a", b"CharacterState"]
+    assert sdbm_hash.sdbm_many(items) == [sdbm_hash.sdbm_reference(item) for item in items]
+
+def test_sdbm_combine_and_replace():
+    data = _data(5000)
+    assert sdbm_hash.sdbm_combine(sdbm_hash.sdbm(data[:1234]), sdbm_hash.sdbm(data[1234:]), len(data) - 1234) == sdbm_hash.sdbm_reference(data)
+    data_new = data[:100] + b"xyz" + data[103:]
+    assert sdbm_hash.sdbm_replace(sdbm_hash.sdbm(data), len(data), 100, data[100:103], b"xyz") == sdbm_hash.sdbm_reference(data_new)
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_sdbm_parallel(workers):
+    data = _data(5 * sdbm_hash.SDBM_BLOCK_SIZE + 333)
+    assert sdbm_hash.sdbm_parallel(data, workers) == sdbm_hash.sdbm_reference(data)
+    assert sdbm_hash.sdbm(bytearray(data), workers) == sdbm_hash.sdbm_reference(data)
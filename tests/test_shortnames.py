@@ -0,0 +1,37 @@
+import io
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+
+def _renamed(key):
+    return key.split('_')[0] + "_renamed"
+
+def test_compose_renamed_suffixes():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    body_obj = {_renamed(key): val for key, val in body_obj.items()}
+    body_obj["array fieldEra310_renamed"] = [{_renamed(key): val for key, val in record.items()} for record in body_obj["array fieldEra310_renamed"]]
+    assert savegame_body.compose_body(header, body_obj) == body
+
+def test_compose_duplicate_shortnames():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    records = body_obj["array fieldEra310_mapdata_2"]
+    for i, record in enumerate(records): #Records: The first field with the short name is used.
+        records[i] = dict([("uint8 field00", record["uint8 field00"]), ("uint8 field00_other", (record["uint8 field00"] + 1) % 256)] + list(record.items())[1:])
+    body_obj["uint32 fieldEra300_mapdata_1_other"] = body_obj["uint32 fieldEra300_mapdata_1"] #Top level: The last one is used.
+    body_obj["uint32 fieldEra300_mapdata_1"] += 1
+    assert savegame_body.compose_body(header, body_obj) == body
+
+def test_fieldnames_short():
+    keys = ("uint8 field00_a", "array field10", "bool field20_b_c")
+    shortnames = savegame_body.FledgeSerdes._fieldnames_short(keys)
+    assert shortnames == ("uint8 field00", "array field10", "bool field20")
+    assert savegame_body.FledgeSerdes._fieldnames_short(tuple(list(keys))) is shortnames #Resolved once per key set.
+    assert savegame_body.FledgeSerdes._opt_map_with_short_fieldnames({"uint8 field00_a": 1, "uint8 field00_b": 2}) == {"uint8 field00": 2}
+    assert savegame_body.FledgeSerdes._opt_map_with_short_fieldnames_first({"uint8 field00_a": 1, "uint8 field00_b": 2}) == {"uint8 field00": 1}
+    assert savegame_body.FledgeSerdes._opt_map_select_with_shortname({"uint8 field00_a": 1, "bool field10": True}, "bool field10") is True
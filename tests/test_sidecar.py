@@ -0,0 +1,68 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=5, map_entries=10)
+
+def _sidecar_refs(deser):
+    if isinstance(deser, dict):
+        if "sidecar" in deser:
+            return [deser]
+        return [ref for val in deser.values() for ref in _sidecar_refs(val)]
+    if isinstance(deser, list):
+        return [ref for val in deser for ref in _sidecar_refs(val)]
+    return []
+
+def test_sidecar_roundtrip(tmp_path):
+    header, body, sav_data = _generate()
+    with savegame_body.SidecarWriter(str(tmp_path / "a.bin")) as sidecar:
+        body_obj = json.loads(json.dumps(savegame_body.extract(header, body, sidecar=sidecar)))
+    refs = _sidecar_refs(body_obj)
+    assert len(refs) > 0
+    assert sum(ref["size"] for ref in refs) == (tmp_path / "a.bin").stat().st_size
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        with savegame_body.SidecarReader(str(tmp_path)) as sidecar:
+            assert savegame_body.compose_body(header, body_obj, sidecar=sidecar) == body
+    assert log.getvalue() == ""
+
+def test_sidecar_changed_data(tmp_path):
+    header, body, sav_data = _generate()
+    with savegame_body.SidecarWriter(str(tmp_path / "a.bin")) as sidecar:
+        body_obj = savegame_body.extract(header, body, sidecar=sidecar)
+    ref = _sidecar_refs(body_obj)[0]
+    data = bytearray((tmp_path / "a.bin").read_bytes())
+    data[ref["offset"]] ^= 0xFF
+    (tmp_path / "a.bin").write_bytes(data)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        with savegame_body.SidecarReader(str(tmp_path)) as sidecar:
+            body_new = savegame_body.compose_body(header, body_obj, sidecar=sidecar)
+    assert "was changed since the extraction" in log.getvalue()
+    assert len(body_new) == len(body) and body_new != body
+
+def test_sidecar_reference_errors(tmp_path):
+    header, body, sav_data = _generate()
+    with savegame_body.SidecarWriter(str(tmp_path / "a.bin")) as sidecar:
+        body_obj = savegame_body.extract(header, body, sidecar=sidecar)
+    with pytest.raises(ValueError):
+        savegame_body.compose_body(header, body_obj) #References, but no sidecar.
+    ref = _sidecar_refs(body_obj)[-1]
+    ref["offset"] = (tmp_path / "a.bin").stat().st_size
+    with pytest.raises(ValueError):
+        with savegame_body.SidecarReader(str(tmp_path)) as sidecar:
+            savegame_body.compose_body(header, body_obj, sidecar=sidecar)
+
+def test_sidecar_cli(tmp_path):
+    header, body, sav_data = _generate()
+    (tmp_path / "a.sav").write_bytes(sav_data)
+    sav_path, json_path, out_path = str(tmp_path / "a.sav"), str(tmp_path / "a.json"), str(tmp_path / "b.sav")
+    with contextlib.redirect_stdout(io.StringIO()):
+        savegame_body.main(["savegame_body", "extract_json", sav_path, json_path, "--sidecar"])
+        assert (tmp_path / "a.bin").is_file()
+        assert len(_sidecar_refs(json.loads((tmp_path / "a.json").read_text()))) > 0
+        savegame_body.main(["savegame_body", "compose_json", sav_path, json_path, out_path])
+        assert savegame_body.load_save(out_path) == (header, body)
@@ -0,0 +1,66 @@
+import io
+import json
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate(era=0x29, body_format=2):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(era, body_format, compress=False, images=1, array_len=5, map_entries=10)
+
+@pytest.mark.parametrize("era,body_format", [(0x28, 2), (0x29, 2), (0x29, 1)])
+def test_stream_extract(era, body_format):
+    header, body, sav_data = _generate(era, body_format)
+    fout = io.StringIO()
+    assert savegame_body.extract(header, body, fout=fout) is None
+    assert fout.getvalue() == json.dumps(savegame_body.extract(header, body), indent=4)
+
+def test_stream_compose():
+    header, body, sav_data = _generate()
+    body_json = json.dumps(savegame_body.extract(header, body), indent=4)
+    reader = savegame_body.JsonObjectReader(io.StringIO(body_json), chunk_size=64) #Values span several chunks.
+    assert savegame_body.compose_body(header, reader) == body
+
+def test_stream_compose_reordered():
+    header, body, sav_data = _generate()
+    body_obj = savegame_body.extract(header, body)
+    names = list(body_obj.keys())
+    names[1], names[4] = names[4], names[1]
+    reader = savegame_body.JsonObjectReader(io.StringIO(json.dumps({name: body_obj[name] for name in names})))
+    assert savegame_body.compose_body(header, reader) == body
+
+def test_json_object_writer():
+    fout = io.StringIO()
+    writer = savegame_body.JsonObjectWriter(fout)
+    writer["uint32 a"] = 1
+    writer["array b"] = [{"x": 1.5}, "y"]
+    writer.close()
+    assert fout.getvalue() == json.dumps({"uint32 a": 1, "array b": [{"x": 1.5}, "y"]}, indent=4)
+    assert writer["uint32 a"] == 1
+    fout = io.StringIO()
+    savegame_body.JsonObjectWriter(fout).close()
+    assert json.loads(fout.getvalue()) == {}
+
+def test_json_object_reader():
+    json_text = '{"uint32 field10_a": 1, "array field20": [1, 2], "float field30_c": 1.25}'
+    reader = savegame_body.JsonObjectReader(io.StringIO(json_text), chunk_size=1) #Looked up by short name.
+    assert "uint32 field10" in reader
+    assert reader["array field20"] == [1, 2]
+    assert reader["uint32 field10"] == 1
+    assert reader["float field30"] == 1.25
+    assert "uint32 field40" not in reader
+    with pytest.raises(KeyError):
+        reader["uint32 field10"] #Each member is read once.
+    with pytest.raises(ValueError):
+        savegame_body.JsonObjectReader(io.StringIO('{"uint32 field10": 1')).__getitem__("array field20")
+
+def test_stream_cli(tmp_path):
+    header, body, sav_data = _generate()
+    (tmp_path / "a.sav").write_bytes(sav_data)
+    sav_path, json_path, out_path = str(tmp_path / "a.sav"), str(tmp_path / "a.json"), str(tmp_path / "b.sav")
+    with contextlib.redirect_stdout(io.StringIO()):
+        savegame_body.main(["savegame_body", "extract_json", sav_path, json_path, "--stream"])
+        assert json.loads((tmp_path / "a.json").read_text()) == savegame_body.extract(header, body)
+        savegame_body.main(["savegame_body", "compose_json", sav_path, json_path, out_path, "--stream"])
+    assert savegame_body.load_save(out_path) == (header, body)
@@ -0,0 +1,57 @@
+import io
+import json
+import array
+import struct
+import contextlib
+import pytest
+import savegame_benchmark
+import savegame_body
+
+def _generate(array_len=5):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return savegame_benchmark.generate_save(0x29, 2, compress=False, images=1, array_len=array_len, map_entries=10)
+
+def test_typed_arrays_extract():
+    header, body, sav_data = _generate(100)
+    body_obj = savegame_body.extract(header, body)
+    typed = savegame_body.extract(header, body, typed_arrays=True)
+    for key in ("uint32[] fieldEra250", "uint32[] fieldEra260"):
+        assert isinstance(typed[key], array.array) and typed[key].typecode == 'I'
+        assert typed[key].tolist() == body_obj[key]
+    assert json.dumps(typed, indent=4, default=savegame_body.json_default) == json.dumps(body_obj, indent=4)
+
+def test_typed_arrays_compose():
+    header, body, sav_data = _generate(100)
+    typed = savegame_body.extract(header, body, typed_arrays=True)
+    assert savegame_body.compose_body(header, typed) == body
+    typed["uint32[] fieldEra250"][3] = 7
+    body_obj = savegame_body.extract(header, body)
+    body_obj["uint32[] fieldEra250"][3] = 7
+    assert savegame_body.compose_body(header, typed) == savegame_body.compose_body(header, body_obj)
+
+def test_typed_arrays_stream():
+    header, body, sav_data = _generate()
+    fout = io.StringIO()
+    savegame_body.extract(header, body, fout=fout, typed_arrays=True)
+    assert fout.getvalue() == json.dumps(savegame_body.extract(header, body), indent=4)
+
+def test_unpack_array():
+    values = [1, 0x12345678, 0xFFFFFFFF]
+    assert savegame_body._unpack_array('I', struct.pack(">3I", *values)).tolist() == values
+    assert savegame_body._unpack_array('f', struct.pack(">2f", 1.5, -2.0)).tolist() == [1.5, -2.0]
+    assert savegame_body._unpack_array('B', bytes([1, 2])).tolist() == [1, 2]
+
+def test_json_default():
+    assert savegame_body.json_default(array.array('I', [1, 2])) == [1, 2]
+    with pytest.raises(TypeError):
+        json.dumps({"a": object()}, default=savegame_body.json_default)
+
+def test_numpy_view():
+    numpy = pytest.importorskip("numpy")
+    header, body, sav_data = _generate()
+    typed = savegame_body.extract(header, body, typed_arrays=True)
+    view = savegame_body.numpy_view(typed["uint32[] fieldEra250"])
+    assert view.dtype == numpy.dtype('I') and view.tolist() == typed["uint32[] fieldEra250"].tolist()
+    view[0] = 7
+    assert typed["uint32[] fieldEra250"][0] == 7 #Shares the memory.
+    assert json.dumps(view, default=savegame_body.json_default) == json.dumps(view.tolist())
@@ -0,0 +1,44 @@
+import io
+import os
+import asyncio
+import contextlib
+import savegame_benchmark
+import savegame_body
+
+def _write_save(path, era_format=0x29):
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, body, sav_data = savegame_benchmark.generate_save(era_format, 2, images=1, array_len=5, map_entries=10)
+    with open(path, 'wb') as fout:
+        fout.write(sav_data)
+
+def test_poll_debounce(tmp_path):
+    sav_dir = tmp_path / "saves"
+    sav_dir.mkdir()
+    _write_save(str(sav_dir / "a.sav"))
+    watcher = savegame_body.SaveWatcher(str(sav_dir), str(tmp_path / "json"), set(), {}, 1)
+    assert watcher.poll(100.0, 1.0) == [] #Just seen, not stable for the debounce time yet.
+    assert watcher.poll(100.5, 1.0) == []
+    ready = watcher.poll(101.0, 1.0)
+    assert [path for path, stat, content_key in ready] == [str(sav_dir / "a.sav")]
+
+    #Rewritten: Waits for the debounce time again.
+    path, stat, content_key = ready[0]
+    watcher.states[path][2:4] = [stat, content_key]
+    _write_save(str(sav_dir / "a.sav"), 0x28)
+    os.utime(str(sav_dir / "a.sav"), ns=(stat[0] + 10**9, stat[0] + 10**9))
+    assert watcher.poll(102.0, 1.0) == []
+    assert len(watcher.poll(103.0, 1.0)) == 1
+
+def test_run_once(tmp_path):
+    sav_dir = tmp_path / "saves"
+    sav_dir.mkdir()
+    _write_save(str(sav_dir / "a.sav"))
+    _write_save(str(sav_dir / "b.sav"), 0x28)
+    json_dir = tmp_path / "json"
+    watcher = savegame_body.SaveWatcher(str(sav_dir), str(json_dir), set(), {}, 0) #Worker count below 1 runs a single worker.
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(watcher.run(once=True))
+    assert sorted(os.listdir(str(json_dir))) == ["a.json", "b.json"] #No temporary directory left behind.
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        asyncio.run(watcher.run(once=True))
+    assert log.getvalue() == "" #Unchanged saves are not extracted again.